@@ -15,20 +15,75 @@
 """
 Sample Google App Engine application that demonstrates how to use the App
 Engine Log Service API to read application logs.
+
+Formatted pages of logs are cached in memcache, and after a page is served a
+task prefetches the next one, so that following the "More" link is usually
+served from memcache instead of the Log Service.
 """
 
 # [START all]
 import base64
+import cgi
+from collections import namedtuple
 import datetime
+import hashlib
 from itertools import islice
-from textwrap import dedent
 import time
+import urllib
 
+from google.appengine.api import memcache
+from google.appengine.api import taskqueue
 from google.appengine.api.logservice import logservice
 import webapp2
 
+# Pages after the first hold older logs and do not change, but the first page
+# gains new requests all the time.
+PAGE_CACHE_SECONDS = 300
+FIRST_PAGE_CACHE_SECONDS = 10
+
+MAX_BATCH_SIZE = 100
+
+Filters = namedtuple(
+    'Filters', ['batch_size', 'minimum_log_level', 'version_ids'])
+
+
+def get_filters(request):
+    """Reads the page size and log filters from the request parameters."""
+    try:
+        batch_size = int(request.get('batch_size', 10))
+    except ValueError:
+        batch_size = 10
+    try:
+        minimum_log_level = int(request.get(
+            'minimum_log_level', logservice.LOG_LEVEL_INFO))
+    except ValueError:
+        minimum_log_level = logservice.LOG_LEVEL_INFO
+    versions = request.get('versions', '')
+
+    return Filters(
+        batch_size=max(1, min(batch_size, MAX_BATCH_SIZE)),
+        minimum_log_level=minimum_log_level,
+        version_ids=tuple(v for v in versions.split(',') if v) or None)
+
+
+def filter_params(filters):
+    params = {
+        'batch_size': filters.batch_size,
+        'minimum_log_level': filters.minimum_log_level,
+    }
+    if filters.version_ids:
+        params['versions'] = ','.join(filters.version_ids)
+    return params
+
+
+def page_cache_key(offset, filters):
+    return 'reading_logs:page:' + hashlib.sha1(
+        repr((offset, filters))).hexdigest()
+
+
+def get_logs(offset=None, filters=None):
+    filters = filters or Filters(10, logservice.LOG_LEVEL_INFO, None)
 
-def get_logs(offset=None):
     # Logs are read backwards from the given end time. This specifies to read
     # all logs up until now.
     end_time = time.time()
@@ -36,36 +91,78 @@ def get_logs(offset=None):
     logs = logservice.fetch(
         end_time=end_time,
         offset=offset,
-        minimum_log_level=logservice.LOG_LEVEL_INFO,
-        include_app_logs=True)
+        minimum_log_level=filters.minimum_log_level,
+        include_app_logs=True,
+        batch_size=filters.batch_size,
+        version_ids=filters.version_ids)
 
     return logs
 
 
 def format_log_entry(entry):
+    # Format the request log and include the application logs.
+    date = datetime.datetime.fromtimestamp(
+        entry.end_time).strftime('%D %T UTC')
+    lines = [
+        'Date: {}'.format(date),
+        'IP: {}'.format(entry.ip),
+        'Method: {}'.format(entry.method),
+        'Resource: {}'.format(entry.resource),
+        'Logs:',
+    ]
+
     # Format any application logs that happened during this request.
-    logs = []
     for log in entry.app_logs:
         date = datetime.datetime.fromtimestamp(
             log.time).strftime('%D %T UTC')
-        logs.append('Date: {}, Message: {}'.format(
-            date, log.message))
+        lines.append('Date: {}, Message: {}'.format(date, log.message))
 
-    # Format the request log and include the application logs.
-    date = datetime.datetime.fromtimestamp(
-        entry.end_time).strftime('%D %T UTC')
+    return '\n'.join(lines)
+
+
+def fetch_page(offset, filters):
+    """Reads and formats one page of logs, and caches it.
+
+    Returns:
+        A dict with the formatted 'entries' and the 'next_offset' to read
+        the following page from, or None if this is the last page.
+    """
+    entries = []
+    next_offset = None
+    for log in islice(get_logs(offset, filters), filters.batch_size):
+        entries.append(cgi.escape(format_log_entry(log)))
+        next_offset = log.offset
+
+    if len(entries) < filters.batch_size:
+        next_offset = None
+
+    page = {'entries': entries, 'next_offset': next_offset}
+    memcache.set(
+        page_cache_key(offset, filters), page,
+        time=PAGE_CACHE_SECONDS if offset else FIRST_PAGE_CACHE_SECONDS)
+    return page
+
+
+def get_page(offset, filters):
+    page = memcache.get(page_cache_key(offset, filters))
+    if page is None:
+        page = fetch_page(offset, filters)
+    return page
 
-    output = dedent("""
-        Date: {}
-        IP: {}
-        Method: {}
-        Resource: {}
-        Logs:
-    """.format(date, entry.ip, entry.method, entry.resource))
 
-    output += '\n'.join(logs)
+def prefetch_page(offset, filters):
+    """Enqueues a task to fetch the page at ``offset`` into memcache, unless
+    it is already cached or being fetched."""
+    key = page_cache_key(offset, filters)
+    if memcache.get(key) is not None:
+        return
+    # memcache.add fails if another request already enqueued the task.
+    if not memcache.add(key + ':prefetch', True, time=PAGE_CACHE_SECONDS):
+        return
 
-    return output
+    params = filter_params(filters)
+    params['offset'] = base64.urlsafe_b64encode(offset)
+    taskqueue.add(url='/prefetch', params=params)
 
 
 class MainPage(webapp2.RequestHandler):
@@ -75,29 +172,39 @@ class MainPage(webapp2.RequestHandler):
         if offset:
             offset = base64.urlsafe_b64decode(str(offset))
 
-        # Get the logs given the specified offset.
-        logs = get_logs(offset=offset)
-
-        # Output the first 10 logs.
-        log = None
-        for log in islice(logs, 10):
-            self.response.write(
-                '<pre>{}</pre>'.format(format_log_entry(log)))
+        filters = get_filters(self.request)
 
-            offset = log.offset
+        # Get the logs given the specified offset.
+        page = get_page(offset, filters)
 
-        if not log:
+        if not page['entries']:
             self.response.write('No log entries found.')
+            return
+
+        self.response.write(''.join(
+            '<pre>{}</pre>'.format(entry) for entry in page['entries']))
 
         # Add a link to view more log entries.
-        elif offset:
+        next_offset = page['next_offset']
+        if next_offset:
+            prefetch_page(next_offset, filters)
+
+            params = filter_params(filters)
+            params['offset'] = base64.urlsafe_b64encode(next_offset)
             self.response.write(
-                '<a href="/?offset={}"">More</a'.format(
-                    base64.urlsafe_b64encode(offset)))
+                '<a href="/?{}">More</a>'.format(
+                    cgi.escape(urllib.urlencode(params), quote=True)))
+
+
+class PrefetchHandler(webapp2.RequestHandler):
+    def post(self):
+        offset = base64.urlsafe_b64decode(str(self.request.get('offset')))
+        fetch_page(offset, get_filters(self.request))
 
 
 app = webapp2.WSGIApplication([
-    ('/', MainPage)
+    ('/', MainPage),
+    ('/prefetch', PrefetchHandler),
 ], debug=True)
 
 # [END all]
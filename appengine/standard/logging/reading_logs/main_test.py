@@ -12,7 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import re
+
 import main
+import mock
 import webtest
 
 
@@ -22,3 +25,38 @@ def test_app(testbed):
     assert response.status_int == 200
     assert 'No log entries found' in response.text
     assert 'More' not in response.text
+
+
+def fake_logs(count, start=0):
+    return [mock.Mock(
+        end_time=1000000000 + n, ip='127.0.0.1', method='GET',
+        resource='/{}'.format(n), app_logs=[], offset='offset-{}'.format(n))
+        for n in range(start, start + count)]
+
+
+def test_pages_are_cached_and_prefetched(testbed, run_tasks):
+    app = webtest.TestApp(main.app)
+
+    with mock.patch('main.logservice.fetch') as fetch:
+        fetch.return_value = fake_logs(3)
+        response = app.get('/?batch_size=2')
+        assert 'Resource: /1' in response.text
+        assert 'Resource: /2' not in response.text
+        assert 'More' in response.text
+
+        # The first page comes from memcache the second time.
+        app.get('/?batch_size=2')
+        assert fetch.call_count == 1
+
+        # The task reads the next page into memcache.
+        fetch.return_value = fake_logs(1, start=2)
+        run_tasks(app)
+        assert fetch.call_count == 2
+        assert fetch.call_args[1]['offset'] == 'offset-1'
+        assert fetch.call_args[1]['batch_size'] == 2
+
+        href = re.search(r'href="([^"]+)"', response.text).group(1)
+        response = app.get(href.replace('&amp;', '&'))
+        assert fetch.call_count == 2
+        assert 'Resource: /2' in response.text
+        assert 'More' not in response.text
@@ -14,7 +14,9 @@
 import argparse
 import datetime
 
+import bulk_delete
 from gcloud import datastore
+import timeline
 
 
 def path_to_key(datastore, path):
@@ -42,29 +44,39 @@ def create_user(ds, username, profile):
     ds.put(entity)
 
 
-def create_post(ds, username, post_content):
+def create_post(ds, username, post_content, fan_out=False):
     now = datetime.datetime.utcnow()
     key = path_to_key(ds, '{0}.user/{1}.post'.format(username, now))
     entity = datastore.Entity(key)
 
     entity.update({
         'created': now,
+        'posted': now,
         'created_by': username,
         'content': post_content
     })
 
     ds.put(entity)
 
+    if fan_out:
+        timeline.fan_out_post(ds, entity)
 
-def repost(ds, username, original):
+
+def repost(ds, username, original, fan_out=False):
     now = datetime.datetime.utcnow()
     new_key = path_to_key(ds, '{0}.user/{1}.post'.format(username, now))
     new = datastore.Entity(new_key)
 
     new.update(original)
+    # The repost keeps the original's creation time, but appears on
+    # timelines as of now.
+    new['posted'] = now
 
     ds.put(new)
 
+    if fan_out:
+        timeline.fan_out_post(ds, new)
+
 
 def list_posts_by_user(ds, username):
     user_key = path_to_key(ds, '{0}.user'.format(username))
@@ -83,10 +95,12 @@ def main(project_id):
                 {'name': 'Tony Stark', 'location': 'Stark Island'})
     create_user(ds, 'peterparker',
                 {'name': 'Peter Parker', 'location': 'New York City'})
+    timeline.follow(ds, 'peterparker', 'tonystark')
 
     print("Creating posts...")
     for n in range(1, 10):
-        create_post(ds, 'tonystark', "Tony's post #{0}".format(n))
+        create_post(
+            ds, 'tonystark', "Tony's post #{0}".format(n), fan_out=True)
         create_post(ds, 'peterparker', "Peter's post #{0}".format(n))
 
     print("Re-posting tony's post as peter...")
@@ -110,13 +124,19 @@ def main(project_id):
     for post in list_all_posts(ds):
         print("> {0} on {1}".format(post['content'], post['created']))
 
+    print("Peter's timeline:")
+    posts, cursor = timeline.list_timeline(ds, 'peterparker', limit=5)
+    for post in posts:
+        print("> {0} on {1}".format(post['content'], post['created']))
+
     print('Cleaning up...')
+    timeline.delete_timeline(ds, 'peterparker')
+    timeline.unfollow(ds, 'peterparker', 'tonystark')
     ds.delete_multi([
         path_to_key(ds, 'tonystark.user'),
         path_to_key(ds, 'peterparker.user')
     ])
-    ds.delete_multi([
-        x.key for x in list_all_posts(ds)])
+    bulk_delete.bulk_delete(ds, kind='post', progress=None)
 
 
 if __name__ == "__main__":
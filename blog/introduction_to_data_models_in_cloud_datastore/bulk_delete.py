@@ -0,0 +1,192 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Deletes every entity matched by a kind, ancestor and/or namespace.
+
+Keys are streamed from a keys-only query one batch at a time and each batch
+is deleted on a small pool of worker threads, so only a bounded number of
+keys is ever held in memory regardless of how many entities match.
+
+Examples:
+    python bulk_delete.py your-project-id --kind post
+    python bulk_delete.py your-project-id --kind revision \\
+        --ancestor page1.page
+    python bulk_delete.py your-project-id --namespace test-data
+    python bulk_delete.py your-project-id --all
+"""
+
+import argparse
+from multiprocessing.pool import ThreadPool
+import random
+import threading
+import time
+
+import gcloud
+from gcloud import datastore
+
+# Maximum number of mutations Cloud Datastore accepts in a single commit.
+MAX_BATCH_SIZE = 500
+
+RETRYABLE_ERRORS = (
+    gcloud.exceptions.Conflict,
+    gcloud.exceptions.TooManyRequests,
+    gcloud.exceptions.ServerError)
+
+
+def iter_key_batches(ds, kind=None, ancestor=None, namespace=None,
+                     batch_size=MAX_BATCH_SIZE):
+    """Yields lists of at most ``batch_size`` keys from a keys-only query."""
+    query = ds.query(kind=kind, ancestor=ancestor, namespace=namespace)
+    query.keys_only()
+    cursor = None
+
+    while True:
+        entities, more_results, cursor = query.fetch(
+            limit=batch_size, start_cursor=cursor).next_page()
+
+        # Kindless queries also return read-only statistics entities.
+        keys = [entity.key for entity in entities
+                if not entity.key.kind.startswith('__')]
+        if keys:
+            yield keys
+
+        # A batch can be cut short while there are more results, so only a
+        # short batch that Datastore reports as finished is the last one.
+        if not cursor or not (more_results or len(entities) == batch_size):
+            return
+
+
+def delete_with_retry(ds, keys, retries=5, initial_delay=0.5):
+    """Deletes ``keys``, backing off and retrying on transient errors."""
+    delay = initial_delay
+
+    for attempt in range(retries):
+        try:
+            ds.delete_multi(keys)
+            return len(keys)
+        except RETRYABLE_ERRORS:
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay * random.uniform(1, 2))
+            delay *= 2
+
+
+def print_progress(deleted):
+    print('Deleted {0} entities'.format(deleted))
+
+
+def bulk_delete(ds, kind=None, ancestor=None, namespace=None, workers=8,
+                batch_size=MAX_BATCH_SIZE, progress=print_progress):
+    """Deletes all entities matching the given scope.
+
+    Args:
+        ds: The datastore client used for the query. Each worker thread gets
+            its own client with the same project and credentials, because
+            the underlying HTTP connection is not thread-safe.
+        kind: Only delete entities of this kind.
+        ancestor: Only delete descendants of this key.
+        namespace: The namespace to delete from. Defaults to the client's.
+        workers: How many batches to delete concurrently.
+        batch_size: Keys per delete call, at most ``MAX_BATCH_SIZE``.
+        progress: Called with the running total after each batch.
+
+    Returns:
+        The number of entities deleted.
+    """
+    local = threading.local()
+    lock = threading.Lock()
+    # Bounds the number of fetched-but-undeleted batches held in memory.
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    state = {'deleted': 0, 'error': None}
+
+    def delete_batch(keys):
+        try:
+            if not hasattr(local, 'ds'):
+                local.ds = datastore.Client(
+                    project=ds.project, namespace=namespace or ds.namespace,
+                    credentials=ds.connection.credentials)
+            count = delete_with_retry(local.ds, keys)
+
+            with lock:
+                state['deleted'] += count
+                deleted = state['deleted']
+            if progress:
+                progress(deleted)
+        except Exception as e:
+            with lock:
+                state['error'] = state['error'] or e
+        finally:
+            in_flight.release()
+
+    pool = ThreadPool(workers)
+    try:
+        for keys in iter_key_batches(
+                ds, kind, ancestor, namespace, batch_size):
+            in_flight.acquire()
+            if state['error']:
+                in_flight.release()
+                break
+            pool.apply_async(delete_batch, (keys,))
+    finally:
+        pool.close()
+        pool.join()
+
+    if state['error']:
+        raise state['error']
+
+    return state['deleted']
+
+
+def main(project_id, kind, ancestor, namespace, workers):
+    ds = datastore.Client(project_id, namespace=namespace)
+
+    ancestor_key = None
+    if ancestor:
+        # Accepts the same path syntax as blog.path_to_key.
+        key_parts = []
+        for part in ancestor.strip(u'/').split(u'/'):
+            name, ext = part.rsplit('.', 1)
+            key_parts.extend([ext, name])
+        ancestor_key = ds.key(*key_parts)
+
+    deleted = bulk_delete(
+        ds, kind=kind, ancestor=ancestor_key, namespace=namespace,
+        workers=workers)
+    print('Done, {0} entities deleted.'.format(deleted))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('project_id', help='Your cloud project ID.')
+    parser.add_argument('--kind', help='Only delete entities of this kind.')
+    parser.add_argument(
+        '--ancestor',
+        help='Only delete descendants of this path, e.g. page1.page.')
+    parser.add_argument('--namespace', help='Namespace to delete from.')
+    parser.add_argument(
+        '--all', action='store_true',
+        help='Delete every entity in the default namespace.')
+    parser.add_argument(
+        '--workers', type=int, default=8,
+        help='Number of batches to delete concurrently.')
+
+    args = parser.parse_args()
+    if not (args.kind or args.ancestor or args.namespace or args.all):
+        parser.error(
+            'one of --kind, --ancestor, --namespace or --all is required')
+
+    main(args.project_id, args.kind, args.ancestor, args.namespace,
+         args.workers)
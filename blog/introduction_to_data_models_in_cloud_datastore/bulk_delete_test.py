@@ -0,0 +1,85 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bulk_delete
+import gcloud
+from gcloud import datastore
+from gcp.testing import eventually_consistent
+from gcp.testing.flaky import flaky
+import mock
+import pytest
+
+
+@flaky
+def test_bulk_delete(cloud_config):
+    ds = datastore.Client(cloud_config.project)
+    parent = ds.key('BulkDeleteTest', 'parent')
+
+    entities = [datastore.Entity(ds.key('BulkDeleteTest', n, parent=parent))
+                for n in range(1, 26)]
+    ds.put_multi(entities)
+
+    progress = []
+    deleted = bulk_delete.bulk_delete(
+        ds, kind='BulkDeleteTest', ancestor=parent, workers=2, batch_size=10,
+        progress=progress.append)
+
+    assert deleted == 25
+    assert progress[-1] == 25
+
+    @eventually_consistent.call
+    def _():
+        query = ds.query(kind='BulkDeleteTest', ancestor=parent)
+        assert not list(query.fetch())
+
+
+def test_iter_key_batches_continues_after_short_batch():
+    ds = mock.Mock()
+    query = ds.query.return_value
+
+    def entity(name, kind='Post'):
+        return mock.Mock(key=mock.Mock(kind=kind, id_or_name=name))
+
+    # The first batch is cut short, but Datastore is not finished.
+    query.fetch.return_value.next_page.side_effect = [
+        ([entity('a')], True, 'cursor1'),
+        ([entity('b'), entity('total', kind='__Stat_Total__')], False,
+         'cursor2'),
+        ([entity('c')], False, 'cursor3'),
+    ]
+
+    batches = list(bulk_delete.iter_key_batches(ds, batch_size=2))
+
+    assert [[key.id_or_name for key in keys] for keys in batches] == [
+        ['a'], ['b'], ['c']]
+    assert query.fetch.call_args[1]['start_cursor'] == 'cursor2'
+
+
+def test_delete_with_retry():
+    ds = mock.Mock()
+    ds.delete_multi.side_effect = [
+        gcloud.exceptions.ServiceUnavailable('unavailable'), None]
+
+    assert bulk_delete.delete_with_retry(
+        ds, ['key1', 'key2'], initial_delay=0) == 2
+    assert ds.delete_multi.call_count == 2
+
+
+def test_delete_with_retry_gives_up():
+    ds = mock.Mock()
+    ds.delete_multi.side_effect = gcloud.exceptions.Conflict('conflict')
+
+    with pytest.raises(gcloud.exceptions.Conflict):
+        bulk_delete.delete_with_retry(
+            ds, ['key1'], retries=3, initial_delay=0)
+    assert ds.delete_multi.call_count == 3
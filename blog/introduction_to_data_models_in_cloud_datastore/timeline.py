@@ -0,0 +1,172 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Fan-out-on-write timelines for the blog data model.
+
+Every user has a ``timeline`` entity group under their ``user`` key. When a
+post is created, a small ``timeline`` entity pointing at the post is written
+into the timeline of each of the author's followers. Reading a feed is then a
+single ancestor query over the reader's own timeline, no matter how many
+users they follow.
+
+Timeline entity names start with an inverted timestamp, so the default
+ascending key order of an ancestor query returns the newest posts first
+without needing a composite index.
+"""
+
+import calendar
+import datetime
+
+import bulk_delete
+from gcloud import datastore
+
+# Maximum number of mutations Cloud Datastore accepts in a single commit.
+MAX_BATCH_SIZE = 500
+
+# Larger than any microsecond timestamp we will ever store.
+_MAX_TIMESTAMP = 10 ** 18
+
+
+def user_key(ds, username):
+    return ds.key('user', username)
+
+
+def follow(ds, follower, followee):
+    """Records that ``follower`` follows ``followee``.
+
+    Followers are stored as children of the followed user, so finding
+    everyone to fan out to is an ancestor keys-only query.
+    """
+    key = ds.key('follower', follower, parent=user_key(ds, followee))
+    entity = datastore.Entity(key)
+    entity['created'] = datetime.datetime.utcnow()
+    ds.put(entity)
+
+
+def unfollow(ds, follower, followee):
+    ds.delete(ds.key('follower', follower, parent=user_key(ds, followee)))
+
+
+def list_followers(ds, username):
+    query = ds.query(kind='follower', ancestor=user_key(ds, username))
+    query.keys_only()
+    return [entity.key.name for entity in query.fetch()]
+
+
+def _timeline_name(timestamp, post_key):
+    """Builds a timeline entity name that sorts newest first."""
+    micros = (calendar.timegm(timestamp.utctimetuple()) * 10 ** 6 +
+              timestamp.microsecond)
+    return '{0:019d}:{1}:{2}'.format(
+        _MAX_TIMESTAMP - micros, post_key.parent.name, post_key.name)
+
+
+def fan_out_timestamp(post):
+    """Returns when ``post`` appeared on its author's timeline.
+
+    A repost keeps the original's ``created`` time but is fanned out when it
+    is reposted, which is recorded in ``posted``. Posts from before
+    ``posted`` was added only have ``created``.
+    """
+    return post.get('posted', post['created'])
+
+
+def timeline_entries(ds, post, followers):
+    """Builds, but does not save, the timeline entities for ``post``."""
+    timestamp = fan_out_timestamp(post)
+
+    name = _timeline_name(timestamp, post.key)
+    entries = []
+
+    for follower in followers:
+        key = ds.key('timeline', name, parent=user_key(ds, follower))
+        entry = datastore.Entity(key, exclude_from_indexes=['post'])
+        entry.update({
+            'post': post.key,
+            'created': timestamp,
+            'created_by': post['created_by']
+        })
+        entries.append(entry)
+
+    return entries
+
+
+def put_in_batches(ds, entities, batch_size=MAX_BATCH_SIZE):
+    for start in range(0, len(entities), batch_size):
+        ds.put_multi(entities[start:start + batch_size])
+
+
+def fan_out_post(ds, post):
+    """Writes ``post`` into the timeline of every follower of its author."""
+    author = post.key.parent.name
+    entries = timeline_entries(ds, post, list_followers(ds, author))
+    put_in_batches(ds, entries)
+    return len(entries)
+
+
+def list_timeline(ds, username, cursor=None, limit=20):
+    """Returns one page of ``username``'s feed and the cursor for the next.
+
+    Posts are returned newest first. Posts that have been deleted since they
+    were fanned out are skipped. The returned cursor is None once the last
+    page has been read.
+    """
+    query = ds.query(kind='timeline', ancestor=user_key(ds, username))
+    entries, more_results, cursor = query.fetch(
+        limit=limit, start_cursor=cursor).next_page()
+
+    post_keys = [entry['post'] for entry in entries]
+    posts_by_key = dict(
+        (post.key, post) for post in ds.get_multi(post_keys))
+    posts = [posts_by_key[key] for key in post_keys if key in posts_by_key]
+
+    # A page can be cut short while there are more entries, which
+    # more_results reports. A full page may also be followed by more, even
+    # though more_results does not say so when a limit is set.
+    if not (more_results or len(entries) == limit):
+        cursor = None
+
+    return posts, cursor
+
+
+def rebuild_timelines(ds, batch_size=MAX_BATCH_SIZE):
+    """Backfills timelines from every existing post.
+
+    Timeline entity names are derived from the post, so running this again
+    overwrites the same entities rather than creating duplicates.
+    """
+    followers_by_user = {}
+    pending = []
+    written = 0
+
+    for post in ds.query(kind='post').fetch():
+        author = post.key.parent.name
+        if author not in followers_by_user:
+            followers_by_user[author] = list_followers(ds, author)
+
+        pending.extend(
+            timeline_entries(ds, post, followers_by_user[author]))
+
+        while len(pending) >= batch_size:
+            ds.put_multi(pending[:batch_size])
+            written += batch_size
+            pending = pending[batch_size:]
+
+    put_in_batches(ds, pending, batch_size)
+    return written + len(pending)
+
+
+def delete_timeline(ds, username):
+    bulk_delete.bulk_delete(
+        ds, kind='timeline', ancestor=user_key(ds, username), progress=None)
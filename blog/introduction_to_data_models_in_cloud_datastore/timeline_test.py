@@ -0,0 +1,104 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+import blog
+from gcloud import datastore
+from gcp.testing import eventually_consistent
+from gcp.testing.flaky import flaky
+import mock
+import pytest
+import timeline
+
+
+@pytest.yield_fixture
+def ds(cloud_config):
+    ds = datastore.Client(cloud_config.project)
+
+    timeline.follow(ds, 'timeline-reader', 'timeline-author')
+
+    yield ds
+
+    timeline.delete_timeline(ds, 'timeline-reader')
+    timeline.unfollow(ds, 'timeline-reader', 'timeline-author')
+    ds.delete_multi([
+        x.key for x in blog.list_posts_by_user(ds, 'timeline-author')])
+
+
+@flaky
+def test_fan_out_and_page(ds):
+    for n in range(3):
+        blog.create_post(
+            ds, 'timeline-author', 'post #{0}'.format(n), fan_out=True)
+
+    posts, cursor = timeline.list_timeline(ds, 'timeline-reader', limit=2)
+    assert [x['content'] for x in posts] == ['post #2', 'post #1']
+    assert cursor
+
+    posts, cursor = timeline.list_timeline(
+        ds, 'timeline-reader', cursor=cursor, limit=2)
+    assert [x['content'] for x in posts] == ['post #0']
+    assert cursor is None
+
+
+@flaky
+def test_rebuild_timelines(ds):
+    blog.create_post(ds, 'timeline-author', 'not fanned out')
+
+    @eventually_consistent.call
+    def _():
+        assert timeline.rebuild_timelines(ds) >= 1
+
+    posts, _ = timeline.list_timeline(ds, 'timeline-reader')
+    assert [x['content'] for x in posts] == ['not fanned out']
+
+
+def test_repost_entries_keep_their_name():
+    ds = mock.Mock()
+    ds.key.side_effect = lambda *path, **kwargs: datastore.Key(
+        *path, project='project', **kwargs)
+    created = datetime.datetime(2016, 1, 1)
+    reposted = datetime.datetime(2016, 2, 1)
+
+    repost = datastore.Entity(ds.key('user', 'b', 'post', str(reposted)))
+    repost.update({'created': created, 'posted': reposted,
+                   'created_by': 'a'})
+    original = datastore.Entity(ds.key('user', 'a', 'post', str(created)))
+    original.update({'created': created, 'created_by': 'a'})
+
+    # Fanning out and rebuilding both name a repost's entries by when it
+    # was reposted, so a rebuild overwrites them.
+    [entry] = timeline.timeline_entries(ds, repost, ['reader'])
+    assert entry.key.name == timeline._timeline_name(reposted, repost.key)
+    # Posts saved before 'posted' existed fall back to 'created'.
+    [entry] = timeline.timeline_entries(ds, original, ['reader'])
+    assert entry.key.name == timeline._timeline_name(created, original.key)
+
+
+def test_short_page_that_is_not_finished_has_a_cursor():
+    ds = mock.Mock()
+    ds.key.side_effect = lambda *path, **kwargs: datastore.Key(
+        *path, project='project', **kwargs)
+    post = datastore.Entity(ds.key('user', 'a', 'post', 'p1'))
+    entry = datastore.Entity(ds.key('user', 'reader', 'timeline', 't1'))
+    entry['post'] = post.key
+    ds.get_multi.return_value = [post]
+    next_page = ds.query.return_value.fetch.return_value.next_page
+
+    next_page.return_value = ([entry], True, 'cursor')
+    assert timeline.list_timeline(ds, 'reader', limit=2) == (
+        [post], 'cursor')
+
+    next_page.return_value = ([entry], False, 'cursor')
+    assert timeline.list_timeline(ds, 'reader', limit=2) == ([post], None)
@@ -13,7 +13,11 @@
 
 import argparse
 import datetime
+import random
+import time
 
+import bulk_delete
+import gcloud
 from gcloud import datastore
 
 
@@ -35,7 +39,26 @@ def path_to_key(datastore, path):
     return datastore.key(*key_parts)
 
 
-def save_page(ds, page, content):
+def save_page(ds, page, content, retries=5, initial_delay=0.1):
+    """Saves new content for a page, keeping the old content as a revision.
+
+    Two saves of the same page at the same time conflict. The one that
+    loses is retried after a random delay, up to a limit that doubles after
+    each conflict, so that the writers do not collide again.
+    """
+    delay = initial_delay
+
+    for attempt in range(retries):
+        try:
+            return _save_page(ds, page, content)
+        except gcloud.exceptions.Conflict:
+            if attempt == retries - 1:
+                raise
+            time.sleep(random.uniform(0, delay))
+            delay *= 2
+
+
+def _save_page(ds, page, content):
     with ds.transaction():
         now = datetime.datetime.utcnow()
         current_key = path_to_key(ds, '{}.page/current.revision'.format(page))
@@ -94,7 +117,9 @@ def main(project_id):
 
     print('Cleaning up')
     ds.delete_multi([path_to_key(ds, 'page1.page')])
-    ds.delete_multi([x.key for x in list_revisions(ds, 'page1')])
+    bulk_delete.bulk_delete(
+        ds, kind='revision', ancestor=path_to_key(ds, 'page1.page'),
+        progress=None)
 
 
 if __name__ == "__main__":
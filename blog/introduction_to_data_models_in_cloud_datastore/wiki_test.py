@@ -11,10 +11,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gcloud
 from gcp.testing.flaky import flaky
-from wiki import main
+import mock
+import wiki
 
 
 @flaky
 def test_main(cloud_config):
-    main(cloud_config.project)
+    wiki.main(cloud_config.project)
+
+
+def test_save_page_retries_conflicts():
+    with mock.patch('wiki._save_page', side_effect=[
+            gcloud.exceptions.Conflict('conflict'), None]) as save:
+        wiki.save_page(mock.Mock(), 'page1', 'content', initial_delay=0)
+    assert save.call_count == 2
@@ -37,7 +37,7 @@ def list_logs(project_id, logging_service):
     while request:
         response = request.execute()
         if not response:
-            print("No logs found in {0} project").format(project_id)
+            print("No logs found in {0} project".format(project_id))
             return False
         for log in response['logs']:
             print(log['name'])
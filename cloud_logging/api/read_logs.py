@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Command-line program to read the log entries of a Google Cloud Platform
+project as newline-delimited JSON.
+
+The entries of each log are read with their own paged entries.list calls, on
+a pool of worker threads, and are written out as soon as each page arrives.
+With --follow, the program then keeps polling for entries newer than the
+last one it wrote.
+
+For more information, see the README.md under /cloud_logging.
+"""
+
+import argparse
+import datetime
+import json
+from multiprocessing.pool import ThreadPool
+import sys
+import threading
+import time
+
+from googleapiclient import discovery
+from oauth2client.client import GoogleCredentials
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+_local = threading.local()
+
+
+def get_logging_service(version='v2beta1'):
+    """Returns a logging service for the current thread. httplib2, which the
+    services use, is not thread-safe."""
+    services = _local.__dict__.setdefault('services', {})
+    if version not in services:
+        credentials = GoogleCredentials.get_application_default()
+        services[version] = discovery.build(
+            'logging', version, credentials=credentials)
+    return services[version]
+
+
+def format_rfc3339(datetime_instance):
+    """Formats a datetime per RFC 3339."""
+    return datetime_instance.isoformat("T") + "Z"
+
+
+def list_log_names(project_id, logging_service):
+    """Returns the names of every log in the project."""
+    names = []
+    request = logging_service.projects().logs().list(projectsId=project_id)
+    while request:
+        response = request.execute()
+        names.extend(log['name'] for log in response.get('logs', []))
+        request = logging_service.projects().logs().list_next(
+            request, response)
+    return names
+
+
+def log_names_filter(project_id, log_names):
+    """Builds an advanced logs filter for the entries of any of
+    ``log_names``."""
+    clauses = ['logName="projects/{}/logs/{}"'.format(
+        project_id, log_name.replace('/', '%2F')) for log_name in log_names]
+    if len(clauses) == 1:
+        return clauses[0]
+    return '({})'.format(' OR '.join(clauses))
+
+
+def entries_filter(project_id, log_name=None, since=None, until=None,
+                   extra_filter=None, log_names=None):
+    """Builds an advanced logs filter for entries from ``since`` up to, but
+    not including, ``until``, of ``log_name`` or any of ``log_names``."""
+    clauses = []
+    if log_name:
+        log_names = [log_name]
+    if log_names:
+        clauses.append(log_names_filter(project_id, log_names))
+    if since:
+        clauses.append('timestamp>="{}"'.format(since))
+    if until:
+        clauses.append('timestamp<"{}"'.format(until))
+    if extra_filter:
+        clauses.append('({})'.format(extra_filter))
+    return ' AND '.join(clauses)
+
+
+def iter_entry_pages(logging_service, project_id, filter_, page_size=1000):
+    """Yields the entries of each page of an entries.list call, oldest
+    first."""
+    body = {
+        'projectIds': [project_id],
+        'filter': filter_,
+        'orderBy': 'timestamp asc',
+        'pageSize': page_size,
+    }
+    while True:
+        response = logging_service.entries().list(body=body).execute()
+        yield response.get('entries', [])
+        if not response.get('nextPageToken'):
+            return
+        body = dict(body, pageToken=response['nextPageToken'])
+
+
+def write_entries(entries, out):
+    for entry in entries:
+        out.write(json.dumps(entry, sort_keys=True))
+        out.write('\n')
+    out.flush()
+
+
+def put_pages(pages, stopped, entry_pages):
+    """Puts each page of entries that has any on the queue, until
+    ``stopped`` is set."""
+    for entries in entry_pages:
+        if stopped.is_set():
+            return
+        if entries:
+            pages.put(entries)
+
+
+def discard_pages(pages, workers):
+    """Takes pages off the queue until ``workers`` workers have put the None
+    that marks their end."""
+    while workers:
+        if pages.get() is None:
+            workers -= 1
+
+
+def read_logs(project_id, log_names, out, since=None, until=None,
+              extra_filter=None, page_size=1000, workers=10,
+              service_factory=get_logging_service):
+    """Writes the entries of ``log_names`` to ``out`` as NDJSON.
+
+    Each log is read on a worker thread; pages are written in the order they
+    arrive, so entries of different logs are interleaved, but the entries of
+    one log are in timestamp order.
+
+    Returns:
+        A dict of log name to the error that stopped reading it.
+    """
+    # A bounded queue keeps fast workers from buffering whole logs while
+    # the output is slower.
+    pages = queue.Queue(maxsize=workers * 2)
+    errors = {}
+    # Set when the pages are no longer being written, so the workers stop.
+    stopped = threading.Event()
+
+    def read_log(log_name):
+        try:
+            filter_ = entries_filter(
+                project_id, log_name, since, until, extra_filter)
+            put_pages(pages, stopped, iter_entry_pages(
+                service_factory(), project_id, filter_, page_size))
+        except Exception as e:
+            errors[log_name] = e
+        finally:
+            pages.put(None)
+
+    pool = ThreadPool(max(1, min(workers, len(log_names))))
+    for log_name in log_names:
+        pool.apply_async(read_log, (log_name,))
+
+    remaining = len(log_names)
+    try:
+        while remaining:
+            entries = pages.get()
+            if entries is None:
+                remaining -= 1
+            else:
+                write_entries(entries, out)
+    finally:
+        # If writing failed or was interrupted, workers may be blocked on
+        # the full queue. Take pages until each of them has stopped, or
+        # joining the pool would never return.
+        stopped.set()
+        discard_pages(pages, remaining)
+        pool.close()
+        pool.join()
+
+    return errors
+
+
+def follow(project_id, out, since, log_names=None, extra_filter=None,
+           page_size=1000, poll_interval=5, polls=None,
+           logging_service=None):
+    """Polls for entries newer than ``since`` and writes them as NDJSON.
+
+    Each poll asks for entries at or after the newest timestamp written so
+    far and skips the ones already written at exactly that timestamp, using
+    their insertId.
+
+    Args:
+        log_names: The logs to follow. None follows every log.
+        polls: How many times to poll. None polls until interrupted.
+    """
+    logging_service = logging_service or get_logging_service()
+    last_timestamp = since
+    # insertIds of the entries written at last_timestamp.
+    seen = set()
+
+    while True:
+        filter_ = entries_filter(
+            project_id, since=last_timestamp, extra_filter=extra_filter,
+            log_names=log_names)
+        for entries in iter_entry_pages(
+                logging_service, project_id, filter_, page_size):
+            new_entries = []
+            for entry in entries:
+                if (entry['timestamp'] == last_timestamp and
+                        entry.get('insertId') in seen):
+                    continue
+                if entry['timestamp'] != last_timestamp:
+                    last_timestamp = entry['timestamp']
+                    seen = set()
+                seen.add(entry.get('insertId'))
+                new_entries.append(entry)
+            write_entries(new_entries, out)
+
+        if polls is not None:
+            polls -= 1
+            if polls <= 0:
+                return
+        time.sleep(poll_interval)
+
+
+def main(project_id, log_names, minutes, extra_filter, page_size, workers,
+         follow_logs):
+    now = datetime.datetime.utcnow()
+    since = format_rfc3339(now - datetime.timedelta(minutes=minutes))
+    # Following picks up exactly where reading stops.
+    until = format_rfc3339(now) if follow_logs else None
+
+    logs_to_read = log_names or list_log_names(
+        project_id, get_logging_service('v1beta3'))
+
+    errors = read_logs(
+        project_id, logs_to_read, sys.stdout, since=since, until=until,
+        extra_filter=extra_filter, page_size=page_size, workers=workers)
+    for log_name, error in errors.items():
+        sys.stderr.write('Failed to read {}: {}\n'.format(log_name, error))
+
+    if follow_logs:
+        # Without --logs, follow every log, including ones created since
+        # they were listed.
+        follow(project_id, sys.stdout, until, log_names=log_names or None,
+               extra_filter=extra_filter, page_size=page_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('project_id', help='Your Google Cloud project ID.')
+    parser.add_argument(
+        '--logs', nargs='*', default=[],
+        help='The logs to read. Defaults to every log in the project.')
+    parser.add_argument(
+        '--minutes', type=int, default=60,
+        help='How many minutes back to start reading from.')
+    parser.add_argument('--filter', help='An additional advanced filter.')
+    parser.add_argument(
+        '--page_size', type=int, default=1000,
+        help='How many entries to request per page.')
+    parser.add_argument(
+        '--workers', type=int, default=10,
+        help='How many logs to read at the same time.')
+    parser.add_argument(
+        '--follow', action='store_true',
+        help='Keep polling for new entries after reading.')
+
+    args = parser.parse_args()
+
+    main(args.project_id, args.logs, args.minutes, args.filter,
+         args.page_size, args.workers, args.follow)
@@ -0,0 +1,141 @@
+# Copyright 2016 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import json
+
+import mock
+import pytest
+import read_logs
+
+
+def entry(log_name, timestamp, insert_id):
+    return {'logName': log_name, 'timestamp': timestamp,
+            'insertId': insert_id}
+
+
+def new_output():
+    # json.dumps returns bytes on Python 2.
+    return io.BytesIO() if str is bytes else io.StringIO()
+
+
+def fake_service(pages_by_filter):
+    """Returns a logging service whose entries.list returns the pages listed
+    for the first filter clause, chained with nextPageToken."""
+    service = mock.Mock()
+
+    def list_entries(body):
+        pages = pages_by_filter[body['filter'].split(' AND ')[0]]
+        index = int(body.get('pageToken', 0))
+        response = {'entries': pages[index]}
+        if index + 1 < len(pages):
+            response['nextPageToken'] = str(index + 1)
+        return mock.Mock(execute=mock.Mock(return_value=response))
+
+    service.entries.return_value.list.side_effect = list_entries
+    return service
+
+
+def test_entries_filter():
+    assert read_logs.entries_filter(
+        'p', 'appengine.googleapis.com/request_log', since='a', until='b',
+        extra_filter='severity>=ERROR') == (
+        'logName="projects/p/logs/appengine.googleapis.com%2Frequest_log" '
+        'AND timestamp>="a" AND timestamp<"b" AND (severity>=ERROR)')
+
+
+def test_read_logs_reads_every_page_of_every_log():
+    service = fake_service({
+        'logName="projects/p/logs/a"': [
+            [entry('a', '1', 'a1')], [entry('a', '2', 'a2')]],
+        'logName="projects/p/logs/b"': [[entry('b', '1', 'b1')]],
+    })
+    out = new_output()
+
+    errors = read_logs.read_logs(
+        'p', ['a', 'b'], out, workers=2, service_factory=lambda: service)
+
+    assert errors == {}
+    entries = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert sorted(e['insertId'] for e in entries) == ['a1', 'a2', 'b1']
+    a_entries = [e['insertId'] for e in entries if e['logName'] == 'a']
+    assert a_entries == ['a1', 'a2']
+
+
+def test_read_logs_reports_errors():
+    service = mock.Mock()
+    service.entries.return_value.list.side_effect = ValueError('boom')
+    out = new_output()
+
+    errors = read_logs.read_logs(
+        'p', ['a'], out, service_factory=lambda: service)
+
+    assert list(errors) == ['a']
+    assert out.getvalue() == ''
+
+
+def test_read_logs_stops_workers_when_writing_fails():
+    service = fake_service({
+        'logName="projects/p/logs/{}"'.format(name): [
+            [entry(name, str(i), str(i))] for i in range(20)]
+        for name in 'ab'})
+    out = mock.Mock()
+    out.write.side_effect = IOError('broken pipe')
+
+    # The workers, blocked on the full queue, must not keep this from
+    # returning.
+    with pytest.raises(IOError):
+        read_logs.read_logs(
+            'p', ['a', 'b'], out, workers=1,
+            service_factory=lambda: service)
+
+    assert service.entries.return_value.list.call_count < 40
+
+
+def test_follow_skips_entries_already_written():
+    service = mock.Mock()
+    responses = [
+        {'entries': [entry('a', '1', 'x'), entry('a', '2', 'y')]},
+        # The second poll starts at timestamp 2 and sees y again.
+        {'entries': [entry('a', '2', 'y'), entry('a', '2', 'z'),
+                     entry('a', '3', 'w')]},
+    ]
+    service.entries.return_value.list.return_value.execute.side_effect = (
+        responses)
+    out = new_output()
+
+    with mock.patch('time.sleep'):
+        read_logs.follow(
+            'p', out, '0', polls=2, logging_service=service)
+
+    written = [json.loads(line)['insertId']
+               for line in out.getvalue().splitlines()]
+    assert written == ['x', 'y', 'z', 'w']
+    second_filter = (
+        service.entries.return_value.list.call_args[1]['body']['filter'])
+    assert second_filter == 'timestamp>="2"'
+
+
+def test_follow_only_named_logs():
+    service = mock.Mock()
+    service.entries.return_value.list.return_value.execute.return_value = {}
+
+    read_logs.follow(
+        'p', new_output(), '0', log_names=['a', 'b'], polls=1,
+        logging_service=service)
+
+    assert service.entries.return_value.list.call_args[1]['body'][
+        'filter'] == (
+        '(logName="projects/p/logs/a" OR logName="projects/p/logs/b") '
+        'AND timestamp>="0"')
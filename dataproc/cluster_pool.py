@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs PySpark jobs on a pool of Dataproc clusters that are kept warm.
+
+Creating a cluster takes minutes, so instead of creating one per job and
+deleting it afterward, clusters are kept for reuse and deleted only once
+they have been idle for a while. The pool is recorded in a local JSON file,
+so successive runs of this program share it.
+
+Example:
+
+    $ python cluster_pool.py submit --project_id=<your-project-id> \\
+        --zone=us-central1-b --gcs_bucket=<your-input-bucket-name>
+    $ python cluster_pool.py reap --project_id=<your-project-id>
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import time
+
+import create_cluster_and_submit_job as dataproc_sample
+from googleapiclient.errors import HttpError
+import waiter
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_POOL_FILE = os.path.join(
+    os.path.expanduser('~'), '.dataproc_cluster_pool.json')
+
+# Delete a cluster once it has run no job for this many seconds.
+DEFAULT_IDLE_TTL_SECS = 30 * 60
+
+# Create another cluster for a zone only while all of its clusters are busy
+# and there are fewer than this many.
+DEFAULT_MAX_CLUSTERS = 2
+
+# Jobs in these states no longer keep their cluster busy.
+FINISHED_JOB_STATES = ('DONE', 'ERROR', 'CANCELLED')
+
+
+@contextlib.contextmanager
+def locked_state(path):
+    """Loads the pool state from ``path``, yields it, and saves it when the
+    block exits, holding a lock on it so concurrent runs take turns."""
+    lock_file = open(path + '.lock', 'a')
+    try:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        state = {'clusters': {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+
+        yield state
+
+        # Write a new file and move it into place, so that the state is
+        # never left half written.
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.rename(temp_path, path)
+    finally:
+        lock_file.close()
+
+
+class ClusterPool(object):
+    """Hands out running clusters, creating and deleting them as needed.
+
+    Clusters are grouped by configuration, which for this sample is the
+    project and zone. For each cluster the pool records the jobs it is
+    running and when it was last used.
+
+    Args:
+        dataproc: The Dataproc API client.
+        project: The project to create clusters in.
+        pool_file: The JSON file to keep the pool state in.
+        idle_ttl: Seconds a cluster may be idle before it is deleted.
+        max_clusters: How many clusters to keep per configuration.
+        prefix: The prefix of the names of clusters the pool creates.
+        clock: Returns the current time in seconds; for tests.
+        poller: The waiter.Waiter to wait for clusters with.
+    """
+
+    def __init__(self, dataproc, project, pool_file=DEFAULT_POOL_FILE,
+                 idle_ttl=DEFAULT_IDLE_TTL_SECS,
+                 max_clusters=DEFAULT_MAX_CLUSTERS, prefix='pool',
+                 clock=time.time, poller=None):
+        self.dataproc = dataproc
+        self.project = project
+        self.pool_file = pool_file
+        self.idle_ttl = idle_ttl
+        self.max_clusters = max_clusters
+        self.prefix = prefix
+        self.clock = clock
+        self.poller = poller or waiter.Waiter(dataproc, project)
+
+    def _clusters(self, state, zone=None):
+        """Returns the (name, record) pairs of this project's clusters, in
+        ``zone`` if given."""
+        return sorted(
+            (name, record) for name, record in state['clusters'].items()
+            if record['project'] == self.project and
+            (zone is None or record['zone'] == zone))
+
+    def _refresh_jobs(self, record):
+        """Forgets the jobs of a cluster that have finished."""
+        running = []
+        for job_id in record['jobs']:
+            try:
+                result = self.dataproc.projects().regions().jobs().get(
+                    projectId=self.project, region=waiter.REGION,
+                    jobId=job_id).execute()
+            except HttpError as e:
+                if e.resp.status == 404:
+                    continue
+                raise
+            if result['status']['state'] not in FINISHED_JOB_STATES:
+                running.append(job_id)
+        if len(running) != len(record['jobs']):
+            record['jobs'] = running
+            record['last_used'] = self.clock()
+
+    def _cluster_exists(self, name):
+        try:
+            self.dataproc.projects().regions().clusters().get(
+                projectId=self.project, region=waiter.REGION,
+                clusterName=name).execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                return False
+            raise
+        return True
+
+    def _new_name(self, state, zone):
+        names = set(state['clusters'])
+        index = 0
+        while True:
+            name = '{}-{}-{}'.format(self.prefix, zone, index)
+            if name not in names:
+                return name
+            index += 1
+
+    def acquire(self, zone):
+        """Returns the name of a running cluster in ``zone``, preferring the
+        least busy one, and creating one if the pool has none free."""
+        with locked_state(self.pool_file) as state:
+            for name, record in self._clusters(state, zone):
+                self._refresh_jobs(record)
+                if not self._cluster_exists(name):
+                    del state['clusters'][name]
+
+            candidates = sorted(
+                (len(record['jobs']), name)
+                for name, record in self._clusters(state, zone))
+            if candidates and (candidates[0][0] == 0 or
+                               len(candidates) >= self.max_clusters):
+                name = candidates[0][1]
+            else:
+                name = self._new_name(state, zone)
+                dataproc_sample.create_cluster(
+                    self.dataproc, self.project, name, zone)
+            state['clusters'][name] = record = state['clusters'].get(
+                name, {'project': self.project, 'zone': zone, 'jobs': []})
+            record['last_used'] = self.clock()
+
+        # Another run may have created the cluster and not waited for it.
+        try:
+            self.poller.wait(waiter.cluster(name),
+                             timeout=dataproc_sample.CLUSTER_TIMEOUT_SECS)
+        except waiter.WaitError:
+            # A cluster that failed or never started is of no use.
+            self.remove(name)
+            raise
+        return name
+
+    def submit(self, cluster_name, bucket_name, filename):
+        """Submits a PySpark job to a cluster from the pool and records it
+        as running there."""
+        job_id = dataproc_sample.submit_pyspark_job(
+            self.dataproc, self.project, cluster_name, bucket_name, filename)
+        with locked_state(self.pool_file) as state:
+            record = state['clusters'][cluster_name]
+            record['jobs'].append(job_id)
+            record['last_used'] = self.clock()
+        return job_id
+
+    def release(self, cluster_name, job_id):
+        """Records that a job has finished with its cluster."""
+        with locked_state(self.pool_file) as state:
+            record = state['clusters'].get(cluster_name)
+            if record is not None:
+                if job_id in record['jobs']:
+                    record['jobs'].remove(job_id)
+                record['last_used'] = self.clock()
+
+    def remove(self, cluster_name):
+        """Deletes a cluster and removes it from the pool."""
+        with locked_state(self.pool_file) as state:
+            state['clusters'].pop(cluster_name, None)
+        dataproc_sample.delete_cluster(
+            self.dataproc, self.project, cluster_name)
+
+    def reap(self):
+        """Deletes the clusters that have been idle for longer than the idle
+        TTL, and returns their names."""
+        idle = []
+        with locked_state(self.pool_file) as state:
+            for name, record in self._clusters(state):
+                self._refresh_jobs(record)
+                if (not record['jobs'] and
+                        self.clock() - record['last_used'] >= self.idle_ttl):
+                    del state['clusters'][name]
+                    idle.append(name)
+
+        for name in idle:
+            try:
+                dataproc_sample.delete_cluster(
+                    self.dataproc, self.project, name)
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+        return idle
+
+    def status(self):
+        """Returns the (name, record) pairs of the pool's clusters."""
+        with locked_state(self.pool_file) as state:
+            for _, record in self._clusters(state):
+                self._refresh_jobs(record)
+            return self._clusters(state)
+
+
+def submit(pool, zone, bucket_name, pyspark_file=None):
+    """Runs a PySpark job on a cluster from the pool and returns its
+    output."""
+    if pyspark_file:
+        spark_file, spark_filename = dataproc_sample.get_pyspark_file(
+            pyspark_file)
+    else:
+        spark_file, spark_filename = (
+            dataproc_sample.get_default_pyspark_file())
+
+    try:
+        dataproc_sample.upload_pyspark_file(
+            pool.project, bucket_name, spark_filename, spark_file)
+    finally:
+        spark_file.close()
+
+    cluster_name = pool.acquire(zone)
+    job_id = pool.submit(cluster_name, bucket_name, spark_filename)
+    try:
+        dataproc_sample.wait_for_job(pool.dataproc, pool.project, job_id)
+    finally:
+        pool.release(cluster_name, job_id)
+
+    cluster = pool.dataproc.projects().regions().clusters().get(
+        projectId=pool.project, region=waiter.REGION,
+        clusterName=cluster_name).execute()
+    output = dataproc_sample.download_output(
+        pool.project, cluster['clusterUuid'],
+        cluster['config']['configBucket'], job_id)
+    print('Received job output {}'.format(output))
+    return output
+
+
+def main(command, project_id, zone=None, bucket_name=None, pyspark_file=None,
+         pool_file=DEFAULT_POOL_FILE, idle_ttl=DEFAULT_IDLE_TTL_SECS,
+         max_clusters=DEFAULT_MAX_CLUSTERS):
+    pool = ClusterPool(
+        dataproc_sample.get_client(), project_id, pool_file=pool_file,
+        idle_ttl=idle_ttl, max_clusters=max_clusters)
+
+    if command == 'submit':
+        output = submit(pool, zone, bucket_name, pyspark_file)
+    elif command == 'status':
+        for name, record in pool.status():
+            print('{} - {} jobs running, last used {}'.format(
+                name, len(record['jobs']),
+                time.strftime('%Y-%m-%d %H:%M:%S',
+                              time.localtime(record['last_used']))))
+        return
+
+    # Every run deletes the clusters that have been idle for too long.
+    for name in pool.reap():
+        print('Deleted idle cluster {}'.format(name))
+    if command == 'submit':
+        return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        'command', choices=('submit', 'reap', 'status'),
+        help='Submit a job, delete idle clusters, or list the pool.')
+    parser.add_argument(
+        '--project_id', help='Project ID you want to access.', required=True)
+    parser.add_argument(
+        '--zone', help='Zone to create clusters in')
+    parser.add_argument(
+        '--gcs_bucket', help='Bucket to upload Pyspark file to')
+    parser.add_argument(
+        '--pyspark_file', help='Pyspark filename. Defaults to pyspark_sort.py')
+    parser.add_argument(
+        '--pool_file', default=DEFAULT_POOL_FILE,
+        help='The file to keep the state of the pool in.')
+    parser.add_argument(
+        '--idle_ttl', type=int, default=DEFAULT_IDLE_TTL_SECS,
+        help='Delete clusters that have been idle this many seconds.')
+    parser.add_argument(
+        '--max_clusters', type=int, default=DEFAULT_MAX_CLUSTERS,
+        help='The most clusters to keep per zone.')
+
+    args = parser.parse_args()
+    if args.command == 'submit' and not (args.zone and args.gcs_bucket):
+        parser.error('submit needs --zone and --gcs_bucket')
+    main(
+        args.command, args.project_id, args.zone, args.gcs_bucket,
+        args.pyspark_file, args.pool_file, args.idle_ttl, args.max_clusters)
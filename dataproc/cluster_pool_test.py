@@ -0,0 +1,92 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cluster_pool
+import create_cluster_and_submit_job as dataproc_sample
+import mock
+import pytest
+
+ZONE = 'us-central1-b'
+
+
+@pytest.fixture
+def sample(monkeypatch):
+    """Replaces the sample's API calls, and tracks the jobs submitted."""
+    sample = mock.Mock()
+    sample.jobs = {}
+
+    def submit_pyspark_job(dataproc, project, cluster_name, bucket, filename):
+        job_id = 'job-{}'.format(len(sample.jobs))
+        sample.jobs[job_id] = 'RUNNING'
+        return job_id
+
+    sample.submit_pyspark_job.side_effect = submit_pyspark_job
+    for name in ('create_cluster', 'delete_cluster', 'submit_pyspark_job'):
+        monkeypatch.setattr(dataproc_sample, name, getattr(sample, name))
+    return sample
+
+
+def make_pool(sample, tmpdir, clock):
+    dataproc = mock.MagicMock()
+    jobs = dataproc.projects.return_value.regions.return_value.jobs
+
+    def get_job(projectId, region, jobId):
+        request = mock.Mock()
+        request.execute.return_value = {
+            'status': {'state': sample.jobs[jobId]}}
+        return request
+
+    jobs.return_value.get.side_effect = get_job
+    return cluster_pool.ClusterPool(
+        dataproc, 'project', pool_file=str(tmpdir.join('pool.json')),
+        idle_ttl=600, max_clusters=2, clock=clock, poller=mock.Mock())
+
+
+def test_pool_reuses_clusters_and_reaps_idle_ones(sample, tmpdir):
+    now = [1000]
+    pool = make_pool(sample, tmpdir, lambda: now[0])
+
+    first = pool.acquire(ZONE)
+    job = pool.submit(first, 'bucket', 'job.py')
+    # The first cluster is busy, so a second one is created...
+    second = pool.acquire(ZONE)
+    assert second != first
+    pool.submit(second, 'bucket', 'job.py')
+    # ...but no more than two; the least busy one is shared.
+    assert pool.acquire(ZONE) in (first, second)
+    assert sample.create_cluster.call_count == 2
+
+    # Once its job is done, the first cluster is handed out again, from a
+    # new pool reading the same file.
+    sample.jobs[job] = 'DONE'
+    pool.release(first, job)
+    pool = make_pool(sample, tmpdir, lambda: now[0])
+    assert pool.acquire(ZONE) == first
+    assert sample.create_cluster.call_count == 2
+
+    # Only the idle cluster is deleted once the TTL has passed.
+    now[0] += 601
+    assert pool.reap() == [first]
+    sample.delete_cluster.assert_called_once_with(
+        pool.dataproc, 'project', first)
+    assert [name for name, _ in pool.status()] == [second]
+
+
+def test_failed_cluster_is_removed(sample, tmpdir):
+    pool = make_pool(sample, tmpdir, lambda: 0)
+    pool.poller.wait.side_effect = cluster_pool.waiter.WaitError('ERROR')
+
+    with pytest.raises(cluster_pool.waiter.WaitError):
+        pool.acquire(ZONE)
+
+    assert sample.delete_cluster.call_count == 1
+    assert pool.status() == []
@@ -15,15 +15,21 @@
 
 import argparse
 import os
+import time
 
 from apiclient import discovery
 from gcloud import storage
 from oauth2client.client import GoogleCredentials
+import waiter
 
 # Currently only the "global" region is supported
 REGION = 'global'
 DEFAULT_FILENAME = 'pyspark_sort.py'
 
+# Give up waiting for a cluster or job after this many seconds.
+CLUSTER_TIMEOUT_SECS = 15 * 60
+JOB_TIMEOUT_SECS = 60 * 60
+
 
 def get_default_pyspark_file():
     """Gets the PySpark file from this directory"""
@@ -83,21 +89,12 @@ def create_cluster(dataproc, project, cluster_name, zone):
 
 
 def wait_for_cluster_creation(dataproc, project_id, cluster_name, zone):
+    """Waits for the cluster to be running and returns it."""
     print('Waiting for cluster creation')
-
-    while True:
-        result = dataproc.projects().regions().clusters().list(
-            projectId=project_id,
-            region=REGION).execute()
-        cluster_list = result['clusters']
-        cluster = [c
-                   for c in cluster_list
-                   if c['clusterName'] == cluster_name][0]
-        if cluster['status']['state'] == 'ERROR':
-            raise Exception(result['status']['details'])
-        if cluster['status']['state'] == 'RUNNING':
-            print("Cluster created.")
-            break
+    cluster = waiter.Waiter(dataproc, project_id).wait(
+        waiter.cluster(cluster_name), timeout=CLUSTER_TIMEOUT_SECS)
+    print("Cluster created.")
+    return cluster
 
 
 # [START list_clusters_with_detail]
@@ -157,8 +154,10 @@ def delete_cluster(dataproc, project, cluster):
 
 
 # [START wait]
-def wait_for_job(dataproc, project, job_id):
+def wait_for_job(dataproc, project, job_id, timeout=JOB_TIMEOUT_SECS):
     print('Waiting for job to finish...')
+    deadline = time.time() + timeout
+    delay = 1
     while True:
         result = dataproc.projects().regions().jobs().get(
             projectId=project,
@@ -170,6 +169,12 @@ def wait_for_job(dataproc, project, job_id):
         elif result['status']['state'] == 'DONE':
             print('Job finished')
             return result
+
+        if time.time() + delay > deadline:
+            raise Exception('Timed out waiting for job {}'.format(job_id))
+        # Check less often the longer the job runs, up to every 30 seconds.
+        time.sleep(delay)
+        delay = min(delay * 2, 30)
 # [END wait]
 
 
@@ -192,14 +197,13 @@ def main(project_id, zone, cluster_name, bucket_name, pyspark_file=None):
             spark_file, spark_filename = get_default_pyspark_file()
 
         create_cluster(dataproc, project_id, cluster_name, zone)
-        wait_for_cluster_creation(dataproc, project_id, cluster_name, zone)
+        cluster = wait_for_cluster_creation(
+            dataproc, project_id, cluster_name, zone)
         upload_pyspark_file(project_id, bucket_name,
                             spark_filename, spark_file)
-        cluster_list = list_clusters_with_details(
-            dataproc, project_id)['clusters']
 
         (cluster_id, output_bucket) = (
-            get_cluster_id_by_name(cluster_list, cluster_name))
+            get_cluster_id_by_name([cluster], cluster_name))
         # [START call_submit_pyspark_job]
         job_id = submit_pyspark_job(
             dataproc, project_id, cluster_name, bucket_name, spark_filename)
@@ -0,0 +1,229 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Waits for Dataproc clusters, jobs and operations to finish.
+
+Each resource is polled with a get request for it alone, at intervals that
+grow exponentially with random jitter, up to an overall timeout. Any number
+of resources can be waited on together from one thread: the next one due is
+polled while the others wait their turn.
+"""
+
+import collections
+import heapq
+import random
+import time
+
+from googleapiclient.errors import HttpError
+
+REGION = 'global'
+
+# A cluster, job or operation to wait for. ``kind`` is one of the keys of
+# _POLLERS and ``name`` is the cluster name, job ID or operation name.
+Target = collections.namedtuple('Target', 'kind name')
+
+# Poll again after these HTTP errors, which are expected to pass.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# A resource that was just created may not be found for a little while.
+# After this many seconds it is taken to have been deleted, or never to have
+# been created.
+NOT_FOUND_GRACE_SECS = 60
+
+
+class WaitError(Exception):
+    """A cluster, job or operation failed, or did not finish in time."""
+
+
+def cluster(name):
+    return Target('cluster', name)
+
+
+def job(job_id):
+    return Target('job', job_id)
+
+
+def operation(name):
+    return Target('operation', name)
+
+
+def _get_cluster(dataproc, project, name):
+    return dataproc.projects().regions().clusters().get(
+        projectId=project, region=REGION, clusterName=name)
+
+
+def _get_job(dataproc, project, job_id):
+    return dataproc.projects().regions().jobs().get(
+        projectId=project, region=REGION, jobId=job_id)
+
+
+def _get_operation(dataproc, project, name):
+    return dataproc.projects().regions().operations().get(name=name)
+
+
+def _status_state(result):
+    status = result['status']
+    return status['state'], status.get('details') or status.get('detail')
+
+
+def _operation_state(result):
+    if 'error' in result:
+        return 'ERROR', result['error'].get('message')
+    return ('DONE' if result.get('done') else 'RUNNING'), None
+
+
+# For each kind of target: how to request it, how to read its state and
+# details from the response, and the states in which it has succeeded and
+# failed.
+_POLLERS = {
+    'cluster': (_get_cluster, _status_state, ('RUNNING',), ('ERROR',)),
+    'job': (_get_job, _status_state, ('DONE',), ('ERROR', 'CANCELLED')),
+    'operation': (_get_operation, _operation_state, ('DONE',), ('ERROR',)),
+}
+
+
+class Backoff(object):
+    """Yields exponentially growing delays, each shortened by a random
+    fraction of up to ``jitter`` so that many pollers do not fall into
+    step."""
+
+    def __init__(self, initial=1.0, maximum=30.0, multiplier=2.0, jitter=0.5):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def __iter__(self):
+        delay = self.initial
+        while True:
+            yield delay * random.uniform(1 - self.jitter, 1)
+            delay = min(delay * self.multiplier, self.maximum)
+
+
+def print_transition(timestamp, target, state, details):
+    print('{} {} {} is {}{}'.format(
+        time.strftime('%H:%M:%S', time.localtime(timestamp)),
+        target.kind, target.name, state,
+        ': {}'.format(details) if details else ''))
+
+
+class Waiter(object):
+    """Polls Dataproc until clusters, jobs and operations finish.
+
+    Args:
+        dataproc: The Dataproc API client.
+        project: The project the resources are in.
+        backoff: The Backoff to space polls of each resource with.
+        on_transition: Called with the time, target, state and details each
+            time a resource is seen in a new state.
+        not_found_grace: Seconds to keep polling a resource that is not
+            found, before raising WaitError.
+        clock: Returns the current time in seconds; for tests.
+        sleep: Sleeps for a number of seconds; for tests.
+    """
+
+    def __init__(self, dataproc, project, backoff=None,
+                 on_transition=print_transition,
+                 not_found_grace=NOT_FOUND_GRACE_SECS, clock=time.time,
+                 sleep=time.sleep):
+        self.dataproc = dataproc
+        self.project = project
+        self.backoff = backoff or Backoff()
+        self.on_transition = on_transition
+        self.not_found_grace = not_found_grace
+        self.clock = clock
+        self.sleep = sleep
+
+        # (time, target, state) for every state change seen.
+        self.transitions = []
+        self.polls = 0
+
+    def _poll(self, target, not_found_deadline):
+        """Returns the latest response for ``target`` and its state, or
+        None and None after a transient error."""
+        get, read_state, _, _ = _POLLERS[target.kind]
+        self.polls += 1
+        try:
+            result = get(self.dataproc, self.project, target.name).execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                if self.clock() < not_found_deadline:
+                    return None, None
+                raise WaitError('{} {} was not found'.format(
+                    target.kind, target.name))
+            if e.resp.status in RETRY_STATUSES:
+                return None, None
+            raise
+        return result, read_state(result)
+
+    def wait_all(self, targets, timeout=None):
+        """Waits until every target has succeeded or failed.
+
+        Returns:
+            A dict from each target to its last response.
+
+        Raises:
+            WaitError: If ``timeout`` seconds pass first, or a target is
+                still not found after the grace period.
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        not_found_deadline = self.clock() + self.not_found_grace
+        states = {}
+        results = {}
+        # (next poll time, order added, target, delays) for each target
+        # still running.
+        pending = [(self.clock(), i, target, iter(self.backoff))
+                   for i, target in enumerate(targets)]
+        heapq.heapify(pending)
+
+        while pending:
+            due, i, target, delays = heapq.heappop(pending)
+            now = self.clock()
+            if deadline is not None and due > deadline:
+                raise WaitError('Timed out waiting for {} {}'.format(
+                    target.kind, target.name))
+            if due > now:
+                self.sleep(due - now)
+
+            result, status = self._poll(target, not_found_deadline)
+            if result is not None:
+                results[target] = result
+                state, details = status
+                if states.get(target) != state:
+                    states[target] = state
+                    now = self.clock()
+                    self.transitions.append((now, target, state))
+                    if self.on_transition:
+                        self.on_transition(now, target, state, details)
+
+                _, _, succeeded, failed = _POLLERS[target.kind]
+                if state in succeeded or state in failed:
+                    continue
+
+            heapq.heappush(
+                pending, (self.clock() + next(delays), i, target, delays))
+
+        return results
+
+    def wait(self, target, timeout=None):
+        """Waits for one target to succeed and returns its last response.
+
+        Raises:
+            WaitError: If it fails, or ``timeout`` seconds pass first.
+        """
+        result = self.wait_all([target], timeout)[target]
+        _, read_state, succeeded, _ = _POLLERS[target.kind]
+        state, details = read_state(result)
+        if state not in succeeded:
+            raise WaitError('{} {} is {}: {}'.format(
+                target.kind, target.name, state, details))
+        return result
@@ -0,0 +1,125 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from googleapiclient.errors import HttpError
+import httplib2
+import mock
+import pytest
+import waiter
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def execute_returning(responses):
+    """Returns a fake request factory whose requests return, for each name,
+    the next of its responses."""
+    def request(**kwargs):
+        name = (kwargs.get('clusterName') or kwargs.get('jobId') or
+                kwargs.get('name'))
+        response = responses[name].pop(0)
+        request = mock.Mock()
+        if isinstance(response, Exception):
+            request.execute.side_effect = response
+        else:
+            request.execute.return_value = response
+        return request
+    return request
+
+
+def status(state):
+    return {'status': {'state': state}}
+
+
+def make_waiter(dataproc, clock):
+    return waiter.Waiter(
+        dataproc, 'project',
+        backoff=waiter.Backoff(initial=1, maximum=4, jitter=0),
+        on_transition=None, not_found_grace=10, clock=clock,
+        sleep=clock.sleep)
+
+
+def test_backoff_grows_to_maximum():
+    delays = iter(waiter.Backoff(initial=1, maximum=5, jitter=0.5))
+    values = [next(delays) for _ in range(6)]
+
+    for value, limit in zip(values, [1, 2, 4, 5, 5, 5]):
+        assert limit / 2.0 <= value <= limit
+
+
+def test_wait_all_polls_each_target_with_backoff():
+    clock = FakeClock()
+    dataproc = mock.MagicMock()
+    regions = dataproc.projects.return_value.regions.return_value
+    not_found = HttpError(httplib2.Response({'status': 404}), b'')
+    regions.clusters.return_value.get.side_effect = execute_returning({
+        'cluster-1': [not_found, status('CREATING'), status('CREATING'),
+                      status('RUNNING')]})
+    regions.jobs.return_value.get.side_effect = execute_returning({
+        'job-1': [status('PENDING'), status('RUNNING'), status('DONE')],
+        'job-2': [status('ERROR')]})
+
+    poller = make_waiter(dataproc, clock)
+    targets = [waiter.cluster('cluster-1'), waiter.job('job-1'),
+               waiter.job('job-2')]
+    results = poller.wait_all(targets)
+
+    assert results[waiter.job('job-2')] == status('ERROR')
+    assert poller.polls == 8
+    # The cluster was polled at 0, 1, 3 and 7 seconds.
+    assert clock.now == 7
+    assert [(t, target.name, state)
+            for t, target, state in poller.transitions
+            if target.kind == 'cluster'] == [
+                (1, 'cluster-1', 'CREATING'), (7, 'cluster-1', 'RUNNING')]
+
+
+def test_wait_raises_on_failure_and_timeout():
+    clock = FakeClock()
+    dataproc = mock.MagicMock()
+    regions = dataproc.projects.return_value.regions.return_value
+    regions.jobs.return_value.get.side_effect = execute_returning({
+        'failed': [{'status': {'state': 'ERROR', 'details': 'Boom'}}],
+        'slow': [status('RUNNING')] * 10})
+
+    poller = make_waiter(dataproc, clock)
+    with pytest.raises(waiter.WaitError) as e:
+        poller.wait(waiter.job('failed'))
+    assert 'Boom' in str(e.value)
+
+    with pytest.raises(waiter.WaitError):
+        poller.wait(waiter.job('slow'), timeout=10)
+    assert clock.now <= 10
+
+
+def test_wait_gives_up_on_missing_resource():
+    clock = FakeClock()
+    dataproc = mock.MagicMock()
+    regions = dataproc.projects.return_value.regions.return_value
+    not_found = HttpError(httplib2.Response({'status': 404}), b'')
+    regions.clusters.return_value.get.side_effect = execute_returning({
+        'deleted': [not_found] * 10})
+
+    poller = make_waiter(dataproc, clock)
+    with pytest.raises(waiter.WaitError) as e:
+        poller.wait(waiter.cluster('deleted'))
+    assert 'not found' in str(e.value)
+    # Polled at 0, 1, 3, 7 and 11 seconds.
+    assert clock.now == 11
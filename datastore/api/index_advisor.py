@@ -0,0 +1,185 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Recommends exclude_from_indexes lists from observed query usage.
+
+Every indexed property value costs index writes on each put, but only
+properties that are filtered, sorted, projected or made distinct on need to
+be indexed. ``RecordingClient`` is a drop-in ``datastore.Client`` that reports
+the queries it runs and the entities it puts to an ``IndexAdvisor``, which
+then recommends which properties of each kind can be excluded.
+
+The recommendations are only as good as the sampled workload: run the client
+for long enough to see every query your application issues.
+"""
+
+import argparse
+from collections import defaultdict
+import json
+import random
+import threading
+
+from gcloud import datastore
+import tasks
+
+# Cloud Datastore writes an ascending and a descending built-in index entry
+# for every indexed property value.
+INDEX_WRITES_PER_VALUE = 2
+
+
+def _value_count(value):
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    return 1
+
+
+class IndexAdvisor(object):
+    """Collects query and put activity and computes index recommendations.
+
+    Args:
+        sample_rate: The fraction of puts to record. Every query is
+            recorded, because a property whose query was missed by the
+            sample would be recommended for exclusion, breaking that query.
+    """
+
+    def __init__(self, sample_rate=1.0):
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Discards everything recorded so far, starting a new window."""
+        with self._lock:
+            # kind -> properties that queries depend on being indexed.
+            self._queried = defaultdict(set)
+            # kind -> number of puts seen.
+            self._puts = defaultdict(int)
+            # kind -> property -> number of indexed values written.
+            self._indexed_values = defaultdict(lambda: defaultdict(int))
+            # kind -> properties the application already excludes.
+            self._excluded = defaultdict(set)
+
+    def _sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record_query(self, query):
+        if query.kind is None:
+            return
+
+        properties = set(name for name, _, _ in query.filters)
+        properties.update(name.lstrip('-') for name in query.order)
+        properties.update(query.projection)
+        properties.update(query.distinct_on)
+        properties.discard('__key__')
+
+        with self._lock:
+            self._queried[query.kind].update(properties)
+
+    def record_put(self, entity):
+        if entity.key is None or not self._sampled():
+            return
+
+        kind = entity.key.kind
+        with self._lock:
+            self._puts[kind] += 1
+            for name, value in entity.items():
+                if name in entity.exclude_from_indexes:
+                    self._excluded[kind].add(name)
+                else:
+                    self._indexed_values[kind][name] += _value_count(value)
+
+    def recommendations(self):
+        """Returns a dict of kind to its recommendation.
+
+        Each recommendation has the full ``exclude_from_indexes`` list to use
+        for the kind, the ``queried`` properties that must stay indexed, and
+        ``saved_index_writes``, the number of index writes the sampled puts
+        would have avoided.
+        """
+        result = {}
+
+        with self._lock:
+            for kind, puts in self._puts.items():
+                queried = self._queried.get(kind, set())
+                indexed = self._indexed_values.get(kind, {})
+                newly_excluded = [
+                    name for name in indexed if name not in queried]
+                excluded = set(newly_excluded) | (
+                    self._excluded.get(kind, set()) - queried)
+
+                result[kind] = {
+                    'puts': puts,
+                    'queried': sorted(queried),
+                    'exclude_from_indexes': sorted(excluded),
+                    'saved_index_writes': sum(
+                        indexed[name] * INDEX_WRITES_PER_VALUE
+                        for name in newly_excluded),
+                }
+
+        return result
+
+
+class RecordingQuery(datastore.Query):
+    """A query that reports itself to an ``IndexAdvisor`` when run."""
+
+    def __init__(self, advisor, *args, **kwargs):
+        super(RecordingQuery, self).__init__(*args, **kwargs)
+        self.advisor = advisor
+
+    def fetch(self, *args, **kwargs):
+        self.advisor.record_query(self)
+        return super(RecordingQuery, self).fetch(*args, **kwargs)
+
+
+class RecordingClient(datastore.Client):
+    """A ``datastore.Client`` that reports queries and puts to an advisor."""
+
+    def __init__(self, *args, **kwargs):
+        self.advisor = kwargs.pop('advisor', None) or IndexAdvisor()
+        super(RecordingClient, self).__init__(*args, **kwargs)
+
+    def query(self, **kwargs):
+        if 'client' in kwargs:
+            raise TypeError('Cannot pass client')
+        if 'project' in kwargs:
+            raise TypeError('Cannot pass project')
+        kwargs.setdefault('namespace', self.namespace)
+        return RecordingQuery(
+            self.advisor, self, project=self.project, **kwargs)
+
+    def put_multi(self, entities):
+        for entity in entities:
+            self.advisor.record_put(entity)
+        super(RecordingClient, self).put_multi(entities)
+
+
+def main(project_id):
+    client = RecordingClient(project_id)
+
+    # Run a sample workload: the tasks application.
+    task_key = tasks.add_task(client, 'Try the index advisor')
+    tasks.mark_done(client, task_key.id)
+    tasks.list_tasks(client)
+    tasks.delete_task(client, task_key.id)
+
+    print(json.dumps(client.advisor.recommendations(), indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Recommends exclude_from_indexes for the tasks sample.')
+    parser.add_argument('project_id', help='Your cloud project ID.')
+
+    args = parser.parse_args()
+
+    main(args.project_id)
@@ -0,0 +1,93 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from gcloud import datastore
+import index_advisor
+import mock
+import pytest
+
+
+@pytest.fixture
+def client():
+    return index_advisor.RecordingClient(
+        'project', credentials=mock.Mock(), http=mock.Mock())
+
+
+def test_recommendations(client):
+    advisor = client.advisor
+
+    query = client.query(kind='Task')
+    query.add_filter('done', '=', False)
+    query.order = ['-created']
+    with mock.patch.object(datastore.Query, 'fetch'):
+        query.fetch()
+
+    task = datastore.Entity(
+        client.key('Task', 1), exclude_from_indexes=['description'])
+    task.update({
+        'created': 'now',
+        'description': 'A task',
+        'done': False,
+        'tags': ['a', 'b', 'c'],
+        'priority': 4
+    })
+    advisor.record_put(task)
+    advisor.record_put(task)
+
+    recommendation = advisor.recommendations()['Task']
+    assert recommendation['puts'] == 2
+    assert recommendation['queried'] == ['created', 'done']
+    assert recommendation['exclude_from_indexes'] == [
+        'description', 'priority', 'tags']
+    # 2 puts * (1 priority value + 3 tags values) * 2 index writes
+    assert recommendation['saved_index_writes'] == 16
+
+
+def test_recording_client_records_puts(client):
+    task = datastore.Entity(client.key('Task', 1))
+    task['description'] = 'A task'
+
+    with mock.patch.object(datastore.Client, 'put_multi') as put_multi:
+        client.put(task)
+        put_multi.assert_called_once_with([task])
+
+    assert client.advisor.recommendations()['Task'][
+        'exclude_from_indexes'] == ['description']
+
+
+def test_queried_properties_stay_indexed(client):
+    query = client.query(
+        kind='Task', projection=['priority'], distinct_on=['type'])
+    client.advisor.record_query(query)
+
+    task = datastore.Entity(client.key('Task', 1))
+    task.update({'priority': 1, 'type': 'Personal'})
+    client.advisor.record_put(task)
+
+    recommendation = client.advisor.recommendations()['Task']
+    assert recommendation['exclude_from_indexes'] == []
+    assert recommendation['saved_index_writes'] == 0
+
+
+def test_queries_are_not_sampled(client):
+    advisor = index_advisor.IndexAdvisor(sample_rate=0.0001)
+    query = client.query(kind='Task')
+    query.add_filter('done', '=', False)
+    advisor.record_query(query)
+
+    task = datastore.Entity(client.key('Task', 1))
+    task['done'] = False
+    advisor.sample_rate = 1.0
+    advisor.record_put(task)
+
+    assert advisor.recommendations()['Task']['queried'] == ['done']
@@ -0,0 +1,184 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-memory catalog of Cloud Datastore namespaces, kinds and properties.
+
+The ``__namespace__``, ``__kind__`` and ``__property__`` metadata queries
+shown in snippets.py cost a round trip every time they are run. The catalog
+runs them once, keeps the results in memory and only queries again once they
+are older than ``ttl`` seconds or ``refresh`` is called.
+"""
+
+import argparse
+from multiprocessing.pool import ThreadPool
+from pprint import pprint
+import threading
+import time
+
+from gcloud import datastore
+
+# The default namespace is reported by __namespace__ queries with an id of 1.
+DEFAULT_NAMESPACE = ''
+
+
+def _namespace_name(key):
+    return DEFAULT_NAMESPACE if key.id == 1 else key.name
+
+
+class MetadataCatalog(object):
+    """Caches Datastore metadata and answers lookups from memory.
+
+    Args:
+        client: The datastore client used to run metadata queries.
+        ttl: How many seconds loaded metadata is served before it is
+            queried again.
+        workers: How many namespaces ``refresh`` loads concurrently.
+    """
+
+    def __init__(self, client, ttl=300, workers=8):
+        self.client = client
+        self.ttl = ttl
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._namespaces = None
+        self._namespaces_loaded_at = 0
+        # namespace -> (loaded_at, {kind: {property: [representations]}})
+        self._kinds = {}
+
+    def _expired(self, loaded_at):
+        return time.time() - loaded_at > self.ttl
+
+    def _load_namespaces(self):
+        query = self.client.query(kind='__namespace__')
+        query.keys_only()
+        namespaces = sorted(
+            _namespace_name(entity.key) for entity in query.fetch())
+
+        with self._lock:
+            self._namespaces = namespaces
+            self._namespaces_loaded_at = time.time()
+
+        return namespaces
+
+    def _load_namespace(self, namespace, client=None):
+        client = client or self.client
+        kinds = {}
+
+        query = client.query(kind='__kind__', namespace=namespace or None)
+        query.keys_only()
+        for entity in query.fetch():
+            kinds[entity.key.name] = {}
+
+        # Only indexed properties have __property__ entities.
+        query = client.query(kind='__property__', namespace=namespace or None)
+        for entity in query.fetch():
+            kind = entity.key.parent.name
+            kinds.setdefault(kind, {})[entity.key.name] = list(
+                entity['property_representation'])
+
+        with self._lock:
+            self._kinds[namespace] = (time.time(), kinds)
+
+        return kinds
+
+    def refresh(self, namespace=None):
+        """Reloads metadata from Datastore.
+
+        Args:
+            namespace: Only reload this namespace. If omitted, the list of
+                namespaces and every namespace in it are reloaded, several
+                namespaces at a time.
+        """
+        if namespace is not None:
+            self._load_namespace(namespace)
+            return
+
+        namespaces = self._load_namespaces()
+
+        def load(namespace):
+            # The HTTP connection underneath a client is not thread-safe,
+            # so each worker thread loads with its own client.
+            if not hasattr(self._local, 'client'):
+                self._local.client = datastore.Client(
+                    project=self.client.project,
+                    credentials=self.client.connection.credentials)
+            self._load_namespace(namespace, self._local.client)
+
+        pool = ThreadPool(self.workers)
+        try:
+            pool.map(load, namespaces)
+        finally:
+            pool.close()
+            pool.join()
+
+    def namespaces(self):
+        """Returns all namespace names. The default namespace is ''."""
+        with self._lock:
+            namespaces = self._namespaces
+            loaded_at = self._namespaces_loaded_at
+
+        if namespaces is None or self._expired(loaded_at):
+            namespaces = self._load_namespaces()
+
+        return list(namespaces)
+
+    def _namespace_kinds(self, namespace):
+        with self._lock:
+            loaded_at, kinds = self._kinds.get(namespace, (0, None))
+
+        if kinds is None or self._expired(loaded_at):
+            kinds = self._load_namespace(namespace)
+
+        return kinds
+
+    def kinds(self, namespace=DEFAULT_NAMESPACE):
+        """Returns the names of all kinds in ``namespace``."""
+        return sorted(self._namespace_kinds(namespace))
+
+    def indexed_properties(self, kind, namespace=DEFAULT_NAMESPACE):
+        """Returns the names of the indexed properties of ``kind``."""
+        return sorted(self._namespace_kinds(namespace).get(kind, {}))
+
+    def property_representations(self, kind, namespace=DEFAULT_NAMESPACE):
+        """Returns a dict of property name to the value types it is stored
+        with, for each indexed property of ``kind``."""
+        properties = self._namespace_kinds(namespace).get(kind, {})
+        return dict(
+            (name, list(types)) for name, types in properties.items())
+
+    def properties_by_kind(self, namespace=DEFAULT_NAMESPACE):
+        """Returns a dict of kind name to its indexed property names."""
+        return dict(
+            (kind, sorted(properties)) for kind, properties
+            in self._namespace_kinds(namespace).items())
+
+
+def main(project_id):
+    client = datastore.Client(project_id)
+    catalog = MetadataCatalog(client)
+    catalog.refresh()
+
+    for namespace in catalog.namespaces():
+        print('Namespace: {!r}'.format(namespace))
+        pprint(catalog.properties_by_kind(namespace))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Prints the kinds and properties in every namespace.')
+    parser.add_argument('project_id', help='Your cloud project ID.')
+
+    args = parser.parse_args()
+
+    main(args.project_id)
@@ -0,0 +1,59 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from gcloud import datastore
+from gcp.testing import eventually_consistent
+from gcp.testing.flaky import flaky
+import metadata_catalog
+import mock
+import pytest
+import snippets
+
+
+@pytest.yield_fixture
+def client(cloud_config):
+    client = datastore.Client(cloud_config.project)
+
+    yield client
+
+    client.delete(client.key('Task', 'sample_task'))
+
+
+@flaky
+@eventually_consistent.mark
+def test_catalog(client):
+    snippets.upsert(client)
+
+    catalog = metadata_catalog.MetadataCatalog(client)
+    catalog.refresh()
+
+    assert '' in catalog.namespaces()
+    assert 'Task' in catalog.kinds()
+    assert 'priority' in catalog.indexed_properties('Task')
+    assert 'INT64' in catalog.property_representations('Task')['priority']
+    assert 'Task' in catalog.properties_by_kind()
+
+
+@flaky
+def test_catalog_serves_from_memory(client):
+    catalog = metadata_catalog.MetadataCatalog(client)
+    catalog.kinds()
+
+    with mock.patch.object(client, 'query') as query_mock:
+        catalog.kinds()
+        catalog.indexed_properties('Task')
+        assert not query_mock.called
+
+        catalog.ttl = -1
+        catalog.kinds()
+        assert query_mock.called
@@ -16,6 +16,7 @@ import datetime
 
 # [START build_service]
 from gcloud import datastore
+import transaction_runner
 
 
 def create_client(project_id):
@@ -58,6 +59,26 @@ def mark_done(client, task_id):
 # [END update_entity]
 
 
+def mark_done_with_retry(client, task_id, runner=None):
+    """Marks a task as done like mark_done, but retries the transaction with
+    backoff if another writer updates the task at the same time."""
+    key = client.key('Task', task_id)
+
+    def mark_task_done():
+        task = client.get(key)
+
+        if not task:
+            raise ValueError(
+                'Task {} does not exist.'.format(task_id))
+
+        task['done'] = True
+
+        client.put(task)
+
+    runner = runner or transaction_runner.TransactionRunner(client)
+    runner.run(key, mark_task_done)
+
+
 # [START retrieve_entities]
 def list_tasks(client):
     query = client.query(kind='Task')
@@ -98,7 +119,7 @@ def new_command(client, args):
 
 def done_command(client, args):
     """Marks a task as done."""
-    mark_done(client, args.task_id)
+    mark_done_with_retry(client, args.task_id)
     print('Task {} marked done.'.format(args.task_id))
 
 
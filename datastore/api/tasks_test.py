@@ -52,6 +52,15 @@ def test_mark_done(client):
     assert task['done']
 
 
+@flaky
+def test_mark_done_with_retry(client):
+    task_key = tasks.add_task(client, 'Test task')
+    tasks.mark_done_with_retry(client, task_key.id)
+    task = client.get(task_key)
+    assert task
+    assert task['done']
+
+
 @flaky
 def test_list_tasks(client):
     task1_key = tasks.add_task(client, 'Test task 1')
@@ -0,0 +1,163 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs functions in Datastore transactions, retrying on contention.
+
+Transactions that touch the same entity group concurrently fail with
+``gcloud.exceptions.Conflict``. Retrying immediately, or after a fixed delay,
+makes every writer that collided retry at the same moment and collide again.
+``TransactionRunner`` instead waits a random time up to an exponentially
+growing limit ("full jitter"), gives up after a total time budget, and records
+per-entity-group conflict counts and latencies so hot groups can be found.
+"""
+
+import bisect
+from collections import defaultdict
+import random
+import threading
+import time
+
+import gcloud
+
+# Transactions that lost a race with another writer.
+CONTENTION_ERRORS = (gcloud.exceptions.Conflict,)
+
+# Errors that are worth retrying, but are not caused by contention.
+TRANSIENT_ERRORS = (
+    gcloud.exceptions.TooManyRequests,
+    gcloud.exceptions.InternalServerError,
+    gcloud.exceptions.ServiceUnavailable)
+
+# Upper bounds, in milliseconds, of the latency histogram buckets. The last
+# bucket counts everything slower than the largest bound.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def entity_group(key):
+    """Returns the flat path of the root of ``key``'s entity group."""
+    while key.parent is not None:
+        key = key.parent
+    return key.flat_path
+
+
+class TransactionStats(object):
+    """Thread-safe counters and latency histograms per entity group."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: defaultdict(int))
+        self._latencies = defaultdict(lambda: [0] * (len(buckets_ms) + 1))
+
+    def record_attempt(self, group, outcome):
+        """Counts an attempt whose outcome is one of 'committed',
+        'conflict', 'transient' or 'failed'."""
+        with self._lock:
+            self._counts[group][outcome] += 1
+
+    def record_latency(self, group, seconds):
+        bucket = bisect.bisect_left(self.buckets_ms, seconds * 1000.0)
+        with self._lock:
+            self._latencies[group][bucket] += 1
+
+    def counts(self, group):
+        with self._lock:
+            return dict(self._counts.get(group, {}))
+
+    def latency_histogram(self, group):
+        """Returns a list of counts, one per bucket in ``buckets_ms`` plus
+        one for latencies above the last bucket."""
+        with self._lock:
+            return list(self._latencies.get(
+                group, [0] * (len(self.buckets_ms) + 1)))
+
+    def hot_groups(self, limit=10):
+        """Returns up to ``limit`` (group, conflicts) pairs, most contended
+        first."""
+        with self._lock:
+            conflicts = [(group, counts['conflict'])
+                         for group, counts in self._counts.items()
+                         if counts['conflict']]
+        conflicts.sort(key=lambda item: item[1], reverse=True)
+        return conflicts[:limit]
+
+
+class TransactionRunner(object):
+    """Runs functions inside a transaction with backoff on contention.
+
+    Args:
+        client: The datastore client to open transactions with.
+        max_attempts: The most times a function will be run.
+        initial_delay: The backoff limit, in seconds, after the first
+            failure. It doubles after each further failure.
+        max_delay: The largest backoff limit, in seconds.
+        deadline: The total number of seconds to keep retrying for.
+        stats: A ``TransactionStats`` to record into. A new one is created
+            if omitted.
+    """
+
+    def __init__(self, client, max_attempts=10, initial_delay=0.1,
+                 max_delay=5.0, deadline=30.0, stats=None):
+        self.client = client
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.stats = stats or TransactionStats()
+
+    def _backoff(self, attempt):
+        limit = min(self.max_delay, self.initial_delay * 2 ** attempt)
+        return random.uniform(0, limit)
+
+    def run(self, key, function, *args, **kwargs):
+        """Calls ``function(*args, **kwargs)`` in a transaction and returns
+        its result.
+
+        Args:
+            key: Any key in the entity group the function writes to. It is
+                only used to attribute conflicts and latency.
+            function: The function to run. It is called again from the start
+                on each retry, so it must re-read anything it writes.
+
+        Raises:
+            The last contention or transient error once ``max_attempts`` or
+            ``deadline`` is exhausted, or any other error immediately.
+        """
+        group = entity_group(key) if key is not None else None
+        start = time.time()
+
+        for attempt in range(self.max_attempts):
+            try:
+                with self.client.transaction():
+                    result = function(*args, **kwargs)
+            except CONTENTION_ERRORS + TRANSIENT_ERRORS as e:
+                if isinstance(e, CONTENTION_ERRORS):
+                    self.stats.record_attempt(group, 'conflict')
+                else:
+                    self.stats.record_attempt(group, 'transient')
+
+                delay = self._backoff(attempt)
+                if (attempt == self.max_attempts - 1 or
+                        time.time() - start + delay > self.deadline):
+                    self.stats.record_latency(group, time.time() - start)
+                    raise
+            except Exception:
+                self.stats.record_attempt(group, 'failed')
+                self.stats.record_latency(group, time.time() - start)
+                raise
+            else:
+                self.stats.record_attempt(group, 'committed')
+                self.stats.record_latency(group, time.time() - start)
+                return result
+
+            time.sleep(delay)
@@ -0,0 +1,99 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gcloud
+from gcloud import datastore
+from gcp.testing.flaky import flaky
+import mock
+import pytest
+import transaction_runner
+
+
+@pytest.fixture
+def key():
+    client = datastore.Client(
+        'project', credentials=mock.Mock(), http=mock.Mock())
+    return client.key('TaskList', 'default', 'Task', 1)
+
+
+@pytest.fixture
+def runner():
+    return transaction_runner.TransactionRunner(
+        mock.MagicMock(), initial_delay=0)
+
+
+def test_retries_contention_and_transient_errors(runner, key):
+    function = mock.Mock(side_effect=[
+        gcloud.exceptions.Conflict('conflict'),
+        gcloud.exceptions.ServiceUnavailable('unavailable'),
+        'result'])
+
+    assert runner.run(key, function, 'arg') == 'result'
+    function.assert_called_with('arg')
+
+    group = transaction_runner.entity_group(key)
+    assert group == ('TaskList', 'default')
+    assert runner.stats.counts(group) == {
+        'conflict': 1, 'transient': 1, 'committed': 1}
+    assert sum(runner.stats.latency_histogram(group)) == 1
+    assert runner.stats.hot_groups() == [(group, 1)]
+
+
+def test_gives_up_after_max_attempts(runner, key):
+    runner.max_attempts = 3
+    function = mock.Mock(side_effect=gcloud.exceptions.Conflict('conflict'))
+
+    with pytest.raises(gcloud.exceptions.Conflict):
+        runner.run(key, function)
+    assert function.call_count == 3
+
+
+def test_gives_up_after_deadline(runner, key):
+    runner.initial_delay = 10
+    runner.deadline = 1
+    function = mock.Mock(side_effect=gcloud.exceptions.Conflict('conflict'))
+
+    with mock.patch('random.uniform', return_value=10):
+        with pytest.raises(gcloud.exceptions.Conflict):
+            runner.run(key, function)
+    assert function.call_count == 1
+
+
+def test_does_not_retry_other_errors(runner, key):
+    function = mock.Mock(side_effect=ValueError())
+
+    with pytest.raises(ValueError):
+        runner.run(key, function)
+    assert function.call_count == 1
+    group = transaction_runner.entity_group(key)
+    assert runner.stats.counts(group) == {'failed': 1}
+    assert sum(runner.stats.latency_histogram(group)) == 1
+
+
+@flaky
+def test_run(cloud_config):
+    client = datastore.Client(cloud_config.project)
+    runner = transaction_runner.TransactionRunner(client)
+    key = client.key('Task', 'transaction_runner_test')
+
+    def increment():
+        task = client.get(key) or datastore.Entity(key)
+        task['count'] = task.get('count', 0) + 1
+        client.put(task)
+        return task['count']
+
+    try:
+        assert runner.run(key, increment) == 1
+        assert runner.run(key, increment) == 2
+    finally:
+        client.delete(key)
@@ -0,0 +1,171 @@
+# Copyright 2016 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reports errors to fluentd from a background thread.
+
+main.py emits an event for every exception, on the thread that raised it.
+AsyncErrorReporter.report() instead only fingerprints the exception by its
+type and the files and functions of its traceback. The first occurrence of a
+fingerprint in a window is formatted and queued; later ones only increment a
+count. A background thread emits one event per fingerprint, with the count,
+at the end of each window. When the queue is full, new fingerprints are
+dropped rather than blocking the caller.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import traceback
+
+import fluent.event
+import fluent.sender
+
+
+def fingerprint(exc_type, tb):
+    """Returns a fingerprint of an exception that ignores line numbers and
+    directories, so that it survives redeploys."""
+    parts = [exc_type.__name__]
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        parts.append('{}:{}'.format(
+            os.path.basename(code.co_filename), code.co_name))
+        tb = tb.tb_next
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+class AsyncErrorReporter(object):
+    """Coalesces and emits error reports from a background thread.
+
+    Args:
+        service: The service name to report errors for.
+        window: Seconds between emits. Reports of the same fingerprint within
+            a window are emitted as one event.
+        max_pending: The most distinct fingerprints kept per window. Reports
+            of new fingerprints beyond it are dropped.
+        start: Whether to start the background thread.
+    """
+
+    def __init__(self, service, window=5, max_pending=100, start=True):
+        self.service = service
+        self.window = window
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        # fingerprint -> [event data, count]
+        self._pending = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.dropped = 0
+        self.emitted = 0
+
+        if start:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def report(self, exc_info=None):
+        """Queues the exception being handled, or ``exc_info``, for
+        reporting. Never blocks on the network.
+
+        Returns:
+            False if the report was dropped because the queue was full.
+        """
+        exc_type, exc_value, tb = exc_info or sys.exc_info()
+        key = fingerprint(exc_type, tb)
+
+        if self._count(key):
+            return True
+        if len(self._pending) >= self.max_pending:
+            # Don't format a traceback that will be dropped.
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        # Only the first report of a fingerprint in a window pays for
+        # formatting the traceback, and it does so outside the lock.
+        data = {
+            'message': ''.join(
+                traceback.format_exception(exc_type, exc_value, tb)),
+            'serviceContext': {'service': self.service},
+        }
+        return self._count(key, data)
+
+    def _count(self, key, data=None):
+        """Counts a report of ``key``. If ``key`` is not queued yet, queues
+        ``data`` for it if given and there is room.
+
+        Returns:
+            Whether the report was counted.
+        """
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry[1] += 1
+                return True
+            if data is None:
+                return False
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending[key] = [data, 1]
+            return True
+
+    def flush(self):
+        """Emits one event per fingerprint queued since the last flush."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for data, count in pending.values():
+            data['count'] = count
+            fluent.event.Event('errors', data)
+            self.emitted += 1
+
+    def _run(self):
+        while not self._stop.wait(self.window):
+            self.flush()
+
+    def close(self):
+        """Stops the background thread and emits everything queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def simulate_error_storm():
+    fluent.sender.setup('myapp', host='localhost', port=24224)
+
+    with AsyncErrorReporter('myapp') as reporter:
+        for _ in range(1000):
+            try:
+                # simulate calling a method that's not defined
+                raise NameError
+            except Exception:
+                reporter.report()
+
+    print('Emitted {} events, dropped {} reports.'.format(
+        reporter.emitted, reporter.dropped))
+
+
+if __name__ == '__main__':
+    simulate_error_storm()
@@ -0,0 +1,77 @@
+# Copyright 2016 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+import async_reporter
+import mock
+
+
+def raise_error(error_class):
+    raise error_class('failed')
+
+
+def report(reporter, error_class):
+    try:
+        raise_error(error_class)
+    except Exception:
+        return reporter.report()
+
+
+@mock.patch("fluent.event")
+def test_coalesces_duplicates(event_mock):
+    reporter = async_reporter.AsyncErrorReporter('myapp', start=False)
+
+    for _ in range(10):
+        report(reporter, NameError)
+    report(reporter, ValueError)
+    reporter.close()
+
+    assert event_mock.Event.call_count == 2
+    counts = sorted(
+        call[0][1]['count'] for call in event_mock.Event.call_args_list)
+    assert counts == [1, 10]
+    message = event_mock.Event.call_args_list[0][0][1]['message']
+    assert 'Traceback' in message
+
+
+@mock.patch("fluent.event")
+def test_drops_when_full(event_mock):
+    reporter = async_reporter.AsyncErrorReporter(
+        'myapp', max_pending=1, start=False)
+
+    assert report(reporter, NameError)
+    assert not report(reporter, ValueError)
+    # Known fingerprints are still counted.
+    assert report(reporter, NameError)
+    reporter.close()
+
+    assert reporter.dropped == 1
+    event_mock.Event.assert_called_once_with('errors', mock.ANY)
+    assert event_mock.Event.call_args[0][1]['count'] == 2
+
+
+def test_fingerprint_ignores_line_numbers():
+    def capture(source):
+        namespace = {}
+        exec(compile(source, '/srv/app/handler.py', 'exec'), namespace)
+        try:
+            namespace['handle']()
+        except Exception:
+            exc_type, _, tb = sys.exc_info()
+            return async_reporter.fingerprint(exc_type, tb)
+
+    first = capture('def handle():\n    raise KeyError\n')
+    moved = capture('\n\ndef handle():\n    x = 1\n    raise KeyError\n')
+    assert first == moved
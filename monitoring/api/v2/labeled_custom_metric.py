@@ -89,6 +89,16 @@ def create_custom_metric(client, project_id):
         raise
 
 
+def custom_metric_exists(client, project_id):
+    """Returns whether the metric descriptor for the custom metric has
+    already been created."""
+    request = client.metricDescriptors().list(
+        project=project_id, query=CUSTOM_METRIC_NAME)
+    response = request.execute()
+    return any(metric['name'] == CUSTOM_METRIC_NAME
+               for metric in response.get('metrics', []))
+
+
 def write_custom_metric(client, project_id, now_rfc3339, color, size, count):
     """Write a data point to a single time series of the custom metric."""
     # Identify the particular time series to which to write the data by
@@ -171,8 +181,12 @@ def main(project_id, color, size, count):
 
     print ("Labels: color: {}, size: {}.".format(color, size))
     print ("Creating custom metric...")
-    create_custom_metric(client, project_id)
-    time.sleep(2)
+    if custom_metric_exists(client, project_id):
+        print ("Custom metric already exists.")
+    else:
+        create_custom_metric(client, project_id)
+        # Give the new metric descriptor time to propagate.
+        time.sleep(2)
     print ("Writing new data to custom metric timeseries...")
     write_custom_metric(client, project_id, now_rfc3339,
                         color, size, count)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Measures Google API client calls and exports them as custom metrics.
+
+Clients built with ``build()`` below, or with
+``discovery.build(..., requestBuilder=request_builder(metrics))``, time every
+``execute()`` call. ApiCallMetrics keeps, per API method, histograms of
+latency and response size and counts of attempts and errors in memory, and
+periodically writes them as custom metrics through a TimeSeriesWriter.
+
+Build the monitoring client that the TimeSeriesWriter uses without
+instrumentation, so that exporting does not measure itself.
+
+To run locally:
+
+    python api_instrumentation.py --project_id=<YOUR-PROJECT-ID>
+
+"""
+
+import argparse
+import threading
+import time
+
+from apiclient import discovery
+import custom_metric
+import distribution_aggregator
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+import list_resources
+import metric_registry
+from oauth2client.client import GoogleCredentials
+import timeseries_writer
+
+LATENCY_METRIC = 'custom.googleapis.com/api/latency'
+RESPONSE_SIZE_METRIC = 'custom.googleapis.com/api/response_size'
+RETRIES_METRIC = 'custom.googleapis.com/api/retries'
+ERRORS_METRIC = 'custom.googleapis.com/api/errors'
+
+# 1ms to about 9 minutes.
+LATENCY_BUCKETS = distribution_aggregator.exponential_buckets(20, 2, 1)
+# 64 bytes to 1GiB.
+RESPONSE_SIZE_BUCKETS = distribution_aggregator.exponential_buckets(12, 4, 64)
+
+
+def metric_descriptors():
+    """Returns the descriptors of the metrics ApiCallMetrics writes."""
+    return [
+        custom_metric.custom_metric_descriptor(
+            LATENCY_METRIC, 'GAUGE', value_type='DISTRIBUTION', unit='ms'),
+        custom_metric.custom_metric_descriptor(
+            RESPONSE_SIZE_METRIC, 'GAUGE', value_type='DISTRIBUTION',
+            unit='By'),
+        custom_metric.custom_metric_descriptor(RETRIES_METRIC, 'GAUGE'),
+        custom_metric.custom_metric_descriptor(ERRORS_METRIC, 'GAUGE'),
+    ]
+
+
+class ApiCallMetrics(object):
+    """Aggregates API call measurements and writes them every flush window.
+
+    Args:
+        writer: The TimeSeriesWriter used to export the metrics.
+        flush_interval: Seconds per aggregation window.
+        start: Whether to start the background flush thread.
+    """
+
+    def __init__(self, writer, flush_interval=60, start=True):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.latency = distribution_aggregator.DistributionAggregator(
+            writer, LATENCY_METRIC, LATENCY_BUCKETS, start=False)
+        self.response_size = distribution_aggregator.DistributionAggregator(
+            writer, RESPONSE_SIZE_METRIC, RESPONSE_SIZE_BUCKETS, start=False)
+
+        self._lock = threading.Lock()
+        # method -> retries in the current window
+        self._retries = {}
+        # (method, status) -> errors in the current window
+        self._errors = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        if start:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, method, seconds, attempts, response_bytes, status):
+        """Records one execute() call.
+
+        Args:
+            method: The API method id, e.g. "bigquery.jobs.query".
+            seconds: The wall time of the call, including retries.
+            attempts: The number of HTTP requests the call made.
+            response_bytes: The size of the response bodies received.
+            status: The HTTP status of the last attempt, or None if it
+                failed without a response.
+        """
+        labels = {'method': method}
+        self.latency.record(seconds * 1000.0, metric_labels=labels)
+        self.response_size.record(response_bytes, metric_labels=labels)
+
+        with self._lock:
+            self._retries[method] = (
+                self._retries.get(method, 0) + max(0, attempts - 1))
+            if status is None or status >= 300:
+                key = (method, str(status or 'none'))
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def flush(self):
+        """Ends the current window and queues its points on the writer."""
+        with self._lock:
+            retries, self._retries = self._retries, {}
+            errors, self._errors = self._errors, {}
+
+        self.latency.flush()
+        self.response_size.flush()
+        for method, count in retries.items():
+            self.writer.write(
+                RETRIES_METRIC, count, metric_labels={'method': method})
+        for (method, status), count in errors.items():
+            self.writer.write(
+                ERRORS_METRIC, count,
+                metric_labels={'method': method, 'status': status})
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stops the background thread and flushes the current window. The
+        writer is not closed."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+class _CountingHttp(object):
+    """Wraps an httplib2.Http to count the requests made through it and the
+    bytes received."""
+
+    def __init__(self, http):
+        self._http = http
+        self.attempts = 0
+        self.response_bytes = 0
+        self.status = None
+
+    def request(self, *args, **kwargs):
+        self.attempts += 1
+        resp, content = self._http.request(*args, **kwargs)
+        self.status = resp.status
+        self.response_bytes += len(content or b'')
+        return resp, content
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+
+class InstrumentedHttpRequest(HttpRequest):
+    """An HttpRequest that reports each execute() to ``metrics``."""
+
+    metrics = None
+
+    def execute(self, http=None, num_retries=0):
+        counting_http = _CountingHttp(http or self.http)
+        start = time.time()
+        try:
+            return super(InstrumentedHttpRequest, self).execute(
+                http=counting_http, num_retries=num_retries)
+        finally:
+            if self.metrics is not None:
+                self.metrics.record(
+                    self.methodId or 'unknown', time.time() - start,
+                    counting_http.attempts, counting_http.response_bytes,
+                    counting_http.status)
+
+
+def request_builder(metrics):
+    """Returns a ``requestBuilder`` for discovery.build that reports to
+    ``metrics``."""
+    def build_request(*args, **kwargs):
+        request = InstrumentedHttpRequest(*args, **kwargs)
+        request.metrics = metrics
+        return request
+    return build_request
+
+
+def build(service_name, version, metrics, credentials=None, **kwargs):
+    """Like discovery.build, but the client's calls report to ``metrics``."""
+    credentials = credentials or GoogleCredentials.get_application_default()
+    return discovery.build(
+        service_name, version, credentials=credentials,
+        requestBuilder=request_builder(metrics), **kwargs)
+
+
+def main(project_id):
+    project_resource = 'projects/{}'.format(project_id)
+    export_client = list_resources.get_client()
+    registry = metric_registry.MetricDescriptorRegistry(
+        export_client, project_resource)
+    registry.ensure(metric_descriptors())
+
+    with timeseries_writer.TimeSeriesWriter(
+            export_client, project_resource, registry=registry) as writer:
+        with ApiCallMetrics(writer) as metrics:
+            client = build('monitoring', 'v3', metrics)
+            for _ in range(10):
+                client.projects().monitoredResourceDescriptors().list(
+                    name=project_resource).execute()
+            try:
+                client.projects().metricDescriptors().get(
+                    name=project_resource +
+                    '/metricDescriptors/custom.googleapis.com/missing'
+                ).execute()
+            except HttpError:
+                pass
+
+    print('Wrote {} points.'.format(writer.points_written))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--project_id', help='Project ID you want to access.', required=True)
+
+    args = parser.parse_args()
+    main(args.project_id)
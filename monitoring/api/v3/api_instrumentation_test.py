@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for api_instrumentation.py """
+
+import api_instrumentation
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
+from googleapiclient.model import JsonModel
+import mock
+import pytest
+
+
+def make_request(metrics, responses):
+    request = api_instrumentation.request_builder(metrics)(
+        HttpMockSequence(responses), JsonModel().response,
+        'https://example.com/v1/things', methodId='example.things.list')
+    request._sleep = lambda seconds: None
+    return request
+
+
+@pytest.fixture
+def metrics():
+    return mock.Mock()
+
+
+def test_records_successful_call(metrics):
+    request = make_request(metrics, [({'status': '200'}, '{"a": 1}')])
+
+    assert request.execute() == {'a': 1}
+
+    method, _, attempts, response_bytes, status = metrics.record.call_args[0]
+    assert (method, attempts, response_bytes, status) == (
+        'example.things.list', 1, 8, 200)
+
+
+def test_records_retries(metrics):
+    request = make_request(metrics, [
+        ({'status': '503'}, ''), ({'status': '200'}, '{}')])
+
+    request.execute(num_retries=1)
+
+    assert metrics.record.call_args[0][2] == 2
+
+
+def test_records_errors(metrics):
+    request = make_request(metrics, [({'status': '404'}, '{}')])
+
+    with pytest.raises(HttpError):
+        request.execute()
+
+    assert metrics.record.call_args[0][4] == 404
+
+
+def test_flush_writes_metrics():
+    writer = mock.Mock()
+    metrics = api_instrumentation.ApiCallMetrics(writer, start=False)
+
+    metrics.record('a.get', 0.010, 1, 100, 200)
+    metrics.record('a.get', 0.030, 3, 100, 503)
+    metrics.close()
+
+    written = dict(
+        ((call[0][0], tuple(sorted(call[1]['metric_labels'].items()))),
+         call[0][1]) for call in writer.write.call_args_list)
+    latency = written[
+        (api_instrumentation.LATENCY_METRIC, (('method', 'a.get'),))]
+    assert latency['count'] == 2
+    assert abs(latency['mean'] - 20.0) < 1e-9
+    assert written[
+        (api_instrumentation.RETRIES_METRIC, (('method', 'a.get'),))] == 2
+    assert written[(api_instrumentation.ERRORS_METRIC,
+                    (('method', 'a.get'), ('status', '503')))] == 1
@@ -35,6 +35,7 @@ import random
 import time
 
 import list_resources
+import metric_registry
 
 
 def format_rfc3339(datetime_instance=None):
@@ -55,10 +56,10 @@ def get_now_rfc3339():
     return format_rfc3339(datetime.datetime.utcnow())
 
 
-def create_custom_metric(client, project_id,
-                         custom_metric_type, metric_kind):
-    """Create custom metric descriptor"""
-    metrics_descriptor = {
+def custom_metric_descriptor(custom_metric_type, metric_kind,
+                             value_type="INT64", unit="items"):
+    """Build the custom metric descriptor"""
+    return {
         "type": custom_metric_type,
         "labels": [
             {
@@ -68,12 +69,20 @@ def create_custom_metric(client, project_id,
             }
         ],
         "metricKind": metric_kind,
-        "valueType": "INT64",
-        "unit": "items",
+        "valueType": value_type,
+        "unit": unit,
         "description": "An arbitrary measurement.",
         "displayName": "Custom Metric"
     }
 
+
+def create_custom_metric(client, project_id,
+                         custom_metric_type, metric_kind,
+                         value_type="INT64", unit="items"):
+    """Create custom metric descriptor"""
+    metrics_descriptor = custom_metric_descriptor(
+        custom_metric_type, metric_kind, value_type, unit)
+
     client.projects().metricDescriptors().create(
         name=project_id, body=metrics_descriptor).execute()
 
@@ -167,14 +176,12 @@ def main(project_id):
 
     project_resource = "projects/{0}".format(project_id)
     client = list_resources.get_client()
-    create_custom_metric(client, project_resource,
-                         CUSTOM_METRIC_TYPE, METRIC_KIND)
-    custom_metric = None
-    while not custom_metric:
-        # wait until it's created
-        time.sleep(1)
-        custom_metric = get_custom_metric(
-            client, project_resource, CUSTOM_METRIC_TYPE)
+    # Only creates the metric descriptor, and waits for it to be usable, if
+    # it doesn't exist yet.
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, project_resource)
+    registry.ensure([
+        custom_metric_descriptor(CUSTOM_METRIC_TYPE, METRIC_KIND)])
 
     write_timeseries_value(client, project_resource,
                            CUSTOM_METRIC_TYPE, INSTANCE_ID, METRIC_KIND)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Pre-aggregates observations into DISTRIBUTION custom metric points.
+
+custom_metric.py writes one INT64 value per call, so high frequency
+measurements such as request latencies have to be sampled or dropped.
+DistributionAggregator instead counts every observation into a fixed set of
+histogram buckets held in an array of integers, and once per flush window
+writes a single DISTRIBUTION point per time series through a
+TimeSeriesWriter.
+
+To run locally:
+
+    python distribution_aggregator.py --project_id=<YOUR-PROJECT-ID>
+
+"""
+
+import argparse
+import array
+import bisect
+import datetime
+import math
+import random
+import threading
+import time
+
+import custom_metric
+import list_resources
+import metric_registry
+import timeseries_writer
+
+
+def linear_buckets(num_finite_buckets, width, offset=0):
+    return {'linearBuckets': {
+        'numFiniteBuckets': num_finite_buckets,
+        'width': width,
+        'offset': offset}}
+
+
+def exponential_buckets(num_finite_buckets, growth_factor, scale):
+    return {'exponentialBuckets': {
+        'numFiniteBuckets': num_finite_buckets,
+        'growthFactor': growth_factor,
+        'scale': scale}}
+
+
+def explicit_buckets(bounds):
+    return {'explicitBuckets': {'bounds': list(bounds)}}
+
+
+class Histogram(object):
+    """Counts observations into the buckets described by ``bucket_options``,
+    in the format the Monitoring API uses for ``bucketOptions``.
+
+    Bucket 0 is the underflow bucket and the last bucket is the overflow
+    bucket. The mean and sum of squared deviation are kept with Welford's
+    online algorithm, so no observation is stored.
+    """
+
+    def __init__(self, bucket_options):
+        self.bucket_options = bucket_options
+
+        if 'linearBuckets' in bucket_options:
+            options = bucket_options['linearBuckets']
+            self._num_finite = options['numFiniteBuckets']
+            self._index = self._linear_index
+        elif 'exponentialBuckets' in bucket_options:
+            options = bucket_options['exponentialBuckets']
+            self._num_finite = options['numFiniteBuckets']
+            self._log_growth = math.log(options['growthFactor'])
+            self._index = self._exponential_index
+        elif 'explicitBuckets' in bucket_options:
+            self._bounds = bucket_options['explicitBuckets']['bounds']
+            self._num_finite = len(self._bounds) - 1
+            self._index = self._explicit_index
+        else:
+            raise ValueError(
+                'Unknown bucket options: {}'.format(bucket_options))
+
+        self.counts = array.array('L', [0] * (self._num_finite + 2))
+        self.count = 0
+        self.mean = 0.0
+        self.sum_of_squared_deviation = 0.0
+
+    def _linear_index(self, value):
+        options = self.bucket_options['linearBuckets']
+        if value < options['offset']:
+            return 0
+        index = int((value - options['offset']) // options['width']) + 1
+        return min(index, self._num_finite + 1)
+
+    def _exponential_index(self, value):
+        options = self.bucket_options['exponentialBuckets']
+        if value < options['scale']:
+            return 0
+        index = int(math.floor(
+            math.log(value / float(options['scale'])) /
+            self._log_growth)) + 1
+        return min(index, self._num_finite + 1)
+
+    def _explicit_index(self, value):
+        return bisect.bisect_right(self._bounds, value)
+
+    def record(self, value):
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / float(self.count)
+        self.sum_of_squared_deviation += delta * (value - self.mean)
+
+    def to_distribution(self):
+        """Returns the histogram as a Monitoring API distributionValue."""
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'sumOfSquaredDeviation': self.sum_of_squared_deviation,
+            'bucketOptions': self.bucket_options,
+            'bucketCounts': list(self.counts),
+        }
+
+
+class DistributionAggregator(object):
+    """Aggregates observations per time series and writes one DISTRIBUTION
+    point for each every flush window.
+
+    Args:
+        writer: The TimeSeriesWriter used to send the points.
+        metric_type: The DISTRIBUTION custom metric type to write.
+        bucket_options: A bucketOptions dict, for example from
+            exponential_buckets().
+        flush_interval: Seconds per aggregation window. It should be no
+            shorter than the writer's minimum spacing.
+        start: Whether to start the background flush thread.
+    """
+
+    def __init__(self, writer, metric_type, bucket_options,
+                 flush_interval=60, start=True):
+        self.writer = writer
+        self.metric_type = metric_type
+        self.bucket_options = bucket_options
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        # series key -> (metric labels, resource type, resource labels,
+        #                histogram)
+        self._series = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        if start:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, value, metric_labels=None, resource_type='global',
+               resource_labels=None):
+        """Adds one observation to the current window of its time series."""
+        metric_labels = metric_labels or {}
+        resource_labels = resource_labels or {}
+        key = timeseries_writer.series_key(
+            self.metric_type, metric_labels, resource_type, resource_labels)
+
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = (metric_labels, resource_type, resource_labels,
+                          Histogram(self.bucket_options))
+                self._series[key] = series
+            series[3].record(value)
+
+    def flush(self):
+        """Ends the current window and queues one point per time series."""
+        with self._lock:
+            series, self._series = self._series, {}
+
+        now = datetime.datetime.utcnow()
+        for metric_labels, resource_type, resource_labels, histogram in (
+                series.values()):
+            self.writer.write(
+                self.metric_type, histogram.to_distribution(),
+                metric_labels=metric_labels,
+                resource_type=resource_type,
+                resource_labels=resource_labels,
+                value_type='DISTRIBUTION',
+                end_time=now)
+
+        return len(series)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stops the background thread and flushes the current window. The
+        writer is not closed."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def main(project_id):
+    metric_type = 'custom.googleapis.com/request_latency'
+    project_resource = 'projects/{}'.format(project_id)
+    client = list_resources.get_client()
+
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, project_resource)
+    registry.ensure([
+        custom_metric.custom_metric_descriptor(
+            metric_type, 'GAUGE', value_type='DISTRIBUTION', unit='ms')])
+
+    with timeseries_writer.TimeSeriesWriter(
+            client, project_resource, registry=registry) as writer:
+        with DistributionAggregator(
+                writer, metric_type,
+                exponential_buckets(20, 2, 1), flush_interval=10) as agg:
+            # Simulate a second of request latencies, in milliseconds.
+            start = time.time()
+            observations = 0
+            while time.time() - start < 1:
+                agg.record(
+                    random.lognormvariate(3, 1),
+                    metric_labels={'environment': 'STAGING'})
+                observations += 1
+
+    print('Aggregated {} observations into {} points.'.format(
+        observations, writer.points_written))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--project_id', help='Project ID you want to access.', required=True)
+
+    args = parser.parse_args()
+    main(args.project_id)
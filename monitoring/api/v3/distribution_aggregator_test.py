@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for distribution_aggregator.py
+
+test_write_distribution is an integration test and needs
+GOOGLE_APPLICATION_CREDENTIALS set to a Service Account for a project that
+has enabled the Monitoring API.
+"""
+
+import random
+
+from custom_metric import create_custom_metric
+import distribution_aggregator
+from gcp.testing.flaky import flaky
+import list_resources
+import mock
+import pytest
+import timeseries_writer
+
+
+def test_linear_buckets():
+    histogram = distribution_aggregator.Histogram(
+        distribution_aggregator.linear_buckets(3, 10, offset=5))
+    for value in (0, 5, 14.9, 15, 34, 35, 1000):
+        histogram.record(value)
+
+    assert list(histogram.counts) == [1, 2, 1, 1, 2]
+
+
+def test_exponential_buckets():
+    histogram = distribution_aggregator.Histogram(
+        distribution_aggregator.exponential_buckets(3, 2, 1))
+    for value in (0.5, 1, 1.9, 2, 4, 7.9, 8, 100):
+        histogram.record(value)
+
+    assert list(histogram.counts) == [1, 2, 1, 2, 2]
+
+
+def test_explicit_buckets():
+    histogram = distribution_aggregator.Histogram(
+        distribution_aggregator.explicit_buckets([1, 10, 100]))
+    for value in (0, 1, 9, 10, 100, 1000):
+        histogram.record(value)
+
+    assert list(histogram.counts) == [1, 2, 1, 2]
+
+
+def test_unknown_buckets():
+    with pytest.raises(ValueError):
+        distribution_aggregator.Histogram({})
+
+
+def test_mean_and_squared_deviation():
+    values = [random.uniform(0, 100) for _ in range(1000)]
+    histogram = distribution_aggregator.Histogram(
+        distribution_aggregator.linear_buckets(10, 10))
+    for value in values:
+        histogram.record(value)
+
+    mean = sum(values) / len(values)
+    distribution = histogram.to_distribution()
+    assert distribution['count'] == 1000
+    squared_deviation = sum((value - mean) ** 2 for value in values)
+    assert abs(distribution['mean'] - mean) < 1e-6
+    assert abs(distribution['sumOfSquaredDeviation'] -
+               squared_deviation) < 1e-3
+    assert sum(distribution['bucketCounts']) == 1000
+
+
+def test_flush_writes_one_point_per_series():
+    writer = mock.Mock()
+    aggregator = distribution_aggregator.DistributionAggregator(
+        writer, 'custom.googleapis.com/latency',
+        distribution_aggregator.exponential_buckets(10, 2, 1), start=False)
+
+    for n in range(1000):
+        aggregator.record(n, metric_labels={'handler': str(n % 2)})
+
+    assert aggregator.flush() == 2
+    assert writer.write.call_count == 2
+    counts = [call[0][1]['count'] for call in writer.write.call_args_list]
+    assert counts == [500, 500]
+    assert writer.write.call_args[1]['value_type'] == 'DISTRIBUTION'
+
+    # The next window starts empty.
+    assert aggregator.flush() == 0
+
+
+@flaky
+def test_write_distribution(cloud_config):
+    metric_type = 'custom.googleapis.com/test_latency'
+    project_resource = 'projects/{}'.format(cloud_config.project)
+    client = list_resources.get_client()
+
+    create_custom_metric(
+        client, project_resource, metric_type, 'GAUGE',
+        value_type='DISTRIBUTION', unit='ms')
+
+    with timeseries_writer.TimeSeriesWriter(
+            client, project_resource) as writer:
+        with distribution_aggregator.DistributionAggregator(
+                writer, metric_type,
+                distribution_aggregator.exponential_buckets(10, 2, 1),
+                start=False) as aggregator:
+            for n in range(100):
+                aggregator.record(n, metric_labels={'environment': 'TEST'})
+
+    assert writer.points_written == 1
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Builds a monitoring inventory of many projects at once.
+
+list_resources.py lists the monitored resource descriptors, metric
+descriptors and time series of one project, one call at a time. This program
+does the same for any number of projects from a pool of worker threads,
+following every page, and writes a single JSON or CSV inventory in which
+descriptors shared by several projects appear once.
+
+To run locally:
+
+    python inventory.py --project_ids <PROJECT-ID> [<PROJECT-ID> ...] \\
+        --output=inventory.json
+
+"""
+
+import argparse
+import csv
+import datetime
+import json
+from multiprocessing.pool import ThreadPool
+import threading
+
+import custom_metric
+from googleapiclient.errors import HttpError
+import list_resources
+
+DEFAULT_METRIC = 'compute.googleapis.com/instance/cpu/usage_time'
+
+_local = threading.local()
+
+
+def get_thread_client():
+    """Returns a client for the current thread. httplib2, which the clients
+    use, is not thread-safe."""
+    if not hasattr(_local, 'client'):
+        _local.client = list_resources.get_client()
+    return _local.client
+
+
+def list_all(collection, field, **kwargs):
+    """Calls ``collection.list(**kwargs)`` and returns the ``field`` items of
+    every page."""
+    items = []
+    request = collection.list(**kwargs)
+    while request is not None:
+        response = request.execute()
+        items.extend(response.get(field, []))
+        request = collection.list_next(request, response)
+    return items
+
+
+def project_inventory(client, project_id, metric, start_time, end_time):
+    """Lists the descriptors of a project and the headers, without points,
+    of the time series of ``metric``."""
+    project_resource = 'projects/{}'.format(project_id)
+    projects = client.projects()
+
+    return {
+        'monitored_resource_descriptors': list_all(
+            projects.monitoredResourceDescriptors(), 'resourceDescriptors',
+            name=project_resource),
+        'metric_descriptors': list_all(
+            projects.metricDescriptors(), 'metricDescriptors',
+            name=project_resource),
+        'time_series': list_all(
+            projects.timeSeries(), 'timeSeries',
+            name=project_resource,
+            filter='metric.type="{}"'.format(metric),
+            interval_startTime=custom_metric.format_rfc3339(start_time),
+            interval_endTime=custom_metric.format_rfc3339(end_time),
+            view='HEADERS'),
+    }
+
+
+class Inventory(object):
+    """Merges project inventories, keeping one copy of each descriptor."""
+
+    def __init__(self):
+        # category -> descriptor JSON -> (descriptor, project ids)
+        self._descriptors = {
+            'monitored_resource_descriptors': {},
+            'metric_descriptors': {},
+        }
+        self.time_series = []
+        self.errors = {}
+
+    def add(self, project_id, project):
+        for category, descriptors in self._descriptors.items():
+            for descriptor in project[category]:
+                # The name is the only per-project part of a descriptor.
+                descriptor = dict(descriptor)
+                descriptor.pop('name', None)
+                key = json.dumps(descriptor, sort_keys=True)
+                if key not in descriptors:
+                    descriptors[key] = (descriptor, [])
+                descriptors[key][1].append(project_id)
+
+        for series in project['time_series']:
+            self.time_series.append({
+                'project': project_id,
+                'metric_type': series['metric']['type'],
+                'metric_labels': series['metric'].get('labels', {}),
+                'resource_type': series['resource']['type'],
+                'resource_labels': series['resource'].get('labels', {}),
+            })
+
+    def add_error(self, project_id, error):
+        self.errors[project_id] = str(error)
+
+    def descriptors(self, category):
+        """Returns the unique descriptors of a category, each with the
+        sorted list of projects it was found in."""
+        result = []
+        for descriptor, project_ids in self._descriptors[category].values():
+            descriptor = dict(descriptor, projects=sorted(project_ids))
+            result.append(descriptor)
+        result.sort(key=lambda descriptor: descriptor['type'])
+        return result
+
+    def to_dict(self):
+        return {
+            'monitored_resource_descriptors': self.descriptors(
+                'monitored_resource_descriptors'),
+            'metric_descriptors': self.descriptors('metric_descriptors'),
+            'time_series': sorted(
+                self.time_series,
+                key=lambda series: (series['project'], series['metric_type'],
+                                    series['resource_type'])),
+            'errors': self.errors,
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+    def write_csv(self, path):
+        """Writes one row per unique descriptor, with the number of time
+        series found for each metric and resource type."""
+        series_counts = {}
+        for series in self.time_series:
+            for key in (series['metric_type'], series['resource_type']):
+                series_counts[key] = series_counts.get(key, 0) + 1
+
+        with open(path, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ['category', 'type', 'display_name', 'time_series',
+                 'projects'])
+            for category in ('monitored_resource_descriptors',
+                             'metric_descriptors'):
+                for descriptor in self.descriptors(category):
+                    writer.writerow([
+                        category, descriptor['type'],
+                        descriptor.get('displayName', ''),
+                        series_counts.get(descriptor['type'], 0),
+                        ' '.join(descriptor['projects'])])
+
+    def write(self, path):
+        if path.endswith('.csv'):
+            self.write_csv(path)
+        else:
+            self.write_json(path)
+
+
+def build_inventory(project_ids, workers=16, metric=DEFAULT_METRIC,
+                    start_time=None, end_time=None):
+    """Lists every project concurrently and returns the merged Inventory.
+
+    Projects that fail, for example because the Monitoring API is not
+    enabled, are recorded in ``Inventory.errors`` instead of stopping the
+    run.
+    """
+    end_time = end_time or datetime.datetime.utcnow()
+    start_time = start_time or end_time - datetime.timedelta(hours=1)
+
+    def list_project(project_id):
+        try:
+            return project_id, project_inventory(
+                get_thread_client(), project_id, metric, start_time,
+                end_time), None
+        except HttpError as e:
+            return project_id, None, e
+
+    inventory = Inventory()
+    pool = ThreadPool(max(1, min(workers, len(project_ids))))
+    try:
+        for project_id, project, error in pool.imap_unordered(
+                list_project, project_ids):
+            if error is not None:
+                inventory.add_error(project_id, error)
+            else:
+                inventory.add(project_id, project)
+    finally:
+        pool.close()
+        pool.join()
+
+    return inventory
+
+
+def main(project_ids, output, workers, metric):
+    inventory = build_inventory(project_ids, workers=workers, metric=metric)
+    inventory.write(output)
+
+    print('Inventoried {} projects: {} resource descriptors, {} metric '
+          'descriptors, {} time series, {} errors.'.format(
+              len(project_ids),
+              len(inventory.descriptors('monitored_resource_descriptors')),
+              len(inventory.descriptors('metric_descriptors')),
+              len(inventory.time_series), len(inventory.errors)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--project_ids', nargs='*', default=[],
+        help='Project IDs to inventory.')
+    parser.add_argument(
+        '--projects_file',
+        help='A file with one project ID per line to inventory.')
+    parser.add_argument(
+        '--output', default='inventory.json',
+        help='Where to write the inventory, as .json or .csv.')
+    parser.add_argument(
+        '--workers', type=int, default=16,
+        help='How many projects to list at the same time.')
+    parser.add_argument(
+        '--metric', default=DEFAULT_METRIC,
+        help='The metric whose time series are listed.')
+
+    args = parser.parse_args()
+
+    project_ids = list(args.project_ids)
+    if args.projects_file:
+        with open(args.projects_file) as f:
+            project_ids.extend(line.strip() for line in f if line.strip())
+    if not project_ids:
+        parser.error('Pass --project_ids or --projects_file.')
+
+    main(project_ids, args.output, args.workers, args.metric)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for inventory.py
+
+The merging tests use a mock client. test_build_inventory is an integration
+test and needs GOOGLE_APPLICATION_CREDENTIALS set to a Service Account for a
+project that has enabled the Monitoring API.
+"""
+
+import csv
+import json
+
+from gcp.testing.flaky import flaky
+from googleapiclient.errors import HttpError
+import httplib2
+import inventory
+import mock
+
+
+def metric_descriptor(project_id, metric_type):
+    return {
+        'name': 'projects/{}/metricDescriptors/{}'.format(
+            project_id, metric_type),
+        'type': metric_type,
+        'displayName': metric_type.split('/')[-1],
+    }
+
+
+def fake_client():
+    """Returns a client whose list calls return one page per project, and a
+    second page of metric descriptors."""
+    client = mock.MagicMock()
+    projects = client.projects.return_value
+
+    def request(response):
+        request = mock.Mock()
+        request.execute.return_value = response
+        return request
+
+    def list_resources(name, **kwargs):
+        if name == 'projects/broken':
+            error = HttpError(httplib2.Response({'status': 403}), b'')
+            return mock.Mock(execute=mock.Mock(side_effect=error))
+        return request({'resourceDescriptors': [
+            {'name': name + '/monitoredResourceDescriptors/global',
+             'type': 'global'}]})
+
+    def list_metrics(name, **kwargs):
+        project_id = name.split('/')[1]
+        return request({
+            'metricDescriptors': [
+                metric_descriptor(project_id, 'custom.googleapis.com/a')],
+            'nextPageToken': 'next'})
+
+    def list_metrics_next(request_, response):
+        if 'nextPageToken' not in response:
+            return None
+        project_id = response['metricDescriptors'][0]['name'].split('/')[1]
+        return request({'metricDescriptors': [
+            metric_descriptor(project_id, 'custom.googleapis.com/' +
+                              project_id)]})
+
+    def list_series(name, **kwargs):
+        return request({'timeSeries': [{
+            'metric': {'type': 'custom.googleapis.com/a'},
+            'resource': {'type': 'global'}}]})
+
+    resources = projects.monitoredResourceDescriptors.return_value
+    resources.list.side_effect = list_resources
+    resources.list_next.return_value = None
+    metrics = projects.metricDescriptors.return_value
+    metrics.list.side_effect = list_metrics
+    metrics.list_next.side_effect = list_metrics_next
+    series = projects.timeSeries.return_value
+    series.list.side_effect = list_series
+    series.list_next.return_value = None
+    return client
+
+
+def test_build_inventory_dedupes_descriptors(tmpdir):
+    with mock.patch('list_resources.get_client', side_effect=fake_client):
+        result = inventory.build_inventory(
+            ['one', 'two', 'broken'], workers=3)
+
+    metric_types = [(descriptor['type'], descriptor['projects'])
+                    for descriptor in result.descriptors('metric_descriptors')]
+    assert metric_types == [
+        ('custom.googleapis.com/a', ['one', 'two']),
+        ('custom.googleapis.com/one', ['one']),
+        ('custom.googleapis.com/two', ['two'])]
+    assert [descriptor['projects'] for descriptor in result.descriptors(
+        'monitored_resource_descriptors')] == [['one', 'two']]
+    assert len(result.time_series) == 2
+    assert list(result.errors) == ['broken']
+
+    json_path = str(tmpdir.join('inventory.json'))
+    result.write(json_path)
+    with open(json_path) as f:
+        assert len(json.load(f)['metric_descriptors']) == 3
+
+    csv_path = str(tmpdir.join('inventory.csv'))
+    result.write(csv_path)
+    with open(csv_path) as f:
+        rows = list(csv.reader(f))
+    assert rows[0][:2] == ['category', 'type']
+    assert ['metric_descriptors', 'custom.googleapis.com/a', 'a', '2',
+            'one two'] in rows
+
+
+@flaky
+def test_build_inventory(cloud_config):
+    result = inventory.build_inventory([cloud_config.project])
+
+    assert not result.errors
+    assert result.descriptors('monitored_resource_descriptors')
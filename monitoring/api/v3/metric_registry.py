@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Local registry of Google Monitoring API V3 custom metric descriptors.
+
+Creating a metric descriptor on every run and then polling until it can be
+read back costs short-lived jobs several seconds. MetricDescriptorRegistry
+lists every custom metric descriptor of a project once, caches the list in a
+local file for ``ttl`` seconds so that later runs can skip the call
+entirely, creates only the descriptors that are missing, and only waits for
+propagation when it actually created one.
+
+To run locally:
+
+    python metric_registry.py --project_id=<YOUR-PROJECT-ID>
+
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from googleapiclient.errors import HttpError
+import list_resources
+
+CUSTOM_METRIC_DOMAIN = 'custom.googleapis.com'
+
+# Points written to a descriptor must match these fields of it.
+MATCHED_FIELDS = ('metricKind', 'valueType')
+
+
+class DescriptorMismatchError(Exception):
+    """A metric descriptor exists with a different kind or value type."""
+
+
+def mismatched_fields(existing, wanted):
+    """Returns the fields of MATCHED_FIELDS in which two descriptors
+    differ."""
+    return [field for field in MATCHED_FIELDS
+            if field in wanted and existing.get(field) != wanted[field]]
+
+
+def default_cache_path(project_resource):
+    return os.path.join(
+        tempfile.gettempdir(), 'metric-descriptors-{}.json'.format(
+            project_resource.replace('/', '-')))
+
+
+class MetricDescriptorRegistry(object):
+    """Caches the custom metric descriptors of a project.
+
+    Args:
+        client: A monitoring v3 client.
+        project_resource: The project, as "projects/<id>".
+        cache_path: File to cache descriptors in between runs. Pass None to
+            use a file in the temp directory.
+        ttl: Seconds a cached descriptor list is trusted for.
+    """
+
+    def __init__(self, client, project_resource, cache_path=None, ttl=3600):
+        self.client = client
+        self.project_resource = project_resource
+        self.cache_path = cache_path or default_cache_path(project_resource)
+        self.ttl = ttl
+        self._descriptors = None
+        self._loaded_at = 0
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            return False
+
+        if cache.get('project') != self.project_resource:
+            return False
+
+        self._descriptors = cache['descriptors']
+        self._loaded_at = cache['loaded_at']
+        return True
+
+    def _write_cache(self):
+        cache = {
+            'project': self.project_resource,
+            'loaded_at': self._loaded_at,
+            'descriptors': self._descriptors,
+        }
+        # Write to a temporary file and rename it so that concurrent runs
+        # never read a partial file.
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.rename(temp_path, self.cache_path)
+
+    def _expired(self):
+        return time.time() - self._loaded_at > self.ttl
+
+    def invalidate(self):
+        """Forgets the cached descriptors, in memory and on disk, so the next
+        lookup lists them again. Call this when a write reports that a
+        descriptor is missing."""
+        self._descriptors = None
+        self._loaded_at = 0
+        try:
+            os.remove(self.cache_path)
+        except OSError:
+            pass
+
+    def refresh(self):
+        """Lists every custom metric descriptor, following all pages."""
+        descriptors = {}
+        request = self.client.projects().metricDescriptors().list(
+            name=self.project_resource,
+            filter='metric.type = starts_with("{}/")'.format(
+                CUSTOM_METRIC_DOMAIN))
+
+        while request is not None:
+            response = request.execute()
+            for descriptor in response.get('metricDescriptors', []):
+                descriptors[descriptor['type']] = descriptor
+            request = self.client.projects().metricDescriptors().list_next(
+                request, response)
+
+        self._descriptors = descriptors
+        self._loaded_at = time.time()
+        self._write_cache()
+
+    def descriptors(self):
+        """Returns a dict of metric type to descriptor."""
+        if self._descriptors is None:
+            self._read_cache()
+        if self._descriptors is None or self._expired():
+            self.refresh()
+        return self._descriptors
+
+    def get(self, metric_type):
+        return self.descriptors().get(metric_type)
+
+    def _wait_until_readable(self, metric_type, timeout, initial_delay):
+        name = '{}/metricDescriptors/{}'.format(
+            self.project_resource, metric_type)
+        deadline = time.time() + timeout
+        delay = initial_delay
+
+        while True:
+            try:
+                return self.client.projects().metricDescriptors().get(
+                    name=name).execute()
+            except HttpError as e:
+                if int(e.resp.status) != 404 or time.time() > deadline:
+                    raise
+            time.sleep(delay * random.uniform(1, 1.5))
+            delay = min(delay * 2, 5)
+
+    def _mismatches(self, descriptors):
+        known = self.descriptors()
+        return [(d, mismatched_fields(known[d['type']], d))
+                for d in descriptors
+                if d['type'] in known and
+                mismatched_fields(known[d['type']], d)]
+
+    def ensure(self, descriptors, timeout=60, initial_delay=0.5,
+               recreate=False):
+        """Creates whichever of ``descriptors`` do not exist yet.
+
+        If any were created, waits with exponential backoff until each can
+        be read back, since writes to a new metric fail until then.
+
+        Args:
+            recreate: What to do with an existing descriptor whose kind or
+                value type differs from the one given. If True, it is
+                deleted and created again, which deletes its data. By
+                default, DescriptorMismatchError is raised.
+
+        Returns:
+            The list of metric types that were created.
+        """
+        mismatches = self._mismatches(descriptors)
+        if mismatches:
+            # The cached copy may be out of date.
+            self.refresh()
+            mismatches = self._mismatches(descriptors)
+
+        if mismatches and not recreate:
+            raise DescriptorMismatchError('; '.join(
+                '{} differs in {}'.format(d['type'], ', '.join(fields))
+                for d, fields in mismatches))
+
+        known = self.descriptors()
+        for descriptor, _ in mismatches:
+            self.client.projects().metricDescriptors().delete(
+                name='{}/metricDescriptors/{}'.format(
+                    self.project_resource, descriptor['type'])).execute()
+            del known[descriptor['type']]
+
+        missing = [d for d in descriptors if d['type'] not in known]
+
+        for descriptor in missing:
+            self.client.projects().metricDescriptors().create(
+                name=self.project_resource, body=descriptor).execute()
+
+        for descriptor in missing:
+            known[descriptor['type']] = self._wait_until_readable(
+                descriptor['type'], timeout, initial_delay)
+
+        if missing:
+            self._write_cache()
+
+        return [descriptor['type'] for descriptor in missing]
+
+
+def main(project_id):
+    project_resource = 'projects/{}'.format(project_id)
+    registry = MetricDescriptorRegistry(
+        list_resources.get_client(), project_resource)
+
+    for metric_type in sorted(registry.descriptors()):
+        print(metric_type)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--project_id', help='Project ID you want to access.', required=True)
+
+    args = parser.parse_args()
+    main(args.project_id)
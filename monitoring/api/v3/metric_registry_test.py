@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for metric_registry.py
+
+The caching tests use a mock client. test_ensure_custom_metric is an
+integration test and needs GOOGLE_APPLICATION_CREDENTIALS set to a Service
+Account for a project that has enabled the Monitoring API.
+"""
+
+import custom_metric
+from gcp.testing.flaky import flaky
+from googleapiclient.errors import HttpError
+import httplib2
+import list_resources
+import metric_registry
+import mock
+import pytest
+
+METRIC_TYPE = 'custom.googleapis.com/test_registry'
+
+
+def descriptor(metric_type):
+    return custom_metric.custom_metric_descriptor(metric_type, 'GAUGE')
+
+
+@pytest.fixture
+def client():
+    client = mock.Mock()
+    descriptors = client.projects.return_value.metricDescriptors.return_value
+    descriptors.list.return_value.execute.return_value = {
+        'metricDescriptors': [descriptor(METRIC_TYPE)]}
+    descriptors.list_next.return_value = None
+    return client
+
+
+@pytest.fixture
+def cache_path(tmpdir):
+    return str(tmpdir.join('descriptors.json'))
+
+
+def descriptors_api(client):
+    return client.projects.return_value.metricDescriptors.return_value
+
+
+def test_follows_pages(client, cache_path):
+    api = descriptors_api(client)
+    second_page = mock.Mock()
+    second_page.execute.return_value = {
+        'metricDescriptors': [descriptor(METRIC_TYPE + '_2')]}
+    api.list_next.side_effect = [second_page, None]
+
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path)
+
+    assert sorted(registry.descriptors()) == [
+        METRIC_TYPE, METRIC_TYPE + '_2']
+
+
+def test_cache_is_shared_between_runs(client, cache_path):
+    metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path).descriptors()
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path)
+
+    assert registry.get(METRIC_TYPE)['type'] == METRIC_TYPE
+    assert descriptors_api(client).list.call_count == 1
+
+
+def test_expired_cache_is_refreshed(client, cache_path):
+    metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path).descriptors()
+    metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path, ttl=-1).descriptors()
+
+    assert descriptors_api(client).list.call_count == 2
+
+
+def test_ensure_existing_does_not_wait(client, cache_path):
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path)
+
+    with mock.patch('time.sleep') as sleep:
+        assert registry.ensure([descriptor(METRIC_TYPE)]) == []
+
+    assert not descriptors_api(client).create.called
+    assert not descriptors_api(client).get.called
+    assert not sleep.called
+
+
+def test_ensure_creates_missing_and_waits(client, cache_path):
+    new_type = METRIC_TYPE + '_new'
+    api = descriptors_api(client)
+    api.get.return_value.execute.side_effect = [
+        HttpError(httplib2.Response({'status': 404}), b''),
+        descriptor(new_type)]
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path)
+
+    with mock.patch('time.sleep') as sleep:
+        created = registry.ensure(
+            [descriptor(METRIC_TYPE), descriptor(new_type)])
+
+    assert created == [new_type]
+    assert api.create.call_count == 1
+    assert api.create.call_args[1]['body']['type'] == new_type
+    assert sleep.call_count == 1
+
+    # The new descriptor is cached for the next run.
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path)
+    assert registry.get(new_type) is not None
+    assert api.list.call_count == 1
+
+
+def test_ensure_mismatched_descriptor(client, cache_path):
+    api = descriptors_api(client)
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path)
+    wanted = custom_metric.custom_metric_descriptor(
+        METRIC_TYPE, 'GAUGE', value_type='DOUBLE')
+
+    with pytest.raises(metric_registry.DescriptorMismatchError):
+        registry.ensure([wanted])
+    # The cached list was refreshed before giving up.
+    assert api.list.call_count == 2
+    assert not api.create.called
+
+    api.get.return_value.execute.return_value = wanted
+    assert registry.ensure([wanted], recreate=True) == [METRIC_TYPE]
+    assert api.delete.call_args[1]['name'] == (
+        'projects/test/metricDescriptors/' + METRIC_TYPE)
+    assert api.create.call_args[1]['body'] == wanted
+
+
+def test_invalidate_drops_the_file_cache(client, cache_path):
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path)
+    registry.descriptors()
+    registry.invalidate()
+
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, 'projects/test', cache_path=cache_path)
+    registry.descriptors()
+    assert descriptors_api(client).list.call_count == 2
+
+
+@flaky
+def test_ensure_custom_metric(cloud_config, cache_path):
+    project_resource = 'projects/{}'.format(cloud_config.project)
+    registry = metric_registry.MetricDescriptorRegistry(
+        list_resources.get_client(), project_resource, cache_path=cache_path)
+
+    registry.ensure([descriptor('custom.googleapis.com/custom_measurement')])
+
+    assert registry.get('custom.googleapis.com/custom_measurement')
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Reads aligned Google Monitoring API V3 time series into NumPy arrays.
+
+list_resources.py reads the raw points of a metric and prints the first page
+of the response. read_aligned instead asks the API to align (and optionally
+reduce) the points on a fixed period, so a week of data is a few hundred
+points per series rather than tens of thousands, follows every page while
+prefetching the next one, and returns the result as a single matrix with one
+row per time series and one column per aligned timestamp.
+
+To run locally:
+
+    python timeseries_reader.py --project_id=<YOUR-PROJECT-ID>
+
+"""
+
+import argparse
+import collections
+import datetime
+from multiprocessing.pool import ThreadPool
+
+import custom_metric
+import list_resources
+import numpy
+
+TimeSeriesMatrix = collections.namedtuple(
+    'TimeSeriesMatrix', ['timestamps', 'values', 'labels'])
+TimeSeriesMatrix.__doc__ = """The points of several aligned time series.
+
+timestamps: A 1-D datetime64[s] array of the aligned end times, ascending.
+values: A 2-D float64 array with one row per time series and one column per
+    timestamp. Missing points are NaN.
+labels: A list with one dict per row, holding the resource type and the
+    resource and metric labels of the time series.
+"""
+
+
+def point_value(value):
+    """Returns a point's value as a float. DISTRIBUTION points are reduced
+    to their mean."""
+    if 'doubleValue' in value:
+        return float(value['doubleValue'])
+    if 'int64Value' in value:
+        # int64 values are serialized as strings.
+        return float(value['int64Value'])
+    if 'boolValue' in value:
+        return float(value['boolValue'])
+    if 'distributionValue' in value:
+        return float(value['distributionValue'].get('mean', 0))
+    return numpy.nan
+
+
+def series_labels(series):
+    labels = {'resource_type': series['resource']['type']}
+    labels.update(series['resource'].get('labels', {}))
+    labels.update(series['metric'].get('labels', {}))
+    return labels
+
+
+def iter_pages(client, request):
+    """Yields every response page of a timeSeries.list request. The next
+    page is fetched in the background while the caller handles the current
+    one."""
+    pool = ThreadPool(1)
+    try:
+        pending = pool.apply_async(request.execute)
+        while pending is not None:
+            response = pending.get()
+            request = client.projects().timeSeries().list_next(
+                request, response)
+            if request is not None:
+                pending = pool.apply_async(request.execute)
+            else:
+                pending = None
+            yield response
+    finally:
+        pool.terminate()
+
+
+def to_matrix(pages):
+    """Builds a TimeSeriesMatrix from timeSeries.list response pages."""
+    # label key -> (labels, end times, values). A time series may be split
+    # across pages.
+    series_points = collections.OrderedDict()
+
+    for page in pages:
+        for series in page.get('timeSeries', []):
+            labels = series_labels(series)
+            key = frozenset(labels.items())
+            if key not in series_points:
+                series_points[key] = (labels, [], [])
+            _, end_times, values = series_points[key]
+            for point in series.get('points', []):
+                end_times.append(point['interval']['endTime'].rstrip('Z'))
+                values.append(point_value(point['value']))
+
+    labels = [entry[0] for entry in series_points.values()]
+    all_end_times = [t for entry in series_points.values() for t in entry[1]]
+    if not all_end_times:
+        return TimeSeriesMatrix(
+            numpy.array([], dtype='datetime64[s]'),
+            numpy.empty((len(labels), 0)), labels)
+
+    parsed = numpy.array(
+        all_end_times, dtype='datetime64[ms]').astype('datetime64[s]')
+    timestamps, columns = numpy.unique(parsed, return_inverse=True)
+    rows = numpy.repeat(
+        numpy.arange(len(labels)),
+        [len(entry[1]) for entry in series_points.values()])
+
+    values = numpy.full((len(labels), len(timestamps)), numpy.nan)
+    values[rows, columns] = [
+        v for entry in series_points.values() for v in entry[2]]
+
+    return TimeSeriesMatrix(timestamps, values, labels)
+
+
+def read_aligned(client, project_resource, metric_type, start_time, end_time,
+                 alignment_period=60, per_series_aligner='ALIGN_MEAN',
+                 cross_series_reducer=None, group_by_fields=None,
+                 extra_filter=None, page_size=None):
+    """Reads a metric aligned on ``alignment_period`` into a TimeSeriesMatrix.
+
+    Args:
+        client: A monitoring v3 client.
+        project_resource: The project to read from, as "projects/<id>".
+        metric_type: e.g. "compute.googleapis.com/instance/cpu/utilization".
+        start_time: The start of the interval, as a datetime.
+        end_time: The end of the interval, as a datetime.
+        alignment_period: The alignment period in seconds.
+        per_series_aligner: How points of a series are combined per period,
+            e.g. ALIGN_MEAN, ALIGN_MAX or ALIGN_RATE.
+        cross_series_reducer: How aligned series are combined, e.g.
+            REDUCE_MEAN. None keeps every series.
+        group_by_fields: The labels to keep when reducing, e.g.
+            ['resource.zone'].
+        extra_filter: An additional filter expression, ANDed with the metric
+            type.
+        page_size: The number of time series per page. None lets the server
+            choose.
+    """
+    metric_filter = 'metric.type="{}"'.format(metric_type)
+    if extra_filter:
+        metric_filter = '{} AND {}'.format(metric_filter, extra_filter)
+
+    kwargs = {
+        'name': project_resource,
+        'filter': metric_filter,
+        'interval_startTime': custom_metric.format_rfc3339(start_time),
+        'interval_endTime': custom_metric.format_rfc3339(end_time),
+        'aggregation_alignmentPeriod': '{}s'.format(alignment_period),
+        'aggregation_perSeriesAligner': per_series_aligner,
+    }
+    if cross_series_reducer:
+        kwargs['aggregation_crossSeriesReducer'] = cross_series_reducer
+    if group_by_fields:
+        kwargs['aggregation_groupByFields'] = group_by_fields
+    if page_size:
+        kwargs['pageSize'] = page_size
+
+    request = client.projects().timeSeries().list(**kwargs)
+    return to_matrix(iter_pages(client, request))
+
+
+def main(project_id):
+    project_resource = 'projects/{}'.format(project_id)
+    client = list_resources.get_client()
+    end_time = datetime.datetime.utcnow()
+    start_time = end_time - datetime.timedelta(days=7)
+
+    # Hourly mean CPU utilization of every instance over the last week.
+    result = read_aligned(
+        client, project_resource,
+        'compute.googleapis.com/instance/cpu/utilization',
+        start_time, end_time, alignment_period=3600)
+
+    print('Read {} time series of {} points.'.format(*result.values.shape))
+    for labels, row in zip(result.labels, result.values):
+        print('{}: mean {:.3f}, max {:.3f}'.format(
+            labels.get('instance_id'), numpy.nanmean(row),
+            numpy.nanmax(row)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--project_id', help='Project ID you want to access.', required=True)
+
+    args = parser.parse_args()
+    main(args.project_id)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for timeseries_reader.py
+
+The parsing and paging tests use a mock client. test_read_aligned is an
+integration test and needs GOOGLE_APPLICATION_CREDENTIALS set to a Service
+Account for a project that has enabled the Monitoring API.
+"""
+
+import datetime
+
+from gcp.testing.flaky import flaky
+import list_resources
+import mock
+import numpy
+import timeseries_reader
+
+METRIC = 'compute.googleapis.com/instance/cpu/utilization'
+
+
+def series(instance_id, points):
+    return {
+        'metric': {'type': METRIC},
+        'resource': {
+            'type': 'gce_instance',
+            'labels': {'instance_id': instance_id}},
+        'points': [{
+            'interval': {'endTime': end_time},
+            'value': {'doubleValue': value}} for end_time, value in points]
+    }
+
+
+def test_to_matrix_aligns_series():
+    pages = [
+        {'timeSeries': [
+            series('a', [('2016-06-01T01:00:00Z', 2.0),
+                         ('2016-06-01T00:00:00Z', 1.0)])]},
+        {'timeSeries': [
+            series('b', [('2016-06-01T01:00:00.000Z', 3.0)])]},
+    ]
+
+    result = timeseries_reader.to_matrix(pages)
+
+    assert list(result.timestamps.astype(str)) == [
+        '2016-06-01T00:00:00', '2016-06-01T01:00:00']
+    assert [labels['instance_id'] for labels in result.labels] == ['a', 'b']
+    assert result.values[0].tolist() == [1.0, 2.0]
+    assert numpy.isnan(result.values[1, 0])
+    assert result.values[1, 1] == 3.0
+
+
+def test_point_value():
+    assert timeseries_reader.point_value({'int64Value': '7'}) == 7.0
+    assert timeseries_reader.point_value({'boolValue': True}) == 1.0
+    assert timeseries_reader.point_value(
+        {'distributionValue': {'count': 2, 'mean': 4.5}}) == 4.5
+
+
+def test_read_aligned_follows_pages():
+    client = mock.Mock()
+    time_series = client.projects.return_value.timeSeries.return_value
+    first_page = time_series.list.return_value
+    first_page.execute.return_value = {
+        'timeSeries': [series('a', [('2016-06-01T00:00:00Z', 1.0)])],
+        'nextPageToken': 'token'}
+    second_page = mock.Mock()
+    second_page.execute.return_value = {
+        'timeSeries': [series('b', [('2016-06-01T00:00:00Z', 2.0)])]}
+    time_series.list_next.side_effect = [second_page, None]
+
+    result = timeseries_reader.read_aligned(
+        client, 'projects/test', METRIC,
+        datetime.datetime(2016, 6, 1), datetime.datetime(2016, 6, 2),
+        alignment_period=3600, cross_series_reducer='REDUCE_MEAN',
+        group_by_fields=['resource.instance_id'])
+
+    kwargs = time_series.list.call_args[1]
+    assert kwargs['aggregation_alignmentPeriod'] == '3600s'
+    assert kwargs['aggregation_perSeriesAligner'] == 'ALIGN_MEAN'
+    assert kwargs['aggregation_crossSeriesReducer'] == 'REDUCE_MEAN'
+    assert result.values.tolist() == [[1.0], [2.0]]
+
+
+@flaky
+def test_read_aligned(cloud_config):
+    end_time = datetime.datetime.utcnow()
+    result = timeseries_reader.read_aligned(
+        list_resources.get_client(),
+        'projects/{}'.format(cloud_config.project), METRIC,
+        end_time - datetime.timedelta(hours=6), end_time,
+        alignment_period=600)
+
+    assert result.values.shape == (len(result.labels), len(result.timestamps))
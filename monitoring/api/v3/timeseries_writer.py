@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Batched, background writer for Google Monitoring API V3 time series.
+
+custom_metric.py writes a single point with a single timeSeries.create call.
+The API accepts up to 200 time series per call, but at most one point per
+time series per call, and rejects points written to the same time series
+too close together. TimeSeriesWriter buffers points from any number of
+threads, keeps only the newest pending point for each time series, and a
+background thread sends every time series that is due in as few calls as
+possible.
+
+To run locally:
+
+    python timeseries_writer.py --project_id=<YOUR-PROJECT-ID>
+
+"""
+
+import argparse
+import datetime
+import random
+import re
+import threading
+import time
+
+import custom_metric
+from googleapiclient.errors import HttpError
+import list_resources
+import metric_registry
+
+# The most time series a single timeSeries.create call accepts.
+MAX_TIME_SERIES_PER_REQUEST = 200
+
+# The minimum number of seconds between two points of the same time series.
+MIN_WRITE_SPACING_SECS = 5
+
+# Rejections of a point that can never be written: one older than, or at the
+# same time as, the last point of its time series. Other rejected points,
+# such as those of a metric whose descriptor is still being created, are
+# retried up to max_retries times.
+INVALID_POINT_ERRORS = re.compile(
+    r'written in order|older|duplicate', re.IGNORECASE)
+
+VALUE_FIELDS = {
+    'BOOL': 'boolValue',
+    'INT64': 'int64Value',
+    'DOUBLE': 'doubleValue',
+    'STRING': 'stringValue',
+    'DISTRIBUTION': 'distributionValue',
+}
+
+
+def series_key(metric_type, metric_labels, resource_type, resource_labels):
+    return (metric_type, frozenset(metric_labels.items()),
+            resource_type, frozenset(resource_labels.items()))
+
+
+def _error_text(error):
+    content = error.content
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', 'replace')
+    return content
+
+
+def rejected_series(error, count):
+    """Returns a dict from the index of each time series that a
+    timeSeries.create error names as rejected to the error text about it.
+    If the error names none, all ``count`` of them map to the whole text."""
+    text = _error_text(error)
+    matches = list(re.finditer(r'timeSeries\[(\d+)\]', text))
+    rejected = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        index = int(match.group(1))
+        end = following.start() if following else len(text)
+        if index < count:
+            rejected[index] = (
+                rejected.get(index, '') + text[match.end():end])
+    return rejected or dict.fromkeys(range(count), text)
+
+
+class TimeSeriesWriter(object):
+    """Buffers points and writes them in batched timeSeries.create calls.
+
+    Args:
+        client: A monitoring v3 client, as returned by
+            list_resources.get_client(). Only the background thread uses it.
+        project_resource: The project to write to, as "projects/<id>".
+        flush_interval: Seconds between background flushes.
+        min_spacing: Minimum seconds between points of one time series.
+        max_retries: How many times a point is retried after the API fails
+            to accept it before it is dropped. Points the API rejects as out
+            of order are dropped at once; see INVALID_POINT_ERRORS.
+        start: Whether to start the background flush thread.
+        registry: A metric_registry.MetricDescriptorRegistry to invalidate
+            when a write reports a missing metric descriptor, so the next
+            ensure() does not trust its stale cache.
+    """
+
+    def __init__(self, client, project_resource, flush_interval=5,
+                 min_spacing=MIN_WRITE_SPACING_SECS, max_retries=3,
+                 start=True, registry=None):
+        self.client = client
+        self.project_resource = project_resource
+        self.flush_interval = flush_interval
+        self.min_spacing = min_spacing
+        self.max_retries = max_retries
+        self.registry = registry
+
+        self._lock = threading.Lock()
+        # series key -> (time series dict, retries so far)
+        self._pending = {}
+        # series key -> time of the last point written
+        self._last_written = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.requests_sent = 0
+        self.points_written = 0
+        self.points_dropped = 0
+        self.points_replaced = 0
+
+        if start:
+            self.start()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, metric_type, value, metric_labels=None,
+              resource_type='global', resource_labels=None,
+              metric_kind='GAUGE', value_type='INT64', start_time=None,
+              end_time=None):
+        """Queues a point. It replaces any point for the same time series
+        that has not been sent yet, which is counted in ``points_replaced``.
+
+        Args:
+            metric_type: e.g. "custom.googleapis.com/custom_measurement".
+            value: The point value. For DISTRIBUTION, the distributionValue
+                dict.
+            metric_labels: A dict of metric label values.
+            resource_type: The monitored resource type.
+            resource_labels: A dict of monitored resource label values.
+            metric_kind: GAUGE or CUMULATIVE.
+            value_type: One of the keys of VALUE_FIELDS.
+            start_time: Interval start, defaults to end_time.
+            end_time: Interval end, defaults to now.
+        """
+        metric_labels = metric_labels or {}
+        resource_labels = resource_labels or {}
+        end_time = end_time or datetime.datetime.utcnow()
+        start_time = start_time or end_time
+
+        series = {
+            'metric': {'type': metric_type, 'labels': metric_labels},
+            'resource': {'type': resource_type, 'labels': resource_labels},
+            'metricKind': metric_kind,
+            'valueType': value_type,
+            'points': [{
+                'interval': {
+                    'startTime': custom_metric.format_rfc3339(start_time),
+                    'endTime': custom_metric.format_rfc3339(end_time)
+                },
+                'value': {VALUE_FIELDS[value_type]: value}
+            }]
+        }
+        key = series_key(
+            metric_type, metric_labels, resource_type, resource_labels)
+
+        with self._lock:
+            replaced = self._pending.get(key)
+            if replaced is None:
+                self._pending[key] = (series, 0)
+            else:
+                # Keep the retry count, so a series the API keeps failing to
+                # accept is still dropped in the end.
+                self.points_replaced += 1
+                self._pending[key] = (series, replaced[1])
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _take_due(self, now):
+        """Removes and returns the pending series that may be written."""
+        with self._lock:
+            due = [key for key in self._pending
+                   if now - self._last_written.get(key, 0) >=
+                   self.min_spacing]
+            return [(key,) + self._pending.pop(key) for key in due]
+
+    def _requeue(self, entries):
+        with self._lock:
+            for key, series, retries in entries:
+                if retries >= self.max_retries:
+                    self.points_dropped += 1
+                elif key not in self._pending:
+                    # A newer point for the same series takes precedence.
+                    self._pending[key] = (series, retries + 1)
+
+    def _send(self, entries):
+        """Sends one batch. On a client error, retries the series the API
+        rejected, unless the point itself can never be written."""
+        with self._lock:
+            self.requests_sent += 1
+
+        try:
+            self.client.projects().timeSeries().create(
+                name=self.project_resource,
+                body={'timeSeries': [series for _, series, _ in entries]}
+            ).execute()
+        except HttpError as e:
+            status = int(e.resp.status)
+            if status == 429 or status >= 500:
+                self._requeue(entries)
+                return
+
+            # The API writes every valid time series in a request and names
+            # the ones it rejected in the error, so only those are sent
+            # again; resending the batch would write the accepted points
+            # twice. If no series is named, all of them were rejected.
+            if self.registry is not None and (
+                    status == 404 or 'not found' in _error_text(e).lower()):
+                self.registry.invalidate()
+            rejected = rejected_series(e, len(entries))
+            retry = [entry for index, entry in enumerate(entries)
+                     if index in rejected and
+                     not INVALID_POINT_ERRORS.search(rejected[index])]
+            with self._lock:
+                self.points_dropped += len(rejected) - len(retry)
+            self._requeue(retry)
+            entries = [entry for index, entry in enumerate(entries)
+                       if index not in rejected]
+
+        now = time.time()
+        with self._lock:
+            self.points_written += len(entries)
+            for key, _, _ in entries:
+                self._last_written[key] = now
+
+    def flush(self):
+        """Writes every pending point whose time series is due.
+
+        Returns:
+            The number of points still pending afterwards.
+        """
+        entries = self._take_due(time.time())
+        for start in range(0, len(entries), MAX_TIME_SERIES_PER_REQUEST):
+            self._send(entries[start:start + MAX_TIME_SERIES_PER_REQUEST])
+        return self.pending()
+
+    def _run(self):
+        # Stagger writers started at the same moment.
+        self._stop.wait(random.uniform(0, self.flush_interval))
+        while not self._stop.is_set():
+            self.flush()
+            self._stop.wait(self.flush_interval)
+
+    def close(self, timeout=None):
+        """Stops the background thread and writes everything still pending,
+        waiting for time series to become due for at most ``timeout``
+        seconds (default: twice the minimum spacing)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if timeout is None:
+            timeout = 2 * self.min_spacing
+        deadline = time.time() + timeout
+
+        while self.flush() and time.time() < deadline:
+            time.sleep(min(1, self.min_spacing))
+
+
+def main(project_id):
+    custom_metric_type = 'custom.googleapis.com/custom_measurement'
+    project_resource = 'projects/{}'.format(project_id)
+    client = list_resources.get_client()
+    registry = metric_registry.MetricDescriptorRegistry(
+        client, project_resource)
+    registry.ensure([
+        custom_metric.custom_metric_descriptor(custom_metric_type, 'GAUGE')])
+
+    with TimeSeriesWriter(
+            client, project_resource, registry=registry) as writer:
+        # Points for 500 time series, written from several threads.
+        def report(worker):
+            for n in range(100):
+                writer.write(
+                    custom_metric_type, random.randint(0, 10),
+                    metric_labels={'environment': 'STAGING'},
+                    resource_type='gce_instance',
+                    resource_labels={
+                        'instance_id': 'instance-{}-{}'.format(worker, n),
+                        'zone': 'us-central1-f'})
+
+        threads = [threading.Thread(target=report, args=(worker,))
+                   for worker in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    print('Wrote {} points in {} requests, dropped {}, replaced {}.'.format(
+        writer.points_written, writer.requests_sent, writer.points_dropped,
+        writer.points_replaced))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--project_id', help='Project ID you want to access.', required=True)
+
+    args = parser.parse_args()
+    main(args.project_id)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for timeseries_writer.py
+
+The batching tests use a mock client. test_write_custom_metric is an
+integration test and needs GOOGLE_APPLICATION_CREDENTIALS set to a Service
+Account for a project that has enabled the Monitoring API.
+"""
+
+from gcp.testing.flaky import flaky
+from googleapiclient.errors import HttpError
+import httplib2
+import list_resources
+import mock
+import pytest
+import timeseries_writer
+
+METRIC_TYPE = 'custom.googleapis.com/test_measurement'
+
+
+def http_error(status, content=b''):
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+def created_batches(client):
+    create = client.projects.return_value.timeSeries.return_value.create
+    return [call[1]['body']['timeSeries'] for call in create.call_args_list]
+
+
+@pytest.fixture
+def client():
+    return mock.Mock()
+
+
+@pytest.fixture
+def writer(client):
+    return timeseries_writer.TimeSeriesWriter(
+        client, 'projects/test', min_spacing=0, start=False)
+
+
+def test_batches_up_to_the_request_limit(client, writer):
+    for n in range(450):
+        writer.write(METRIC_TYPE, n, metric_labels={'n': str(n)})
+
+    assert writer.flush() == 0
+    assert [len(batch) for batch in created_batches(client)] == [
+        200, 200, 50]
+    assert writer.points_written == 450
+
+
+def test_keeps_newest_point_per_series(client, writer):
+    writer.write(METRIC_TYPE, 1)
+    writer.write(METRIC_TYPE, 2)
+    writer.write(METRIC_TYPE, 3, metric_labels={'environment': 'STAGING'})
+
+    writer.flush()
+    values = [series['points'][0]['value']['int64Value']
+              for series in created_batches(client)[0]]
+    assert sorted(values) == [2, 3]
+    assert writer.points_replaced == 1
+
+
+def test_respects_minimum_spacing(client, writer):
+    writer.min_spacing = 60
+    writer.write(METRIC_TYPE, 1)
+    writer.flush()
+    writer.write(METRIC_TYPE, 2)
+
+    assert writer.flush() == 1
+    assert len(created_batches(client)) == 1
+
+
+def test_requeues_on_server_error(client, writer):
+    execute = client.projects.return_value.timeSeries.return_value.create \
+        .return_value.execute
+    execute.side_effect = [http_error(503), None]
+
+    writer.write(METRIC_TYPE, 1)
+    assert writer.flush() == 1
+    assert writer.flush() == 0
+    assert writer.points_written == 1
+
+
+def test_retries_only_rejected_series(client, writer):
+    execute = client.projects.return_value.timeSeries.return_value.create \
+        .return_value.execute
+    # The API wrote the second series and rejected the first.
+    execute.side_effect = [http_error(
+        400, b'Field timeSeries[0].points[0] had an invalid value'), None]
+
+    writer.write(METRIC_TYPE, 1, metric_labels={'n': '1'})
+    writer.write(METRIC_TYPE, 2, metric_labels={'n': '2'})
+    assert writer.flush() == 1
+    assert writer.flush() == 0
+
+    retried = created_batches(client)[1]
+    assert [series['metric']['labels'] for series in retried] == [{'n': '1'}]
+    assert writer.points_written == 2
+    assert writer.points_dropped == 0
+
+
+def test_rejected_series_are_dropped_after_retries(client, writer):
+    execute = client.projects.return_value.timeSeries.return_value.create \
+        .return_value.execute
+    execute.side_effect = http_error(403)
+
+    writer.write(METRIC_TYPE, 1, metric_labels={'n': '1'})
+    writer.write(METRIC_TYPE, 2, metric_labels={'n': '2'})
+    while writer.flush():
+        pass
+
+    assert len(created_batches(client)) == writer.max_retries + 1
+    assert writer.points_dropped == 2
+
+
+def test_out_of_order_point_is_dropped(client, writer):
+    execute = client.projects.return_value.timeSeries.return_value.create \
+        .return_value.execute
+    execute.side_effect = [http_error(
+        400, b'timeSeries[1]: Points must be written in order. One or more '
+        b'of the points specified had an older end time than the most '
+        b'recent point.')]
+
+    writer.write(METRIC_TYPE, 1, metric_labels={'n': '1'})
+    writer.write(METRIC_TYPE, 2, metric_labels={'n': '2'})
+    writer.flush()
+
+    assert writer.points_written == 1
+    assert writer.points_dropped == 1
+    assert writer.pending() == 0
+
+
+def test_replacing_a_point_keeps_its_retries(client, writer):
+    writer.max_retries = 1
+    execute = client.projects.return_value.timeSeries.return_value.create \
+        .return_value.execute
+    execute.side_effect = http_error(503)
+
+    writer.write(METRIC_TYPE, 1)
+    writer.flush()
+    writer.write(METRIC_TYPE, 2)
+    writer.flush()
+
+    assert writer.points_dropped == 1
+    assert writer.pending() == 0
+
+
+def test_missing_descriptor_invalidates_registry(client, writer):
+    writer.registry = mock.Mock()
+    execute = client.projects.return_value.timeSeries.return_value.create \
+        .return_value.execute
+    execute.side_effect = [http_error(
+        400, b'timeSeries[0]: metric descriptor not found')]
+
+    writer.write(METRIC_TYPE, 1)
+    writer.flush()
+
+    assert writer.registry.invalidate.called
+
+
+def test_close_flushes(client):
+    writer = timeseries_writer.TimeSeriesWriter(
+        client, 'projects/test', flush_interval=60, min_spacing=0)
+    writer.write(METRIC_TYPE, 1)
+    writer.close()
+
+    assert writer.pending() == 0
+    assert writer.points_written == 1
+
+
+@flaky
+def test_write_custom_metric(cloud_config):
+    project_resource = 'projects/{}'.format(cloud_config.project)
+    client = list_resources.get_client()
+
+    with timeseries_writer.TimeSeriesWriter(
+            client, project_resource) as writer:
+        writer.write(
+            'custom.googleapis.com/custom_measurement', 5,
+            metric_labels={'environment': 'STAGING'})
+
+    assert writer.points_written == 1
+    assert writer.points_dropped == 0
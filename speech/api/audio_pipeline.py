@@ -0,0 +1,197 @@
+# Copyright (C) 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Decouples capturing audio from sending it.
+
+A capture thread reads fixed-size chunks of PCM audio into a bounded ring
+buffer, so that a slow network never stops the audio device from being
+read. The sending side drains the buffer, coalescing chunks into larger
+payloads when each send takes longer than the audio it carries.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+import wave
+
+
+class AudioRingBuffer(object):
+    """A bounded, thread-safe FIFO of audio chunks.
+
+    When the buffer is full, the oldest chunk is discarded and counted in
+    ``overflows``. Each time the reader has to wait for audio, ``underflows``
+    is incremented.
+    """
+
+    def __init__(self, max_chunks=50):
+        self._chunks = collections.deque()
+        self._max_chunks = max_chunks
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self.overflows = 0
+        self.underflows = 0
+
+    def put(self, chunk):
+        with self._condition:
+            if len(self._chunks) >= self._max_chunks:
+                self._chunks.popleft()
+                self.overflows += 1
+            self._chunks.append(chunk)
+            self._condition.notify()
+
+    def close(self):
+        """Marks the end of the audio. Readers drain what is left."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def get(self, max_bytes, timeout=None):
+        """Removes and returns up to ``max_bytes`` of buffered audio, at
+        least one chunk, waiting for one if needed.
+
+        Returns:
+            The audio, b'' if ``timeout`` passed before any arrived, or None
+            once the buffer is closed and empty.
+        """
+        with self._condition:
+            if not self._chunks and not self._closed:
+                self.underflows += 1
+                self._condition.wait(timeout)
+            if not self._chunks:
+                return None if self._closed else b''
+
+            chunks = [self._chunks.popleft()]
+            size = len(chunks[0])
+            while self._chunks and size + len(self._chunks[0]) <= max_bytes:
+                chunk = self._chunks.popleft()
+                chunks.append(chunk)
+                size += len(chunk)
+            return b''.join(chunks)
+
+
+class CaptureThread(threading.Thread):
+    """Reads ``chunk`` frames at a time from ``audio_stream`` into
+    ``buff`` until the stream ends or ``stop()`` is called."""
+
+    def __init__(self, audio_stream, buff, chunk):
+        super(CaptureThread, self).__init__()
+        self.daemon = True
+        self.audio_stream = audio_stream
+        self.buff = buff
+        self.chunk = chunk
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                data = self.audio_stream.read(self.chunk)
+                if not data:
+                    break
+                self.buff.put(data)
+        finally:
+            self.buff.close()
+
+
+class AdaptiveBatcher(object):
+    """Chooses how many chunks to send per request from the observed send
+    latency.
+
+    If sending a request takes longer than the audio it carries, the
+    sender falls behind, so the request size doubles. When sending takes
+    less than a quarter of it, the request size shrinks by one chunk to
+    bring latency back down.
+    """
+
+    def __init__(self, chunk_bytes, chunk_secs, min_chunks=1, max_chunks=10):
+        self.chunk_bytes = chunk_bytes
+        self.chunk_secs = chunk_secs
+        self.min_chunks = min_chunks
+        self.max_chunks = max_chunks
+        self.chunks = min_chunks
+        self.latency = None
+
+    @property
+    def max_bytes(self):
+        return self.chunks * self.chunk_bytes
+
+    def record_latency(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * seconds
+
+        budget = self.chunks * self.chunk_secs
+        if self.latency > budget:
+            self.chunks = min(self.chunks * 2, self.max_chunks)
+        elif self.latency < budget / 4:
+            self.chunks = max(self.chunks - 1, self.min_chunks)
+
+
+def stream_audio(audio_stream, chunk, chunk_bytes, chunk_secs, stop_audio,
+                 buff=None, batcher=None):
+    """Yields coalesced audio payloads read from ``audio_stream`` on a
+    capture thread, until the stream ends or ``stop_audio`` is set.
+
+    The time the consumer takes between payloads is taken to be the send
+    latency.
+    """
+    buff = buff or AudioRingBuffer()
+    batcher = batcher or AdaptiveBatcher(chunk_bytes, chunk_secs)
+    capture = CaptureThread(audio_stream, buff, chunk)
+    capture.start()
+
+    try:
+        while not stop_audio.is_set():
+            data = buff.get(batcher.max_bytes, timeout=chunk_secs * 10)
+            if data is None:
+                return
+            if not data:
+                continue
+
+            sent = time.time()
+            yield data
+            batcher.record_latency(time.time() - sent)
+    finally:
+        capture.stop()
+        capture.join()
+
+
+class WavAudioStream(object):
+    """Reads frames from a WAV file, optionally paced like a microphone.
+
+    It can be used in place of a PyAudio stream for testing.
+    """
+
+    def __init__(self, wav_file, realtime=True):
+        self.wav_file = wav_file
+        self.realtime = realtime
+
+    def read(self, num_frames):
+        if self.realtime:
+            time.sleep(num_frames / float(self.wav_file.getframerate()))
+        return self.wav_file.readframes(num_frames)
+
+
+@contextlib.contextmanager
+def record_wav(filename, realtime=True):
+    """Opens a WAV file as an audio stream in a context manager."""
+    wav_file = wave.open(filename, 'rb')
+    try:
+        yield WavAudioStream(wav_file, realtime)
+    finally:
+        wav_file.close()
@@ -0,0 +1,93 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import wave
+
+import audio_pipeline
+
+RATE = 16000
+CHUNK = RATE // 10
+
+
+def make_wav(resource, tmpdir):
+    path = str(tmpdir.join('quit.wav'))
+    with open(resource('quit.raw'), 'rb') as raw:
+        frames = raw.read()
+    wav_file = wave.open(path, 'wb')
+    wav_file.setnchannels(1)
+    wav_file.setsampwidth(2)
+    wav_file.setframerate(RATE)
+    wav_file.writeframes(frames)
+    wav_file.close()
+    return path, frames
+
+
+def test_ring_buffer_overflow_and_underflow():
+    buff = audio_pipeline.AudioRingBuffer(max_chunks=2)
+    assert buff.get(10, timeout=0.01) == b''
+    assert buff.underflows == 1
+
+    for chunk in (b'a', b'b', b'c'):
+        buff.put(chunk)
+    assert buff.overflows == 1
+
+    # Chunks are coalesced up to max_bytes.
+    assert buff.get(10) == b'bc'
+    buff.close()
+    assert buff.get(10) is None
+
+
+def test_batcher_adapts_to_latency():
+    batcher = audio_pipeline.AdaptiveBatcher(
+        chunk_bytes=100, chunk_secs=0.1, max_chunks=8)
+
+    for _ in range(5):
+        batcher.record_latency(1.0)
+    assert batcher.chunks == 8
+    assert batcher.max_bytes == 800
+
+    for _ in range(50):
+        batcher.record_latency(0.0)
+    assert batcher.chunks == 1
+
+
+def test_stream_audio_from_wav(resource, tmpdir):
+    path, frames = make_wav(resource, tmpdir)
+    buff = audio_pipeline.AudioRingBuffer(max_chunks=1000)
+
+    with audio_pipeline.record_wav(path, realtime=False) as audio_stream:
+        payloads = list(audio_pipeline.stream_audio(
+            audio_stream, CHUNK, chunk_bytes=2 * CHUNK, chunk_secs=0.1,
+            stop_audio=threading.Event(), buff=buff))
+
+    assert b''.join(payloads) == frames
+    assert buff.overflows == 0
+
+
+def test_slow_sender_gets_larger_requests(resource, tmpdir):
+    path, _ = make_wav(resource, tmpdir)
+    batcher = audio_pipeline.AdaptiveBatcher(
+        chunk_bytes=2 * CHUNK, chunk_secs=0.1)
+
+    sizes = []
+    with audio_pipeline.record_wav(path, realtime=False) as audio_stream:
+        for payload in audio_pipeline.stream_audio(
+                audio_stream, CHUNK, chunk_bytes=2 * CHUNK, chunk_secs=0.1,
+                stop_audio=threading.Event(), batcher=batcher):
+            sizes.append(len(payload))
+            # Simulate a send that takes longer than the audio it carries.
+            time.sleep(0.15)
+
+    assert max(sizes) > 2 * CHUNK
@@ -0,0 +1,127 @@
+# Copyright (C) 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Authenticated gRPC channels that are shared and keep their token fresh.
+
+Channels are cached per host and port, so every stub in a process shares
+one connection and pays for the TLS handshake once. The access token is
+added to each call by a metadata plugin, which refreshes it shortly before
+it expires instead of using the same token for the life of the channel.
+"""
+
+import threading
+import time
+
+from gcloud.credentials import get_credentials
+from grpc.beta import implementations
+import httplib2
+
+SPEECH_SCOPE = 'https://www.googleapis.com/auth/cloud-platform'
+
+# Refresh the access token this many seconds before it expires.
+REFRESH_MARGIN_SECS = 300
+
+# Assume tokens without a known lifetime last this long.
+DEFAULT_TOKEN_LIFETIME_SECS = 3600
+
+
+class RefreshingAuthMetadataPlugin(object):
+    """A gRPC metadata plugin that adds a current access token to calls.
+
+    Args:
+        credentials: The oauth2client credentials to get tokens from.
+        refresh_margin: Seconds before expiry to refresh the token.
+        clock: Returns the current time in seconds; for tests.
+    """
+
+    def __init__(self, credentials, refresh_margin=REFRESH_MARGIN_SECS,
+                 clock=time.time):
+        self.credentials = credentials
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._token = None
+        self._expiry = 0
+
+    def access_token(self):
+        with self._lock:
+            if (self._token is None or
+                    self.clock() >= self._expiry - self.refresh_margin):
+                if self._token is not None:
+                    # The credentials would hand back the old token until
+                    # it actually expires.
+                    self.credentials.refresh(httplib2.Http())
+                token_info = self.credentials.get_access_token()
+                self._token = token_info.access_token
+                self._expiry = self.clock() + (
+                    token_info.expires_in or DEFAULT_TOKEN_LIFETIME_SECS)
+            return self._token
+
+    def __call__(self, context, callback):
+        try:
+            token = self.access_token()
+        except Exception as e:
+            callback(None, e)
+        else:
+            callback([('authorization', 'Bearer ' + token)], None)
+
+
+def make_channel(host, port, credentials=None, scopes=(SPEECH_SCOPE,)):
+    """Creates an SSL channel that authenticates each call with a fresh
+    access token."""
+    # In order to make an https call, use an ssl channel with defaults
+    ssl_channel = implementations.ssl_channel_credentials(None, None, None)
+
+    # Grab application default credentials from the environment
+    credentials = credentials or get_credentials().create_scoped(
+        list(scopes))
+    auth_plugin = implementations.metadata_call_credentials(
+        RefreshingAuthMetadataPlugin(credentials), name='google_creds')
+
+    # compose the two together for both ssl and google auth
+    composite_channel = implementations.composite_channel_credentials(
+        ssl_channel, auth_plugin)
+
+    return implementations.secure_channel(host, port, composite_channel)
+
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def get_channel(host, port, secure=True, scopes=(SPEECH_SCOPE,)):
+    """Returns the process-wide channel to ``host`` and ``port``, creating
+    it on first use.
+
+    Args:
+        secure: Whether to use an authenticated SSL channel. Pass False to
+            talk to a local test server.
+        scopes: The OAuth scopes for the access token.
+    """
+    key = (host, port, secure, tuple(scopes))
+    with _channels_lock:
+        channel = _channels.get(key)
+        if channel is None:
+            if secure:
+                channel = make_channel(host, port, scopes=scopes)
+            else:
+                channel = implementations.insecure_channel(host, port)
+            _channels[key] = channel
+        return channel
+
+
+def clear_channels():
+    """Forgets every cached channel, so the next get_channel creates a new
+    one."""
+    with _channels_lock:
+        _channels.clear()
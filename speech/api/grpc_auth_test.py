@@ -0,0 +1,101 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+import grpc_auth
+import mock
+import pytest
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def fake_credentials():
+    credentials = mock.Mock()
+    tokens = iter(['token-1', 'token-2'])
+    credentials.get_access_token.side_effect = lambda: mock.Mock(
+        access_token=next(tokens), expires_in=3600)
+    return credentials
+
+
+def test_plugin_refreshes_before_expiry():
+    clock = FakeClock()
+    credentials = fake_credentials()
+    plugin = grpc_auth.RefreshingAuthMetadataPlugin(
+        credentials, refresh_margin=300, clock=clock)
+    callback = mock.Mock()
+
+    plugin(None, callback)
+    callback.assert_called_with([('authorization', 'Bearer token-1')], None)
+
+    # Still well within the token's lifetime.
+    clock.now += 3000
+    plugin(None, callback)
+    callback.assert_called_with([('authorization', 'Bearer token-1')], None)
+    assert not credentials.refresh.called
+
+    # Within the refresh margin.
+    clock.now += 400
+    plugin(None, callback)
+    callback.assert_called_with([('authorization', 'Bearer token-2')], None)
+    assert credentials.refresh.call_count == 1
+
+
+def test_plugin_reports_errors():
+    credentials = mock.Mock()
+    error = ValueError('no credentials')
+    credentials.get_access_token.side_effect = error
+    callback = mock.Mock()
+
+    grpc_auth.RefreshingAuthMetadataPlugin(credentials)(None, callback)
+
+    callback.assert_called_once_with(None, error)
+
+
+@pytest.mark.skipif(
+        sys.version_info >= (3, 0),
+        reason=("grpc doesn't yet support python3 "
+                'https://github.com/grpc/grpc/issues/282'))
+def test_channel_is_shared_across_calls():
+    from google.cloud.speech.v1 import cloud_speech_pb2 as cloud_speech
+
+    class FakeSpeech(cloud_speech.BetaSpeechServicer):
+        calls = 0
+
+        def NonStreamingRecognize(self, request, context):
+            FakeSpeech.calls += 1
+            return cloud_speech.NonStreamingRecognizeResponse()
+
+    server = cloud_speech.beta_create_Speech_server(FakeSpeech())
+    port = server.add_insecure_port('[::]:0')
+    server.start()
+    grpc_auth.clear_channels()
+
+    try:
+        channel = grpc_auth.get_channel('localhost', port, secure=False)
+        for _ in range(3):
+            assert grpc_auth.get_channel(
+                'localhost', port, secure=False) is channel
+            service = cloud_speech.beta_create_Speech_stub(channel)
+            service.NonStreamingRecognize(cloud_speech.RecognizeRequest(), 5)
+    finally:
+        server.stop(0)
+        grpc_auth.clear_channels()
+
+    assert FakeSpeech.calls == 3
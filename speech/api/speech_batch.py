@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Transcribes a directory or manifest of audio files with the Google Cloud
+Speech REST API, several files at a time.
+
+Results are appended to a newline-delimited JSON file as they complete. If
+the program is interrupted, running it again with the same output file skips
+the files that were already transcribed.
+
+Example:
+
+    $ python speech_batch.py resources/ --output=transcripts.json
+"""
+
+import argparse
+import base64
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import threading
+
+from googleapiclient import discovery
+from googleapiclient.errors import HttpError
+import httplib2
+from oauth2client.client import GoogleCredentials
+import speech_rest
+import vad
+
+# Look this many bytes back at a time for the end of the last whole line.
+SCAN_BYTES = 4096
+
+
+def find_audio_files(source, extensions=('.raw',)):
+    """Lists the audio files under a directory, or in a manifest file with
+    one path per line, in a stable order."""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(
+                os.path.join(root, name) for name in files
+                if name.lower().endswith(extensions))
+        return sorted(paths)
+
+    with open(source) as manifest:
+        return [line.strip() for line in manifest if line.strip()]
+
+
+def open_for_append(output_path):
+    """Opens an output file to append results to.
+
+    An interrupted run can leave a last line without its newline. It is cut
+    off first, as the next result would otherwise be written onto it and
+    both would be lost.
+    """
+    if os.path.exists(output_path):
+        with open(output_path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            end = position = f.tell()
+            while position > 0:
+                start = max(0, position - SCAN_BYTES)
+                f.seek(start)
+                chunk = f.read(position - start)
+                index = chunk.rfind(b'\n')
+                if index != -1:
+                    position = start + index + 1
+                    break
+                position = start
+            if position != end:
+                f.truncate(position)
+    return open(output_path, 'a')
+
+
+def completed_files(output_path):
+    """Returns the files with a successful result in an output file from an
+    earlier run."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path) as output:
+        for line in output:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short when the last run was interrupted.
+                continue
+            if 'error' not in result:
+                completed.add(result['file'])
+    return completed
+
+
+class BatchTranscriber(object):
+    """Sends recognize requests from a pool of threads.
+
+    The service object, and so the discovery document, is shared by every
+    thread. Each thread executes requests with its own authorized Http,
+    because httplib2 is not thread-safe.
+    """
+
+    def __init__(self, credentials=None, service=None, encoding='LINEAR16',
+                 sample_rate=16000, num_retries=5, trim_silence=False):
+        self.credentials = credentials or (
+            GoogleCredentials.get_application_default().create_scoped(
+                ['https://www.googleapis.com/auth/cloud-platform']))
+        self.service = service or discovery.build(
+            'speech', 'v1', http=self._new_http(),
+            discoveryServiceUrl=speech_rest.DISCOVERY_URL)
+        self.encoding = encoding
+        self.sample_rate = sample_rate
+        self.num_retries = num_retries
+        self.trim_silence = trim_silence
+        self._local = threading.local()
+
+    def _new_http(self):
+        return self.credentials.authorize(httplib2.Http())
+
+    def _http(self):
+        if not hasattr(self._local, 'http'):
+            self._local.http = self._new_http()
+        return self._local.http
+
+    def _encode(self, path):
+        """Returns the base64 audio of a file, and when trimming silence,
+        the (trimmed, original) start times in seconds of the kept
+        segments."""
+        if not self.trim_silence:
+            with open(path, 'rb') as f:
+                return base64.b64encode(f.read()).decode('ascii'), None
+
+        with open(path, 'rb') as f:
+            audio, timestamps = vad.trim_silence(
+                f.read(), rate=self.sample_rate)
+        return base64.b64encode(audio).decode('ascii'), timestamps.segments()
+
+    def transcribe(self, path):
+        """Returns the result record for one file. Errors are recorded
+        rather than raised, so one bad file does not stop the batch."""
+        try:
+            content, segments = self._encode(path)
+            request = self.service.speech().recognize(body={
+                'initialRequest': {
+                    'encoding': self.encoding,
+                    'sampleRate': self.sample_rate,
+                },
+                'audioRequest': {
+                    'content': content,
+                },
+            })
+            response = request.execute(
+                http=self._http(), num_retries=self.num_retries)
+        except (HttpError, httplib2.HttpLib2Error, IOError) as e:
+            return {'file': path, 'error': str(e)}
+
+        result = {'file': path, 'response': response}
+        if segments is not None:
+            result['segments'] = segments
+        return result
+
+    def run(self, paths, output_path, workers=8, progress=None):
+        """Transcribes every path not already completed in ``output_path``
+        and appends the results to it.
+
+        Returns:
+            The number of files transcribed and the number that failed.
+        """
+        completed = completed_files(output_path)
+        pending = [path for path in paths if path not in completed]
+        succeeded = failed = 0
+
+        pool = ThreadPool(max(1, min(workers, len(pending))))
+        try:
+            with open_for_append(output_path) as output:
+                for result in pool.imap_unordered(self.transcribe, pending):
+                    output.write(json.dumps(result) + '\n')
+                    # Flush each result so that it survives an interruption.
+                    output.flush()
+                    if 'error' in result:
+                        failed += 1
+                    else:
+                        succeeded += 1
+                    if progress:
+                        progress(succeeded + failed, len(pending))
+        finally:
+            pool.close()
+            pool.join()
+
+        return succeeded, failed
+
+
+def print_progress(done, total):
+    print('{}/{} files transcribed'.format(done, total))
+
+
+def main(source, output_path, workers, extensions, trim_silence=False):
+    paths = find_audio_files(source, tuple(extensions))
+    transcriber = BatchTranscriber(trim_silence=trim_silence)
+    succeeded, failed = transcriber.run(
+        paths, output_path, workers=workers, progress=print_progress)
+    print('Transcribed {} files, {} failed.'.format(succeeded, failed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        'source',
+        help='A directory of audio files, or a file listing one per line.')
+    parser.add_argument(
+        '--output', default='transcripts.json',
+        help='The newline-delimited JSON file to append results to.')
+    parser.add_argument(
+        '--workers', type=int, default=8,
+        help='How many files to transcribe at the same time.')
+    parser.add_argument(
+        '--extensions', nargs='*', default=['.raw'],
+        help='The file extensions to transcribe in a directory.')
+    parser.add_argument(
+        '--trim_silence', action='store_true',
+        help='Remove silence from the audio before sending it.')
+    args = parser.parse_args()
+    main(args.source, args.output, args.workers, args.extensions,
+         args.trim_silence)
@@ -0,0 +1,76 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import re
+
+import mock
+import speech_batch
+
+
+def test_run_resumes_from_checkpoint(resource, tmpdir):
+    paths = [resource('audio.raw'), resource('audio2.raw'),
+             resource('quit.raw')]
+    output_path = str(tmpdir.join('transcripts.json'))
+    with open(output_path, 'w') as output:
+        output.write(json.dumps({'file': paths[0], 'response': {}}) + '\n')
+        output.write(json.dumps({'file': paths[1], 'error': 'quota'}) + '\n')
+        output.write('{"file": "interrupt')
+
+    service = mock.MagicMock()
+    service.speech.return_value.recognize.return_value.execute.return_value = {
+        'results': []}
+    transcriber = speech_batch.BatchTranscriber(
+        credentials=mock.Mock(), service=service)
+
+    assert transcriber.run(paths, output_path, workers=2) == (2, 0)
+
+    recognize = service.speech.return_value.recognize
+    assert recognize.call_count == 2
+    # The line cut short is replaced, and every line is whole again.
+    with open(output_path) as output:
+        results = [json.loads(line) for line in output]
+    assert len(results) == 4
+    assert speech_batch.completed_files(output_path) == set(paths)
+
+
+def test_open_for_append_cuts_partial_line(tmpdir):
+    output_path = str(tmpdir.join('transcripts.json'))
+    whole = json.dumps({'file': 'a'}) + '\n'
+    with open(output_path, 'w') as output:
+        output.write(whole * 2000 + '{"file": "interrupt')
+
+    with speech_batch.open_for_append(output_path) as output:
+        output.write(whole)
+
+    with open(output_path) as output:
+        assert output.read() == whole * 2001
+
+    # A file that ends in a newline is left as it is.
+    speech_batch.open_for_append(output_path).close()
+    with open(output_path) as output:
+        assert output.read() == whole * 2001
+
+
+def test_main(resource, tmpdir, capsys):
+    output_path = str(tmpdir.join('transcripts.json'))
+    manifest = tmpdir.join('manifest.txt')
+    manifest.write(resource('audio.raw') + '\n' + resource('audio2.raw'))
+
+    speech_batch.main(str(manifest), output_path, 2, ['.raw'])
+    out, _ = capsys.readouterr()
+    assert 'Transcribed 2 files, 0 failed.' in out
+
+    with open(output_path) as output:
+        text = output.read()
+    assert re.search(r'how old is the Brooklyn Bridge', text, re.I)
@@ -17,40 +17,16 @@ using GRPC."""
 
 import argparse
 
-from gcloud.credentials import get_credentials
 from google.cloud.speech.v1 import cloud_speech_pb2 as cloud_speech
-from grpc.beta import implementations
+import grpc_auth
 
 # Keep the request alive for this many seconds
 DEADLINE_SECS = 10
-SPEECH_SCOPE = 'https://www.googleapis.com/auth/cloud-platform'
-
-
-def make_channel(host, port):
-    """Creates an SSL channel with auth credentials from the environment."""
-    # In order to make an https call, use an ssl channel with defaults
-    ssl_channel = implementations.ssl_channel_credentials(None, None, None)
-
-    # Grab application default credentials from the environment
-    creds = get_credentials().create_scoped([SPEECH_SCOPE])
-    # Add a plugin to inject the creds into the header
-    auth_header = (
-            'Authorization',
-            'Bearer ' + creds.get_access_token().access_token)
-    auth_plugin = implementations.metadata_call_credentials(
-            lambda _, cb: cb([auth_header], None),
-            name='google_creds')
-
-    # compose the two together for both ssl and google auth
-    composite_channel = implementations.composite_channel_credentials(
-            ssl_channel, auth_plugin)
-
-    return implementations.secure_channel(host, port, composite_channel)
 
 
 def main(input_uri, output_uri, encoding, sample_rate):
     service = cloud_speech.beta_create_Speech_stub(
-            make_channel('speech.googleapis.com', 443))
+            grpc_auth.get_channel('speech.googleapis.com', 443))
     # The method and parameters can be inferred from the proto from which the
     # grpc client lib was generated. See:
     # https://github.com/googleapis/googleapis/blob/master/google/cloud/speech/v1/cloud_speech.proto
@@ -24,6 +24,7 @@ from googleapiclient import discovery
 import httplib2
 from oauth2client.client import GoogleCredentials
 # [END import_libraries]
+import vad
 
 
 # [START authenticating]
@@ -44,17 +45,24 @@ def get_speech_service():
 # [END authenticating]
 
 
-def main(speech_file):
+def main(speech_file, trim_silence=False):
     """Transcribe the given audio file.
 
     Args:
         speech_file: the name of the audio file.
+        trim_silence: whether to remove silence from the audio before
+            sending it.
     """
     # [START construct_request]
     with open(speech_file, 'rb') as speech:
-        # Base64 encode the binary audio file for inclusion in the JSON
-        # request.
-        speech_content = base64.b64encode(speech.read())
+        audio = speech.read()
+
+    if trim_silence:
+        audio, _ = vad.trim_silence(audio)
+
+    # Base64 encode the binary audio file for inclusion in the JSON
+    # request.
+    speech_content = base64.b64encode(audio)
 
     service = get_speech_service()
     service_request = service.speech().recognize(
@@ -78,6 +86,9 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'speech_file', help='Full path of audio file to be recognized')
+    parser.add_argument(
+        '--trim_silence', action='store_true',
+        help='Remove silence from the audio before sending it')
     args = parser.parse_args()
-    main(args.speech_file)
+    main(args.speech_file, args.trim_silence)
     # [END run_application]
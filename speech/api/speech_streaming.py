@@ -14,15 +14,17 @@
 # limitations under the License.
 """Sample that streams audio to the Google Cloud Speech API via GRPC."""
 
+import argparse
 import contextlib
 import re
 import threading
 
-from gcloud.credentials import get_credentials
+import audio_pipeline
 from google.cloud.speech.v1 import cloud_speech_pb2 as cloud_speech
-from google.rpc import code_pb2
-from grpc.beta import implementations
+import grpc_auth
 import pyaudio
+import stream_session
+import vad
 
 # Audio recording parameters
 RATE = 16000
@@ -31,29 +33,11 @@ CHUNK = RATE // 10  # 100ms
 
 # Keep the request alive for this many seconds
 DEADLINE_SECS = 8 * 60 * 60
-SPEECH_SCOPE = 'https://www.googleapis.com/auth/cloud-platform'
 
-
-def make_channel(host, port):
-    """Creates an SSL channel with auth credentials from the environment."""
-    # In order to make an https call, use an ssl channel with defaults
-    ssl_channel = implementations.ssl_channel_credentials(None, None, None)
-
-    # Grab application default credentials from the environment
-    creds = get_credentials().create_scoped([SPEECH_SCOPE])
-    # Add a plugin to inject the creds into the header
-    auth_header = (
-            'Authorization',
-            'Bearer ' + creds.get_access_token().access_token)
-    auth_plugin = implementations.metadata_call_credentials(
-            lambda _, cb: cb([auth_header], None),
-            name='google_creds')
-
-    # compose the two together for both ssl and google auth
-    composite_channel = implementations.composite_channel_credentials(
-            ssl_channel, auth_plugin)
-
-    return implementations.secure_channel(host, port, composite_channel)
+# Start a new stream after this much audio, replaying the last OVERLAP_SECS
+# of audio into it so that words at the boundary are not lost.
+MAX_STREAM_SECS = stream_session.MAX_STREAM_SECS
+OVERLAP_SECS = 2
 
 
 @contextlib.contextmanager
@@ -72,74 +56,109 @@ def record_audio(channels, rate, chunk):
     audio_interface.terminate()
 
 
-def request_stream(stop_audio, channels=CHANNELS, rate=RATE, chunk=CHUNK):
-    """Yields `RecognizeRequest`s constructed from a recording audio stream.
+def audio_chunks(stop_audio, channels=CHANNELS, rate=RATE, chunk=CHUNK,
+                 buff=None, detector=None):
+    """Yields payloads of audio from a recording audio stream.
+
+    Audio is read on a separate thread into a ring buffer, so a slow send
+    never stalls the recording. Payloads carry as many buffered chunks as
+    needed to keep up with the observed send latency.
 
     Args:
         stop_audio: A threading.Event object stops the recording when set.
         channels: How many audio channels to record.
         rate: The sampling rate.
         chunk: Buffer audio into chunks of this size before sending to the api.
+        buff: The audio_pipeline.AudioRingBuffer to capture into. Pass one in
+            to inspect its overflow and underflow counts.
+        detector: A vad.VoiceActivityDetector to drop silence with, or None
+            to send all of the audio. Only mono audio is supported.
     """
     with record_audio(channels, rate, chunk) as audio_stream:
-        # The initial request must contain metadata about the stream, so the
-        # server knows how to interpret it.
-        metadata = cloud_speech.InitialRecognizeRequest(
-            encoding='LINEAR16', sample_rate=rate,
-            # Note that setting interim_results to True means that you'll
-            # likely get multiple results for the same bit of audio, as the
-            # system re-interprets audio in the context of subsequent audio.
-            # However, this will give us quick results without having to tell
-            # the server when to finalize a piece of audio.
-            interim_results=True, continuous=False,
-        )
-        data = audio_stream.read(chunk)
-        audio_request = cloud_speech.AudioRequest(content=data)
-
-        yield cloud_speech.RecognizeRequest(
-            initial_request=metadata,
-            audio_request=audio_request)
-
-        while not stop_audio.is_set():
-            data = audio_stream.read(chunk)
-            if not data:
-                raise StopIteration()
-            # Subsequent requests can all just have the content
-            audio_request = cloud_speech.AudioRequest(content=data)
-
-            yield cloud_speech.RecognizeRequest(audio_request=audio_request)
-
-
-def listen_print_loop(recognize_stream):
-    for resp in recognize_stream:
-        if resp.error.code != code_pb2.OK:
-            raise RuntimeError('Server error: ' + resp.error.message)
-
-        # Display the transcriptions & their alternatives
-        for result in resp.results:
-            print(result.alternatives)
-
-        # Exit recognition if any of the transcribed phrases could be
-        # one of our keywords.
-        if any(re.search(r'\b(exit|quit)\b', alt.transcript)
-               for result in resp.results
-               for alt in result.alternatives):
+        # 16-bit samples.
+        for data in audio_pipeline.stream_audio(
+                audio_stream, chunk, chunk_bytes=2 * channels * chunk,
+                chunk_secs=chunk / float(rate), stop_audio=stop_audio,
+                buff=buff):
+            if detector is not None:
+                data = detector.process(data)
+                if not data:
+                    continue
+            yield data
+
+
+def make_request(data, first, rate=RATE, continuous=False):
+    """Returns the `RecognizeRequest` that sends ``data``.
+
+    The first request of a stream must contain metadata about the stream,
+    so the server knows how to interpret it.
+    """
+    audio_request = cloud_speech.AudioRequest(content=data)
+    if not first:
+        # Subsequent requests can all just have the content
+        return cloud_speech.RecognizeRequest(audio_request=audio_request)
+
+    metadata = cloud_speech.InitialRecognizeRequest(
+        encoding='LINEAR16', sample_rate=rate,
+        # Only final results are used, so don't ask for interim ones. With
+        # continuous set, the server keeps listening after each utterance
+        # instead of closing the stream.
+        interim_results=False, continuous=continuous,
+    )
+    return cloud_speech.RecognizeRequest(
+        initial_request=metadata, audio_request=audio_request)
+
+
+def listen_print_loop(transcripts):
+    """Prints final transcripts from a StreamingSession until one contains
+    a keyword."""
+    for transcript in transcripts:
+        print('transcript: "{}"'.format(transcript))
+
+        if re.search(r'\b(exit|quit)\b', transcript, re.I):
             print('Exiting..')
             return
 
 
-def main():
+def main(trim_silence=False, max_stream_secs=MAX_STREAM_SECS):
     stop_audio = threading.Event()
+    detector = vad.VoiceActivityDetector(rate=RATE) if trim_silence else None
+    buff = audio_pipeline.AudioRingBuffer()
     with cloud_speech.beta_create_Speech_stub(
-            make_channel('speech.googleapis.com', 443)) as service:
+            grpc_auth.get_channel('speech.googleapis.com', 443)) as service:
+        # Each stream is replaced before it reaches its deadline, so the
+        # session can run for as long as there is audio.
+        session = stream_session.StreamingSession(
+            lambda requests: service.Recognize(requests, DEADLINE_SECS),
+            lambda data, first: make_request(
+                data, first, RATE, continuous=True),
+            bytes_per_sec=2 * CHANNELS * RATE,
+            max_stream_secs=min(max_stream_secs, DEADLINE_SECS - 1),
+            overlap_secs=OVERLAP_SECS)
         try:
-            listen_print_loop(
-                service.Recognize(request_stream(stop_audio), DEADLINE_SECS))
+            listen_print_loop(session.transcripts(
+                audio_chunks(stop_audio, buff=buff, detector=detector)))
         finally:
-            # Stop the request stream once we're done with the loop - otherwise
-            # it'll keep going in the thread that the grpc lib makes for it..
+            # Stop the audio once we're done with the loop - otherwise it'll
+            # keep going in the thread that feeds the session.
             stop_audio.set()
 
+    print('Streams opened: {}, failed: {}'.format(
+        session.rollovers + 1, session.errors))
+    print('Audio buffer overflows: {}, underflows: {}'.format(
+        buff.overflows, buff.underflows))
+    if detector is not None:
+        print('Sent {} of {} frames of audio.'.format(
+            detector.frames_out, detector.frames_in))
+
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--trim_silence', action='store_true',
+        help='Drop silence from the audio before sending it.')
+    parser.add_argument(
+        '--max_stream_secs', type=int, default=MAX_STREAM_SECS,
+        help='How long to stream before rolling over to a new stream.')
+    args = parser.parse_args()
+    main(args.trim_silence, args.max_stream_secs)
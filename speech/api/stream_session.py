@@ -0,0 +1,254 @@
+# Copyright (C) 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Transcribes audio of any length over a series of streaming requests.
+
+A single Recognize stream ends at its deadline, or when the server reports
+an error, and the audio sent while a new one starts is lost.
+StreamingSession opens the next stream before the current one reaches its
+limit, replays the last few seconds of audio into it so that no word is cut
+in half, and only then closes the old stream. Final results are yielded in
+order, with words repeated across the boundary removed.
+"""
+
+import collections
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# The API stops recognizing after about a minute of audio on one stream, so
+# a new stream is started well before that by default.
+MAX_STREAM_SECS = 50
+
+# Give up once this many streams in a row have failed, waiting
+# RETRY_DELAY_SECS before the first retry and twice as long before each next
+# one. An error that persists, such as bad credentials or an exhausted quota,
+# would otherwise open a new stream for every chunk of audio.
+MAX_FAILURES = 3
+RETRY_DELAY_SECS = 1
+
+_DONE = object()
+
+
+def strip_overlap(previous, text, min_words=2):
+    """Removes from the start of ``text`` the words that end ``previous``.
+
+    At least ``min_words`` words, or all of ``text``, must match, so that a
+    single word that happens to repeat is kept.
+    """
+    previous_words = previous.lower().split()
+    words = text.split()
+    lower_words = [word.lower() for word in words]
+
+    for count in range(min(len(previous_words), len(words)), 0, -1):
+        if count < min(min_words, len(words)):
+            break
+        if previous_words[-count:] == lower_words[:count]:
+            return ' '.join(words[count:])
+    return text
+
+
+class _Stream(object):
+    """One Recognize call: a queue of requests in and final transcripts
+    out."""
+
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.audio_bytes = 0
+        self.opened = None
+        # Set once the server has closed the stream, normally or not.
+        self.ended = False
+        # The exception that ended the stream, if any.
+        self.error = None
+
+    def request_iterator(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            yield request
+
+
+class StreamingSession(object):
+    """Spreads a stream of audio over consecutive Recognize calls.
+
+    Args:
+        recognize: Called with an iterator of requests, returns an iterator
+            of responses. For example,
+            ``lambda requests: service.Recognize(requests, DEADLINE_SECS)``.
+        make_request: Called with audio bytes and whether it is the first
+            request of a stream, returns the request to send.
+        bytes_per_sec: The audio data rate, e.g. 32000 for 16kHz LINEAR16.
+        max_stream_secs: How much audio to send on one stream, and how long
+            to keep it open, before rolling over to the next.
+        overlap_secs: How much of the latest audio to replay into a new
+            stream.
+        max_failures: How many streams in a row may fail before the error is
+            raised from transcripts().
+        retry_delay: Seconds to wait before opening a stream to replace one
+            that failed, doubled for each further failure in a row.
+        clock: Returns the current time in seconds; for tests.
+        sleep: Sleeps for a number of seconds; for tests.
+    """
+
+    def __init__(self, recognize, make_request, bytes_per_sec,
+                 max_stream_secs=MAX_STREAM_SECS, overlap_secs=2,
+                 max_failures=MAX_FAILURES, retry_delay=RETRY_DELAY_SECS,
+                 clock=time.time, sleep=time.sleep):
+        self.recognize = recognize
+        self.make_request = make_request
+        self.max_stream_secs = max_stream_secs
+        self.max_stream_bytes = int(max_stream_secs * bytes_per_sec)
+        self.overlap_bytes = int(overlap_secs * bytes_per_sec)
+        self.max_failures = max_failures
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.sleep = sleep
+
+        self._history = collections.deque()
+        self._history_bytes = 0
+        self._current = None
+        # Streams in the order they were opened, followed by None.
+        self._streams = queue.Queue()
+
+        self.rollovers = 0
+        self.errors = 0
+        # Streams that have failed in a row, and the error that stopped the
+        # session.
+        self._failures = 0
+        self._error = None
+
+    def _consume(self, stream):
+        try:
+            for response in self.recognize(stream.request_iterator()):
+                if response.error.code:
+                    raise RuntimeError(
+                        'Server error: ' + response.error.message)
+                for result in response.results:
+                    if result.is_final and result.alternatives:
+                        stream.results.put(result.alternatives[0].transcript)
+        except Exception as e:
+            # Whatever the stream has not transcribed is replayed, as far as
+            # the overlap allows, into the next one.
+            stream.error = e
+            self.errors += 1
+        finally:
+            stream.ended = True
+            stream.results.put(_DONE)
+
+    def _open_stream(self):
+        stream = _Stream()
+        stream.opened = self.clock()
+        thread = threading.Thread(target=self._consume, args=(stream,))
+        thread.daemon = True
+        thread.start()
+
+        replay = b''.join(self._history)
+        stream.requests.put(self.make_request(replay, True))
+        stream.audio_bytes = len(replay)
+        self._streams.put(stream)
+
+        # The old stream is closed only once the new one is running, so no
+        # audio goes unsent.
+        if self._current is not None:
+            self._current.requests.put(None)
+            self.rollovers += 1
+        self._current = stream
+
+    def _remember(self, data):
+        self._history.append(data)
+        self._history_bytes += len(data)
+        while (self._history and
+               self._history_bytes - len(self._history[0]) >=
+               self.overlap_bytes):
+            self._history_bytes -= len(self._history.popleft())
+
+    def _needs_rollover(self, data):
+        stream = self._current
+        return (stream is None or stream.ended or
+                stream.audio_bytes + len(data) > self.max_stream_bytes or
+                self.clock() - stream.opened >= self.max_stream_secs)
+
+    def _check_failures(self):
+        """Waits before replacing a stream that failed, or raises its error
+        if too many streams in a row have failed."""
+        stream = self._current
+        if stream is None or stream.error is None:
+            self._failures = 0
+            return
+
+        self._failures += 1
+        if self._failures > self.max_failures:
+            raise stream.error
+        self.sleep(self.retry_delay * 2 ** (self._failures - 1))
+
+    def send(self, data):
+        """Sends audio on the current stream, first rolling over to a new
+        stream if the current one is full, too old or closed.
+
+        Raises:
+            The error of the last stream, if too many in a row have failed.
+        """
+        if self._needs_rollover(data):
+            self._check_failures()
+            self._open_stream()
+
+        self._current.requests.put(self.make_request(data, False))
+        self._current.audio_bytes += len(data)
+        self._remember(data)
+
+    def close(self):
+        """Ends the current stream; transcripts() ends after its last
+        result."""
+        if self._current is not None:
+            self._current.requests.put(None)
+        self._streams.put(None)
+
+    def _feed(self, audio_chunks):
+        try:
+            for data in audio_chunks:
+                self.send(data)
+        except Exception as e:
+            self._error = e
+        finally:
+            self.close()
+
+    def transcripts(self, audio_chunks):
+        """Sends ``audio_chunks`` from a background thread and yields the
+        final transcripts of every stream, in order.
+
+        Raises:
+            The error of the last stream, if too many in a row have failed.
+        """
+        feeder = threading.Thread(target=self._feed, args=(audio_chunks,))
+        feeder.daemon = True
+        feeder.start()
+
+        previous = ''
+        for stream in iter(self._streams.get, None):
+            first = True
+            for text in iter(stream.results.get, _DONE):
+                if first and previous:
+                    text = strip_overlap(previous, text)
+                first = False
+                if text.strip():
+                    previous = text
+                    yield text
+
+        if self._error is not None:
+            raise self._error
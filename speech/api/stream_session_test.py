@@ -0,0 +1,139 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import time
+
+import pytest
+import stream_session
+
+Alternative = collections.namedtuple('Alternative', 'transcript')
+Result = collections.namedtuple('Result', 'alternatives is_final')
+Response = collections.namedtuple('Response', 'error results')
+Status = collections.namedtuple('Status', 'code message')
+
+OK = Status(0, '')
+
+# One word per second of "audio".
+WORDS = ['w{:02d}'.format(i) for i in range(1, 21)]
+BYTES_PER_SEC = 4
+
+
+class FakeRecognizer(object):
+    """Transcribes audio that is made of words, once each stream ends.
+
+    The streams listed in ``fail`` raise an error after their first request.
+    """
+
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.streams = []
+
+    def __call__(self, requests):
+        index = len(self.streams)
+        audio = []
+        self.streams.append(audio)
+        for data, first in requests:
+            audio.append(data)
+            if index in self.fail:
+                raise RuntimeError('Stream broke')
+
+        transcript = b''.join(audio).decode('ascii')
+        yield Response(OK, [Result([Alternative(transcript)], False)])
+        yield Response(OK, [Result([Alternative(transcript)], True)])
+
+
+def make_request(data, first):
+    return data, first
+
+
+def audio():
+    return [word.encode('ascii') + b' ' for word in WORDS]
+
+
+def test_strip_overlap():
+    assert stream_session.strip_overlap(
+        'one two three', 'Two three four') == 'four'
+    assert stream_session.strip_overlap('one two', 'three four') == (
+        'three four')
+    # A single repeated word is kept...
+    assert stream_session.strip_overlap('one two', 'two three') == (
+        'two three')
+    # ...unless it is all there is.
+    assert stream_session.strip_overlap('one two', 'two') == ''
+
+
+def test_rollover_stitches_transcripts():
+    recognizer = FakeRecognizer()
+    session = stream_session.StreamingSession(
+        recognizer, make_request, BYTES_PER_SEC, max_stream_secs=5,
+        overlap_secs=2, clock=lambda: 0)
+
+    transcripts = list(session.transcripts(audio()))
+
+    assert ' '.join(transcripts).split() == WORDS
+    assert session.rollovers == len(recognizer.streams) - 1 > 0
+    assert session.errors == 0
+    # Every new stream starts with the overlap from the previous one.
+    assert recognizer.streams[1][0] == b'w04 w05 '
+
+
+def test_rollover_after_error():
+    recognizer = FakeRecognizer(fail=(1,))
+    session = stream_session.StreamingSession(
+        recognizer, make_request, BYTES_PER_SEC, max_stream_secs=5,
+        overlap_secs=2, clock=lambda: 0, sleep=lambda secs: None)
+
+    transcripts = ' '.join(session.transcripts(audio())).split()
+
+    assert session.errors == 1
+    # The broken stream's audio is lost, but the session carries on.
+    assert transcripts[:5] == WORDS[:5]
+    assert transcripts[-1] == WORDS[-1]
+
+
+def test_rollover_on_wall_clock():
+    now = [0]
+    recognizer = FakeRecognizer()
+    session = stream_session.StreamingSession(
+        recognizer, make_request, BYTES_PER_SEC, max_stream_secs=100,
+        overlap_secs=0, clock=lambda: now[0])
+
+    session.send(b'w01 ')
+    now[0] = 100
+    session.send(b'w02 ')
+    session.close()
+
+    assert session.rollovers == 1
+
+
+def test_gives_up_after_repeated_errors():
+    recognizer = FakeRecognizer(fail=range(len(WORDS)))
+    delays = []
+    session = stream_session.StreamingSession(
+        recognizer, make_request, BYTES_PER_SEC, max_stream_secs=100,
+        overlap_secs=0, max_failures=3, clock=lambda: 0,
+        sleep=delays.append)
+
+    def audio_until_failure():
+        for chunk in audio():
+            yield chunk
+            # Let the stream fail before the next chunk is sent.
+            while not session._current.ended:
+                time.sleep(0.01)
+
+    with pytest.raises(RuntimeError):
+        list(session.transcripts(audio_until_failure()))
+
+    assert len(recognizer.streams) == 4
+    assert delays == [1, 2, 4]
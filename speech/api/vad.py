@@ -0,0 +1,190 @@
+# Copyright (C) 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Removes silence from LINEAR16 audio before it is sent to the Speech API.
+
+Audio is split into short frames. A frame is voiced if its energy is well
+above the noise floor, or if it has moderate energy and a high zero-crossing
+rate, as unvoiced consonants do. Frames within a hangover period after
+voiced frames are kept too, so word endings are not clipped. Of each
+stretch of silence, only a short pause is kept.
+
+A TimestampMap records where the kept audio came from, so that times in the
+trimmed audio can be mapped back to the original recording.
+"""
+
+import bisect
+
+import numpy
+
+
+class TimestampMap(object):
+    """Maps times in trimmed audio back to times in the original audio."""
+
+    def __init__(self, frame_secs):
+        self.frame_secs = frame_secs
+        # Parallel lists: where each contiguous kept segment starts, in
+        # trimmed and in original frames.
+        self.trimmed_starts = []
+        self.original_starts = []
+        self._kept = 0
+        self._last = None
+
+    def add_frames(self, original_frames):
+        """Records that the original frames at the given ascending indices
+        were kept, in order."""
+        if not len(original_frames):
+            return
+
+        breaks = numpy.empty(len(original_frames), dtype=bool)
+        breaks[0] = (self._last is None or
+                     original_frames[0] != self._last + 1)
+        breaks[1:] = numpy.diff(original_frames) != 1
+
+        self.original_starts.extend(original_frames[breaks].tolist())
+        self.trimmed_starts.extend(
+            (self._kept + numpy.flatnonzero(breaks)).tolist())
+        self._kept += len(original_frames)
+        self._last = int(original_frames[-1])
+
+    def to_original(self, seconds):
+        """Returns the time in the original audio of a time in the trimmed
+        audio."""
+        if not self.trimmed_starts:
+            return seconds
+        frame = seconds / self.frame_secs
+        index = max(bisect.bisect_right(self.trimmed_starts, frame) - 1, 0)
+        return (self.original_starts[index] + frame -
+                self.trimmed_starts[index]) * self.frame_secs
+
+    def segments(self):
+        """Returns (trimmed seconds, original seconds) pairs, one per kept
+        segment."""
+        return [(trimmed * self.frame_secs, original * self.frame_secs)
+                for trimmed, original in zip(
+                    self.trimmed_starts, self.original_starts)]
+
+
+class VoiceActivityDetector(object):
+    """Drops silent frames from a stream of 16-bit mono PCM audio.
+
+    Args:
+        rate: The sampling rate.
+        frame_ms: The frame length in milliseconds.
+        energy_threshold: The RMS a frame needs to be voiced. If None, it is
+            four times a running estimate of the noise floor.
+        zcr_threshold: The fraction of zero crossings above which a frame
+            with at least half the energy threshold counts as voiced.
+        hangover_ms: How long after a voiced frame frames are still kept.
+        keep_silence_ms: How much of each silence longer than the hangover
+            is kept, so that the recognizer still sees a pause.
+        min_energy: The lowest adaptive energy threshold.
+    """
+
+    def __init__(self, rate=16000, frame_ms=30, energy_threshold=None,
+                 zcr_threshold=0.3, hangover_ms=300, keep_silence_ms=200,
+                 min_energy=100.0):
+        self.frame_samples = rate * frame_ms // 1000
+        self.energy_threshold = energy_threshold
+        self.zcr_threshold = zcr_threshold
+        self.hangover_frames = hangover_ms // frame_ms
+        self.keep_silence_frames = keep_silence_ms // frame_ms
+        self.min_energy = min_energy
+        self.noise_floor = None
+        self.timestamps = TimestampMap(frame_ms / 1000.0)
+
+        self.frames_in = 0
+        self.frames_out = 0
+        self._remainder = b''
+        # Frames since the last voiced frame, and since the last frame kept
+        # as speech, at the end of the audio processed so far. The stream
+        # starts in silence.
+        self._since_voiced = self.hangover_frames + 1
+        self._since_active = self.keep_silence_frames + 1
+
+    def _threshold(self, rms):
+        if self.energy_threshold is not None:
+            return self.energy_threshold
+
+        floor = numpy.percentile(rms, 10)
+        if self.noise_floor is None:
+            self.noise_floor = floor
+        else:
+            # Follow a falling floor at once, but a rising one slowly, so a
+            # long stretch of speech does not raise it.
+            self.noise_floor = min(floor, 0.9 * self.noise_floor + 0.1 * floor)
+        return max(self.min_energy, 4 * self.noise_floor)
+
+    def classify(self, frames):
+        """Returns whether each row of a 2-D int16 array of frames is
+        voiced."""
+        rms = numpy.sqrt(numpy.mean(
+            numpy.square(frames.astype(numpy.float64)), axis=1))
+        signs = numpy.signbit(frames)
+        zcr = numpy.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        threshold = self._threshold(rms)
+        return (rms > threshold) | (
+            (rms > threshold / 2) & (zcr > self.zcr_threshold))
+
+    def process(self, pcm):
+        """Returns the audio of ``pcm`` that should be sent. A partial frame
+        at the end is held until the next call."""
+        data = self._remainder + pcm
+        frame_bytes = 2 * self.frame_samples
+        count = len(data) // frame_bytes
+        self._remainder = data[count * frame_bytes:]
+        if not count:
+            return b''
+
+        frames = numpy.frombuffer(
+            data[:count * frame_bytes], dtype='<i2').reshape(
+                count, self.frame_samples)
+        voiced = self.classify(frames)
+        index = numpy.arange(count)
+
+        # Hangover: frames within hangover_frames of a voiced frame, which
+        # may have been in an earlier call, are speech.
+        last_voiced = numpy.maximum.accumulate(
+            numpy.where(voiced, index, -1 - self._since_voiced))
+        active = index - last_voiced <= self.hangover_frames
+
+        # Keep the first keep_silence_frames of every silence.
+        last_active = numpy.maximum.accumulate(
+            numpy.where(active, index, -1 - self._since_active))
+        keep = active | (index - last_active <= self.keep_silence_frames)
+
+        self._since_voiced = count - 1 - int(last_voiced[-1])
+        self._since_active = count - 1 - int(last_active[-1])
+
+        self.timestamps.add_frames(index[keep] + self.frames_in)
+        self.frames_in += count
+        self.frames_out += int(numpy.count_nonzero(keep))
+
+        return frames[keep].tobytes()
+
+    def flush(self):
+        """Returns the held partial frame if the audio ended in speech."""
+        remainder, self._remainder = self._remainder, b''
+        return remainder if self._since_active == 0 else b''
+
+
+def trim_silence(pcm, **kwargs):
+    """Removes silence from a whole recording.
+
+    Returns:
+        The trimmed audio, and the TimestampMap back to ``pcm``.
+    """
+    detector = VoiceActivityDetector(**kwargs)
+    trimmed = detector.process(pcm) + detector.flush()
+    return trimmed, detector.timestamps
@@ -0,0 +1,74 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy
+import vad
+
+RATE = 16000
+
+
+def tone(seconds, amplitude=8000):
+    t = numpy.arange(int(RATE * seconds)) / float(RATE)
+    return (amplitude * numpy.sin(2 * numpy.pi * 440 * t)).astype('<i2')
+
+
+def silence(seconds):
+    return numpy.zeros(int(RATE * seconds), dtype='<i2')
+
+
+def test_trims_long_silence():
+    audio = numpy.concatenate(
+        [silence(0.99), tone(0.6), silence(2.01), tone(0.6)]).tobytes()
+
+    trimmed, timestamps = vad.trim_silence(
+        audio, hangover_ms=90, keep_silence_ms=210)
+
+    # Leading silence is dropped, and the pause is cut to hangover plus
+    # kept silence.
+    assert len(trimmed) < len(audio) / 2
+    segments = timestamps.segments()
+    assert len(segments) == 2
+    assert abs(segments[0][1] - 0.99) < 0.001
+    assert abs(segments[1][1] - 3.6) < 0.001
+
+    # The second tone starts 0.9s into the trimmed audio: 0.6s of tone,
+    # 0.09s of hangover and 0.21s of kept silence.
+    assert abs(timestamps.to_original(0.9) - 3.6) < 0.001
+    assert abs(timestamps.to_original(1.0) - 3.7) < 0.001
+
+
+def test_streaming_matches_whole_recording(resource):
+    with open(resource('quit.raw'), 'rb') as f:
+        audio = f.read()
+
+    whole, _ = vad.trim_silence(audio, energy_threshold=2000)
+
+    detector = vad.VoiceActivityDetector(energy_threshold=2000)
+    streamed = b''.join(
+        detector.process(audio[i:i + 3001])
+        for i in range(0, len(audio), 3001)) + detector.flush()
+
+    assert streamed == whole
+    assert detector.frames_out < detector.frames_in
+
+
+def test_keeps_quiet_consonants():
+    detector = vad.VoiceActivityDetector(energy_threshold=1000)
+    # Noise with an RMS below the threshold, but above half of it, and many
+    # zero crossings.
+    noise = numpy.random.RandomState(0).randint(-1200, 1200, size=RATE)
+    frames = noise.astype('<i2')[:10 * detector.frame_samples].reshape(
+        10, detector.frame_samples)
+
+    assert detector.classify(frames).all()
+    assert not detector.classify(frames // 2).any()
@@ -0,0 +1,75 @@
+# Copyright 2016 Google, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A local cache of Vision API annotations, keyed by image content.
+
+Annotations are stored in a SQLite file, keyed by the SHA-256 of the image
+bytes together with the feature type and maximum number of results, so an
+image that was annotated before is not sent again, whatever its file name.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+
+
+def cache_key(image_content, feature_type, max_results):
+    """Returns the cache key for annotating an image with one feature."""
+    return '{}:{}:{}'.format(
+        hashlib.sha256(image_content).hexdigest(), feature_type, max_results)
+
+
+class AnnotationCache(object):
+    """Stores annotations as compressed JSON in a SQLite database.
+
+    One connection is shared by every thread, guarded by a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS annotations ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL)')
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached annotations for ``key``, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM annotations WHERE key = ?',
+                (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(zlib.decompress(bytes(row[0])).decode('utf-8'))
+
+    def put(self, key, annotations):
+        value = sqlite3.Binary(
+            zlib.compress(json.dumps(annotations).encode('utf-8')))
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO annotations (key, value) '
+                'VALUES (?, ?)', (key, value))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
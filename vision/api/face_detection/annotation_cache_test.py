@@ -0,0 +1,71 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import annotation_cache
+import batch_faces
+import faces
+import mock
+
+
+def test_cache_key():
+    key = annotation_cache.cache_key(b'image', 'FACE_DETECTION', 4)
+
+    assert key == annotation_cache.cache_key(b'image', 'FACE_DETECTION', 4)
+    assert key != annotation_cache.cache_key(b'image', 'FACE_DETECTION', 5)
+    assert key != annotation_cache.cache_key(b'other', 'FACE_DETECTION', 4)
+
+
+def test_cache_persists(tmpdir):
+    path = str(tmpdir.join('cache.db'))
+    cache = annotation_cache.AnnotationCache(path)
+    assert cache.get('key') is None
+    cache.put('key', [{'joyLikelihood': 'LIKELY'}])
+    cache.close()
+
+    cache = annotation_cache.AnnotationCache(path)
+    assert cache.get('key') == [{'joyLikelihood': 'LIKELY'}]
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def make_service():
+    service = mock.MagicMock()
+    service.images.return_value.annotate.return_value.execute.return_value = {
+        'responses': [{'faceAnnotations': [{'joyLikelihood': 'LIKELY'}]}]}
+    return service
+
+
+def test_detect_face_uses_cache(resource, tmpdir):
+    cache = annotation_cache.AnnotationCache(str(tmpdir.join('cache.db')))
+    service = make_service()
+
+    for _ in range(3):
+        with open(resource('face-input.jpg'), 'rb') as image:
+            found = faces.detect_face(image, service=service, cache=cache)
+        assert found == [{'joyLikelihood': 'LIKELY'}]
+
+    assert service.images.return_value.annotate.call_count == 1
+
+
+def test_batch_detector_uses_cache(resource, tmpdir):
+    cache = annotation_cache.AnnotationCache(str(tmpdir.join('cache.db')))
+    service = make_service()
+    detector = batch_faces.BatchFaceDetector(
+        credentials=mock.Mock(), service=service, cache=cache)
+    image = resource('face-input.jpg')
+
+    detector.detect([image])
+    results = detector.detect([image])
+
+    assert results == [{'file': image,
+                        'faces': [{'joyLikelihood': 'LIKELY'}]}]
+    assert service.images.return_value.annotate.call_count == 1
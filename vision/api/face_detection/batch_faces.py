@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Detects faces in a directory or manifest of images.
+
+Each annotate request carries as many images as the API allows, and several
+requests are sent at a time. The faces found in each image are appended to a
+newline-delimited JSON file as they complete. If the program is interrupted,
+running it again with the same output file skips the images that were
+already annotated.
+
+Example:
+
+    $ python batch_faces.py photos/ --output=faces.json
+"""
+
+import argparse
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import threading
+
+import annotation_cache
+import faces
+from googleapiclient import discovery
+from googleapiclient.errors import HttpError
+import httplib2
+from oauth2client.client import GoogleCredentials
+
+# The most images the API accepts in one annotate request.
+MAX_IMAGES_PER_REQUEST = 16
+
+# Keep the base64-encoded images in a request below the API's request size
+# limit of 8MB.
+MAX_REQUEST_BYTES = 8 * 1000 * 1000
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+
+
+def find_images(source, extensions=IMAGE_EXTENSIONS):
+    """Returns the paths of the images to annotate: the files with an image
+    extension under ``source``, sorted, if it is a directory, or else the
+    paths listed in it one per line."""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(
+                os.path.join(root, name) for name in files
+                if name.lower().endswith(extensions))
+        return sorted(paths)
+
+    with open(source) as manifest:
+        return [line.strip() for line in manifest if line.strip()]
+
+
+def resume_results(output_path):
+    """Returns the images that a results file from an earlier run has faces
+    for, and readies the file to be appended to.
+
+    A run that was interrupted can leave the result of its last image half
+    written. That line is cut off, so that the next result starts on a line
+    of its own instead of being lost along with it.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, 'rb+') as results:
+        # The end of the last whole line.
+        end = 0
+        for line in iter(results.readline, b''):
+            if not line.endswith(b'\n'):
+                break
+            end += len(line)
+            result = json.loads(line.decode('utf-8'))
+            if 'faces' in result:
+                completed.add(result['file'])
+        results.truncate(end)
+    return completed
+
+
+def encoded_size(path):
+    """Returns the size of a file once base64 encoded, or 0 if it cannot be
+    read; the error is recorded when the batch is sent."""
+    try:
+        return (os.path.getsize(path) + 2) // 3 * 4
+    except OSError:
+        return 0
+
+
+def downscaled_size(path, max_dimension):
+    """Returns a generous estimate of the encoded size of an image after
+    faces.downscale."""
+    return min(encoded_size(path), max_dimension * max_dimension)
+
+
+def batches(paths, max_images=MAX_IMAGES_PER_REQUEST,
+            max_bytes=MAX_REQUEST_BYTES, size=encoded_size):
+    """Groups paths into lists that fit in one annotate request each.
+
+    An image too large to share a request is sent on its own.
+    """
+    batch = []
+    batch_bytes = 0
+    for path in paths:
+        path_bytes = size(path)
+        if batch and (len(batch) >= max_images or
+                      batch_bytes + path_bytes > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(path)
+        batch_bytes += path_bytes
+    if batch:
+        yield batch
+
+
+class BatchFaceDetector(object):
+    """Sends batched face detection requests from a pool of threads.
+
+    The service object, and so the discovery document, is shared by every
+    thread. Each thread executes requests with its own authorized Http,
+    because httplib2 is not thread-safe.
+
+    If a cache is given, images found in it are not sent.
+    """
+
+    def __init__(self, credentials=None, service=None, max_results=4,
+                 num_retries=5, max_dimension=None, cache=None):
+        self.credentials = (
+            credentials or GoogleCredentials.get_application_default())
+        self.service = service or discovery.build(
+            'vision', 'v1', http=self._new_http(),
+            discoveryServiceUrl=faces.DISCOVERY_URL)
+        self.max_results = max_results
+        self.num_retries = num_retries
+        self.max_dimension = max_dimension
+        self.cache = cache
+        self._local = threading.local()
+
+    def _new_http(self):
+        return self.credentials.authorize(httplib2.Http())
+
+    def _http(self):
+        if not hasattr(self._local, 'http'):
+            self._local.http = self._new_http()
+        return self._local.http
+
+    def _size(self, path):
+        if self.max_dimension:
+            return downscaled_size(path, self.max_dimension)
+        return encoded_size(path)
+
+    def _cache_lookup(self, content):
+        """Returns the cache key for an image and its cached faces, or None
+        for either if there is no cache or the image is not in it."""
+        if self.cache is None:
+            return None, None
+        key = annotation_cache.cache_key(
+            content, 'FACE_DETECTION', self.max_results)
+        return key, self.cache.get(key)
+
+    def _cache_store(self, key, found):
+        if key is not None:
+            self.cache.put(key, found)
+
+    def _downscale(self, content):
+        """Returns the image to send and the scale of its coordinates."""
+        if not self.max_dimension:
+            return content, (1.0, 1.0)
+        return faces.downscale(content, self.max_dimension)
+
+    def detect(self, paths):
+        """Returns the result records for a batch of images. Errors are
+        recorded rather than raised, so one bad image does not stop the
+        rest."""
+        results = []
+        # The (path, cache key, scale) of each image sent.
+        sent = []
+        requests = []
+        for path in paths:
+            try:
+                with open(path, 'rb') as image:
+                    content = image.read()
+
+                key, cached = self._cache_lookup(content)
+                if cached is not None:
+                    results.append({'file': path, 'faces': cached})
+                    continue
+                content, scale = self._downscale(content)
+            except IOError as e:
+                # PIL raises an IOError for a file that is not an image.
+                results.append({'file': path, 'error': str(e)})
+                continue
+            requests.append(faces.face_request(content, self.max_results))
+            sent.append((path, key, scale))
+        if not requests:
+            return results
+
+        try:
+            response = self.service.images().annotate(
+                body={'requests': requests}).execute(
+                    http=self._http(), num_retries=self.num_retries)
+        except (HttpError, httplib2.HttpLib2Error) as e:
+            return results + [
+                {'file': path, 'error': str(e)} for path, _, _ in sent]
+
+        for (path, key, scale), image_response in zip(
+                sent, response['responses']):
+            if 'error' in image_response:
+                results.append({
+                    'file': path,
+                    'error': image_response['error'].get('message', '')})
+                continue
+
+            found = faces.rescale_faces(
+                image_response.get('faceAnnotations', []), scale)
+            self._cache_store(key, found)
+            results.append({'file': path, 'faces': found})
+        return results
+
+    def run(self, paths, output_path, workers=8, progress=None):
+        """Detects faces in every path not already completed in
+        ``output_path`` and appends the results to it.
+
+        Returns:
+            The number of images annotated and the number that failed.
+        """
+        completed = resume_results(output_path)
+        pending = [path for path in paths if path not in completed]
+        succeeded = failed = 0
+
+        pool = ThreadPool(max(1, workers))
+        try:
+            with open(output_path, 'a') as output:
+                for results in pool.imap_unordered(
+                        self.detect, batches(pending, size=self._size)):
+                    for result in results:
+                        output.write(json.dumps(result) + '\n')
+                        if 'error' in result:
+                            failed += 1
+                        else:
+                            succeeded += 1
+                    # Flush each batch so that it survives an interruption.
+                    output.flush()
+                    if progress:
+                        progress(succeeded + failed, len(pending))
+        finally:
+            pool.close()
+            pool.join()
+
+        return succeeded, failed
+
+
+def print_progress(done, total):
+    print('{}/{} images annotated'.format(done, total))
+
+
+def main(source, output_path, workers, max_results, max_dimension=None,
+         cache_path=None):
+    paths = find_images(source)
+    cache = None
+    if cache_path:
+        cache = annotation_cache.AnnotationCache(cache_path)
+    detector = BatchFaceDetector(
+        max_results=max_results, max_dimension=max_dimension, cache=cache)
+    succeeded, failed = detector.run(
+        paths, output_path, workers=workers, progress=print_progress)
+    print('Annotated {} images, {} failed.'.format(succeeded, failed))
+    if cache is not None:
+        print('{} images were found in the cache.'.format(cache.hits))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        'source',
+        help='A directory of images, or a file listing one per line.')
+    parser.add_argument(
+        '--output', default='faces.json',
+        help='The newline-delimited JSON file to append results to.')
+    parser.add_argument(
+        '--workers', type=int, default=8,
+        help='How many requests to send at the same time.')
+    parser.add_argument(
+        '--max-results', dest='max_results', type=int, default=4,
+        help='the max results of face detection per image.')
+    parser.add_argument(
+        '--max-dimension', dest='max_dimension', type=int, default=None,
+        help='scale images down to at most this many pixels on a side '
+             'before sending them.')
+    parser.add_argument(
+        '--cache', dest='cache_path', default=None,
+        help='a SQLite file to cache annotations in, so the same image is '
+             'not sent twice.')
+    args = parser.parse_args()
+
+    main(args.source, args.output, args.workers, args.max_results,
+         args.max_dimension, args.cache_path)
@@ -0,0 +1,94 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import batch_faces
+import mock
+
+
+def test_batches_respect_count_and_size():
+    sizes = {'a': 3, 'b': 3, 'c': 3, 'd': 10, 'e': 1}
+
+    groups = list(batch_faces.batches(
+        'abcde', max_images=2, max_bytes=8, size=sizes.get))
+
+    assert groups == [['a', 'b'], ['c'], ['d'], ['e']]
+
+
+def test_run_batches_requests_and_resumes(resource, tmpdir):
+    image = resource('face-input.jpg')
+    paths = [image, image + '.missing', str(tmpdir.join('done.jpg'))] + [
+        image] * 20
+    output_path = str(tmpdir.join('faces.json'))
+    with open(output_path, 'w') as output:
+        output.write(json.dumps({'file': paths[2], 'faces': []}) + '\n')
+        output.write('{"file": "interrupt')
+
+    def annotate(body):
+        request = mock.Mock()
+        request.execute.return_value = {'responses': [
+            {'faceAnnotations': [{'joyLikelihood': 'VERY_LIKELY'}]}
+            for _ in body['requests']]}
+        return request
+
+    service = mock.MagicMock()
+    service.images.return_value.annotate.side_effect = annotate
+    detector = batch_faces.BatchFaceDetector(
+        credentials=mock.Mock(), service=service)
+
+    assert detector.run(paths, output_path, workers=2) == (21, 1)
+
+    # 22 pending images go in batches of 16 and 6; the missing one is not
+    # sent.
+    calls = service.images.return_value.annotate.call_args_list
+    assert sorted(len(call[1]['body']['requests']) for call in calls) == [
+        6, 15]
+    with open(output_path) as output:
+        results = [json.loads(line) for line in output]
+    assert len(results) == 23
+    assert sum('error' in result for result in results) == 1
+    assert batch_faces.resume_results(output_path) == set(
+        paths[:1] + paths[2:])
+
+
+def test_corrupt_image_is_recorded(resource, tmpdir):
+    corrupt = tmpdir.join('corrupt.jpg')
+    corrupt.write_binary(b'not an image')
+    paths = [str(corrupt), resource('face-input.jpg')]
+
+    service = mock.MagicMock()
+    service.images.return_value.annotate.return_value.execute.return_value = {
+        'responses': [{'faceAnnotations': []}]}
+    detector = batch_faces.BatchFaceDetector(
+        credentials=mock.Mock(), service=service, max_dimension=100)
+
+    results = detector.detect(paths)
+
+    assert [result['file'] for result in results] == paths
+    assert 'error' in results[0]
+    assert results[1]['faces'] == []
+
+
+def test_main(resource, tmpdir, capsys):
+    output_path = str(tmpdir.join('faces.json'))
+    manifest = tmpdir.join('manifest.txt')
+    manifest.write(resource('face-input.jpg'))
+
+    batch_faces.main(str(manifest), output_path, 2, 4)
+    out, _ = capsys.readouterr()
+    assert 'Annotated 1 images, 0 failed.' in out
+
+    with open(output_path) as output:
+        result = json.loads(output.read())
+    assert result['faces']
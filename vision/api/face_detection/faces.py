@@ -18,7 +18,9 @@
 
 import argparse
 import base64
+import io
 
+import annotation_cache
 from googleapiclient import discovery
 from oauth2client.client import GoogleCredentials
 from PIL import Image
@@ -37,36 +39,109 @@ def get_vision_service():
 # [END get_vision_service]
 
 
-def detect_face(face_file, max_results=4):
+def face_request(image_content, max_results=4):
+    """Returns the annotate request for face detection on an image."""
+    return {
+        'image': {
+            'content': base64.b64encode(image_content).decode('utf-8')
+            },
+        'features': [{
+            'type': 'FACE_DETECTION',
+            'maxResults': max_results,
+            }]
+        }
+
+
+def downscale(image_content, max_dimension, quality=85):
+    """Shrinks an image to fit within ``max_dimension`` pixels on each side.
+
+    Face detection works as well on a much smaller image, which is quicker
+    to upload.
+
+    Returns:
+        The JPEG-encoded smaller image, or the original content if it is
+        already small enough, and the factors to multiply x and y
+        coordinates in the returned image by to get coordinates in the
+        original.
+    """
+    im = Image.open(io.BytesIO(image_content))
+    width, height = im.size
+    if max(width, height) <= max_dimension:
+        return image_content, (1.0, 1.0)
+
+    if im.mode not in ('RGB', 'L'):
+        im = im.convert('RGB')
+    im.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    output = io.BytesIO()
+    im.save(output, 'JPEG', quality=quality)
+    return output.getvalue(), (
+        width / float(im.size[0]), height / float(im.size[1]))
+
+
+def rescale_faces(faces, scale):
+    """Multiplies the coordinates in face annotations by the (x, y) factors
+    in ``scale``, in place."""
+    scale_x, scale_y = scale
+    for face in faces:
+        for poly in ('boundingPoly', 'fdBoundingPoly'):
+            for vertex in face.get(poly, {}).get('vertices', []):
+                if 'x' in vertex:
+                    vertex['x'] = int(round(vertex['x'] * scale_x))
+                if 'y' in vertex:
+                    vertex['y'] = int(round(vertex['y'] * scale_y))
+        for landmark in face.get('landmarks', []):
+            position = landmark.get('position', {})
+            if 'x' in position:
+                position['x'] *= scale_x
+            if 'y' in position:
+                position['y'] *= scale_y
+    return faces
+
+
+def detect_face(face_file, max_results=4, service=None, max_dimension=None,
+                cache=None):
     """Uses the Vision API to detect faces in the given file.
 
     Args:
         face_file: A file-like object containing an image with faces.
+        service: The Vision service to use. Pass one in to reuse it across
+            calls; by default a new one is built.
+        max_dimension: If set, images larger than this many pixels on a side
+            are scaled down before they are sent. The coordinates returned
+            are still those in the original image.
+        cache: An annotation_cache.AnnotationCache to look the image up in
+            before sending it, and to store the result in.
 
     Returns:
         An array of dicts with information about the faces in the picture.
     """
     image_content = face_file.read()
-    batch_request = [{
-        'image': {
-            'content': base64.b64encode(image_content).decode('utf-8')
-            },
-        'features': [{
-            'type': 'FACE_DETECTION',
-            'maxResults': max_results,
-            }]
-        }]
-
-    service = get_vision_service()
+    if cache is not None:
+        key = annotation_cache.cache_key(
+            image_content, 'FACE_DETECTION', int(max_results))
+        faces = cache.get(key)
+        if faces is not None:
+            return faces
+
+    scale = (1.0, 1.0)
+    if max_dimension:
+        image_content, scale = downscale(image_content, max_dimension)
+    batch_request = [face_request(image_content, max_results)]
+
+    service = service or get_vision_service()
     request = service.images().annotate(body={
         'requests': batch_request,
         })
     response = request.execute()
 
-    return response['responses'][0]['faceAnnotations']
+    faces = rescale_faces(
+        response['responses'][0].get('faceAnnotations', []), scale)
+    if cache is not None:
+        cache.put(key, faces)
+    return faces
 
 
-def highlight_faces(image, faces, output_filename):
+def highlight_faces(image, faces, output_filename, quality=None):
     """Draws a polygon around the faces, then saves to output_filename.
 
     Args:
@@ -75,6 +150,7 @@ def highlight_faces(image, faces, output_filename):
           returned by the Vision API.
       output_filename: the name of the image file to be created, where the
           faces have polygons drawn around them.
+      quality: the JPEG quality to save with, or None for PIL's default.
     """
     im = Image.open(image)
     draw = ImageDraw.Draw(im)
@@ -84,12 +160,20 @@ def highlight_faces(image, faces, output_filename):
                for v in face['fdBoundingPoly']['vertices']]
         draw.line(box + [box[0]], width=5, fill='#00ff00')
 
-    im.save(output_filename)
+    if quality is None:
+        im.save(output_filename)
+    else:
+        im.save(output_filename, quality=quality)
 
 
-def main(input_filename, output_filename, max_results):
+def main(input_filename, output_filename, max_results, max_dimension=None,
+         cache_path=None):
+    cache = None
+    if cache_path:
+        cache = annotation_cache.AnnotationCache(cache_path)
     with open(input_filename, 'rb') as image:
-        faces = detect_face(image, max_results)
+        faces = detect_face(image, max_results, max_dimension=max_dimension,
+                            cache=cache)
         print('Found {} face{}'.format(
             len(faces), '' if len(faces) == 1 else 's'))
 
@@ -110,6 +194,15 @@ if __name__ == '__main__':
     parser.add_argument(
         '--max-results', dest='max_results', default=4,
         help='the max results of face detection.')
+    parser.add_argument(
+        '--max-dimension', dest='max_dimension', type=int, default=None,
+        help='scale the image down to at most this many pixels on a side '
+             'before sending it.')
+    parser.add_argument(
+        '--cache', dest='cache_path', default=None,
+        help='a SQLite file to cache annotations in, so the same image is '
+             'not sent twice.')
     args = parser.parse_args()
 
-    main(args.input_image, args.output, args.max_results)
+    main(args.input_image, args.output, args.max_results, args.max_dimension,
+         args.cache_path)
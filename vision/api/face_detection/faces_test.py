@@ -11,9 +11,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import os
 
+import faces
 from faces import main
+import mock
 from PIL import Image
 
 
@@ -34,3 +37,33 @@ def test_main(resource, tmpdir):
     pixels = im.getdata()
     greens = sum(1 for (r, g, b) in pixels if r == 0 and g == 255 and b == 0)
     assert greens > 10
+
+
+def test_downscale(resource):
+    with open(resource('face-input.jpg'), 'rb') as image:
+        content = image.read()
+
+    assert faces.downscale(content, 1024) == (content, (1.0, 1.0))
+
+    smaller, scale = faces.downscale(content, 128)
+    assert Image.open(io.BytesIO(smaller)).size == (128, 96)
+    assert scale == (4.0, 4.0)
+    assert len(smaller) < len(content) / 4
+
+
+def test_detect_face_rescales_to_original(resource):
+    service = mock.MagicMock()
+    service.images.return_value.annotate.return_value.execute.return_value = {
+        'responses': [{'faceAnnotations': [{
+            'fdBoundingPoly': {'vertices': [{'x': 10, 'y': 20}, {'y': 5}]},
+            'landmarks': [{'position': {'x': 1.5, 'y': 2.0, 'z': 3.0}}],
+        }]}]}
+
+    with open(resource('face-input.jpg'), 'rb') as image:
+        found = faces.detect_face(
+            image, service=service, max_dimension=256)
+
+    assert found[0]['fdBoundingPoly']['vertices'] == [
+        {'x': 20, 'y': 40}, {'y': 10}]
+    assert found[0]['landmarks'][0]['position'] == {
+        'x': 3.0, 'y': 4.0, 'z': 3.0}
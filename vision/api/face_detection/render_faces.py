@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Draws the faces found by batch_faces.py onto copies of the images.
+
+Decoding, drawing and encoding images is CPU-bound, so it is done by a pool
+of processes. Each task names the image and the position of its faces in
+the results file, rather than carrying pixels or annotations, so little
+data is sent between processes.
+
+Example:
+
+    $ python render_faces.py faces.json --output_dir=highlighted/
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+
+import faces
+
+
+def index_results(results_path):
+    """Returns a dict from each successfully annotated image to the offset
+    of its line in the results file. Later lines win."""
+    offsets = {}
+    with open(results_path, 'rb') as results:
+        offset = 0
+        for line in iter(results.readline, b''):
+            try:
+                result = json.loads(line.decode('utf-8'))
+            except ValueError:
+                # A line cut short when a run was interrupted.
+                result = {}
+            if 'faces' in result:
+                offsets[result['file']] = offset
+            offset += len(line)
+    return offsets
+
+
+def output_path(image_path, root, output_dir):
+    """Returns where to write the highlighted copy of an image, keeping its
+    path relative to ``root``."""
+    return os.path.join(output_dir, os.path.relpath(image_path, root))
+
+
+def render(task):
+    """Highlights the faces in one image, in a worker process.
+
+    Args:
+        task: The image path, the results file path, the offset of the
+            image's line in it, the output path and the JPEG quality.
+
+    Returns:
+        The image path, and an error message or None.
+    """
+    image_path, results_path, offset, out_path, quality = task
+    try:
+        with open(results_path, 'rb') as results:
+            results.seek(offset)
+            found = json.loads(results.readline().decode('utf-8'))['faces']
+
+        out_dir = os.path.dirname(out_path)
+        if out_dir and not os.path.isdir(out_dir):
+            try:
+                os.makedirs(out_dir)
+            except OSError:
+                # Another worker created it first.
+                if not os.path.isdir(out_dir):
+                    raise
+        faces.highlight_faces(image_path, found, out_path, quality)
+    except Exception as e:
+        return image_path, str(e)
+    return image_path, None
+
+
+def render_all(results_path, output_dir, workers=None, quality=85,
+               progress=None):
+    """Highlights the faces in every image in a results file.
+
+    Args:
+        workers: How many processes to use; by default, one per CPU.
+
+    Returns:
+        The number of images written and the number that failed.
+    """
+    offsets = index_results(results_path)
+    if not offsets:
+        return 0, 0
+    paths = sorted(offsets)
+    root = os.path.dirname(os.path.commonprefix(paths))
+    tasks = [
+        (path, results_path, offsets[path],
+         output_path(path, root, output_dir), quality)
+        for path in paths]
+
+    rendered = failed = 0
+    pool = multiprocessing.Pool(workers)
+    try:
+        for path, error in pool.imap_unordered(
+                render, tasks, chunksize=max(1, len(tasks) // (
+                    4 * (workers or multiprocessing.cpu_count())))):
+            if error:
+                print('{}: {}'.format(path, error))
+                failed += 1
+            else:
+                rendered += 1
+            if progress:
+                progress(rendered + failed, len(tasks))
+    finally:
+        pool.close()
+        pool.join()
+
+    return rendered, failed
+
+
+def main(results_path, output_dir, workers, quality):
+    rendered, failed = render_all(results_path, output_dir, workers, quality)
+    print('Wrote {} images to {}, {} failed.'.format(
+        rendered, output_dir, failed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        'results',
+        help='The newline-delimited JSON written by batch_faces.py.')
+    parser.add_argument(
+        '--output_dir', default='highlighted',
+        help='The directory to write the highlighted images to.')
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='How many processes to use; by default, one per CPU.')
+    parser.add_argument(
+        '--quality', type=int, default=85,
+        help='The JPEG quality of the images written.')
+    args = parser.parse_args()
+
+    main(args.results, args.output_dir, args.workers, args.quality)
@@ -0,0 +1,49 @@
+# Copyright 2016, Google, Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+
+from PIL import Image
+import render_faces
+
+FACE = {'fdBoundingPoly': {'vertices': [
+    {'x': 10, 'y': 10}, {'x': 100, 'y': 10}, {'x': 100, 'y': 100},
+    {'x': 10, 'y': 100}]}}
+
+
+def test_render_all(resource, tmpdir):
+    images = tmpdir.mkdir('images')
+    paths = [str(images.join('a', 'one.jpg')), str(images.join('two.jpg'))]
+    os.makedirs(os.path.dirname(paths[0]))
+    for path in paths:
+        shutil.copy(resource('face-input.jpg'), path)
+
+    results_path = str(tmpdir.join('faces.json'))
+    with open(results_path, 'w') as results:
+        results.write(json.dumps({'file': paths[0], 'faces': []}) + '\n')
+        results.write(json.dumps({'file': paths[1], 'error': 'quota'}) + '\n')
+        results.write(json.dumps({'file': paths[1], 'faces': [FACE]}) + '\n')
+        results.write(json.dumps({'file': paths[0], 'faces': [FACE]}) + '\n')
+        results.write('{"file": "interrupt')
+
+    output_dir = str(tmpdir.join('out'))
+    assert render_faces.render_all(
+        results_path, output_dir, workers=2) == (2, 0)
+
+    for name in (os.path.join('a', 'one.jpg'), 'two.jpg'):
+        im = Image.open(os.path.join(output_dir, name))
+        greens = sum(1 for (r, g, b) in im.getdata()
+                     if r < 50 and g > 200 and b < 50)
+        assert greens > 10